@@ -0,0 +1,251 @@
+"""
+What-if pricing over accepted appointments, computed in memory with NumPy.
+
+AppointmentFrame loads the accepted appointments (caregiver id, month, work
+hours) and the caregivers (hourly rate, caregiving type, city) into compact
+column arrays once, streaming the rows from the database in chunks of
+ANALYTICS_CHUNK_ROWS (yield_per) so loading never holds more than one chunk
+of Python objects.  refresh() then appends only appointments with a higher
+appointment_id than any seen before and re-reads the (much smaller)
+caregiver table; refresh(full=True) starts over, which is needed to see
+status or hours changes of rows already loaded.
+
+A rate rule maps the caregivers' current rates to hypothetical ones:
+
+    rule(rate, caregiving_type, city) -> new rate       (all NumPy arrays)
+
+and total_cost(rule, by=...) prices every accepted appointment with it,
+optionally grouped by caregiving_type, city (the caregiver's) and/or month,
+without touching the database:
+
+    frame = AppointmentFrame(get_engine()).load()
+    frame.total_cost()                                    # as total_cost_all_accepted, summed
+    frame.total_cost(RULES["commission"], by=("caregiving_type", "month"))
+    frame.total_cost(lambda rate, caregiving_type, city:
+                     np.where(caregiving_type == "elderly", rate * 1.2, rate), by="city")
+
+    python analytics.py --rule commission --by caregiving_type,month
+"""
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+from models import User, Caregiver, Appointment
+from db import get_engine
+
+CHUNK_ROWS = int(os.environ.get("ANALYTICS_CHUNK_ROWS", 50_000))
+
+GROUP_KEYS = ("caregiving_type", "city", "month")
+
+
+def round_half_up(values, decimals=2):
+    """
+    Round half away from zero, as ROUND() does in PostgreSQL and SQLite
+    (np.round rounds half to even).  Scaled values are first cut to 6
+    decimals so float noise (1.005 * 100 == 100.49999999999999) does not
+    decide the half.
+    """
+    scale = 10 ** decimals
+    scaled = np.round(np.asarray(values, dtype=float) * scale, 6)
+    return np.sign(scaled) * np.floor(np.abs(scaled) + 0.5) / scale
+
+
+def current(rate, caregiving_type, city):
+    return rate
+
+
+def commission(threshold=10, flat=0.30, factor=1.10):
+    """The rule queries.add_commission_to_caregivers applies: +flat below threshold, else *factor."""
+    def rule(rate, caregiving_type, city):
+        return np.where(rate < threshold, rate + flat, round_half_up(rate * factor))
+    return rule
+
+
+def percent(pct):
+    def rule(rate, caregiving_type, city):
+        return round_half_up(rate * (1 + pct / 100))
+    return rule
+
+
+RULES = {
+    "current": current,
+    "commission": commission(),
+    "plus5pct": percent(5),
+    "plus10pct": percent(10),
+}
+
+
+class AppointmentFrame:
+    def __init__(self, bind, chunk_rows=CHUNK_ROWS):
+        self.bind = bind
+        self.chunk_rows = chunk_rows
+        self._lock = threading.Lock()
+        # per accepted appointment
+        self.appointment_ids = np.empty(0, dtype=np.int64)
+        self.caregiver_ids = np.empty(0, dtype=np.int64)
+        self.months = np.empty(0, dtype=np.int32)      # year * 100 + month
+        self.hours = np.empty(0, dtype=np.float64)
+        # per caregiver, sorted by id
+        self.caregivers = np.empty(0, dtype=np.int64)
+        self.rates = np.empty(0, dtype=np.float64)
+        self.caregiving_types = np.empty(0, dtype="U1")
+        self.cities = np.empty(0, dtype="U1")
+        self._index = np.empty(0, dtype=np.int64)     # appointment -> caregiver position, -1 if unknown
+        self._groups = {}                             # group key -> (labels, code per appointment)
+        self.last_id = 0
+        self.loaded_at = None
+
+    def __len__(self):
+        return len(self.appointment_ids)
+
+    # --- loading ---
+
+    def load(self):
+        self.refresh(full=True)
+        return self
+
+    def refresh(self, full=False):
+        """Read new accepted appointments (all of them if `full`) and the current caregivers; returns seconds."""
+        started = time.perf_counter()
+        with self._lock:
+            after = 0 if full else self.last_id
+            chunks = list(self._read_appointments(after))
+            with self.bind.connect() as conn:
+                rows = conn.execute(select(Caregiver.caregiver_user_id, Caregiver.hourly_rate,
+                                           Caregiver.caregiving_type, User.city).
+                                    join(User, User.user_id == Caregiver.caregiver_user_id).
+                                    order_by(Caregiver.caregiver_user_id)).all()
+            keep = [] if full else [(self.appointment_ids, self.caregiver_ids, self.months, self.hours)]
+            parts = list(zip(*(keep + chunks))) or [[], [], [], []]
+            self.appointment_ids = _concat(parts[0], np.int64)
+            self.caregiver_ids = _concat(parts[1], np.int64)
+            self.months = _concat(parts[2], np.int32)
+            self.hours = _concat(parts[3], np.float64)
+            if len(self.appointment_ids):
+                self.last_id = int(self.appointment_ids.max())
+
+            self.caregivers = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+            self.rates = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+            self.caregiving_types = np.array([r[2] for r in rows], dtype=str)
+            self.cities = np.array([(r[3] or "").strip() for r in rows], dtype=str)
+            pos = np.searchsorted(self.caregivers, self.caregiver_ids)
+            found = pos < len(self.caregivers)
+            found[found] = self.caregivers[pos[found]] == self.caregiver_ids[found]
+            self._index = np.where(found, pos, -1)
+            # Dense per-appointment group codes, computed once per refresh so grouping needs no sort.
+            self._groups = {"month": np.unique(self.months, return_inverse=True)}
+            for key, values in (("caregiving_type", self.caregiving_types), ("city", self.cities)):
+                labels, caregiver_codes = np.unique(values, return_inverse=True)
+                labels = np.append(labels.astype(object), None)  # last label: caregiver gone
+                self._groups[key] = (labels, self._per_appointment(caregiver_codes, len(labels) - 1))
+            self.loaded_at = time.monotonic()
+        return time.perf_counter() - started
+
+    def _read_appointments(self, after):
+        stmt = select(Appointment.appointment_id, Appointment.caregiver_user_id, Appointment.appointment_date,
+                      Appointment.work_hours).\
+            where(Appointment.status == "accepted", Appointment.appointment_id > after).\
+            order_by(Appointment.appointment_id).\
+            execution_options(yield_per=self.chunk_rows)
+        with self.bind.connect() as conn:
+            for chunk in conn.execute(stmt).partitions():
+                n = len(chunk)
+                yield (
+                    np.fromiter((r[0] for r in chunk), dtype=np.int64, count=n),
+                    np.fromiter((r[1] if r[1] is not None else -1 for r in chunk), dtype=np.int64, count=n),
+                    np.fromiter((r[2].year * 100 + r[2].month for r in chunk), dtype=np.int32, count=n),
+                    np.fromiter((r[3] for r in chunk), dtype=np.float64, count=n),
+                )
+
+    # --- evaluation ---
+
+    def _per_appointment(self, per_caregiver, missing):
+        """Spread a per-caregiver array over the appointments; `missing` where the caregiver is gone."""
+        known = self._index >= 0
+        if not len(per_caregiver):
+            return np.full(len(self._index), missing)
+        return np.where(known, per_caregiver[np.where(known, self._index, 0)], missing)
+
+    def costs(self, rule=current):
+        """Cost of every loaded appointment under `rule` (0 where the caregiver is gone)."""
+        rates = np.asarray(rule(self.rates, self.caregiving_types, self.cities), dtype=np.float64)
+        return self._per_appointment(rates, 0.0) * self.hours
+
+    def total_cost(self, rule=current, by=()):
+        """
+        Total cost under `rule`, or {group: cost} when grouped; `by` is one of
+        GROUP_KEYS or a tuple of them (the dict is then keyed by tuples).
+        Months are labelled "YYYY-MM".
+        """
+        single = isinstance(by, str)
+        keys = (by,) if single else tuple(by)
+        unknown = [k for k in keys if k not in GROUP_KEYS]
+        if unknown:
+            raise ValueError(f"cannot group by {', '.join(unknown)}; use {', '.join(GROUP_KEYS)}")
+        costs = self.costs(rule)
+        if not keys:
+            return float(round_half_up(costs.sum()))
+
+        labels, codes = zip(*(self._groups[k] for k in keys))
+        shape = [len(l) for l in labels]
+        # Every code is small and dense, so one bincount over the combined code does the grouping.
+        combined = np.ravel_multi_index(codes, shape) if len(costs) else np.empty(0, np.int64)
+        size = int(np.prod(shape))
+        counts = np.bincount(combined, minlength=size)
+        totals = np.bincount(combined, weights=costs, minlength=size)
+        result = {}
+        for group in np.flatnonzero(counts):
+            total = totals[group]
+            parts = np.unravel_index(group, shape)
+            key = tuple(_label(k, l[i]) for k, l, i in zip(keys, labels, parts))
+            result[key[0] if single else key] = float(round_half_up(total))
+        return result
+
+    def compare(self, rules, by=()):
+        """{rule name: total_cost(rule, by)} for a dict of named rules."""
+        return {name: self.total_cost(rule, by) for name, rule in rules.items()}
+
+
+def _concat(arrays, dtype):
+    return np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.empty(0, dtype=dtype)
+
+
+def _label(key, value):
+    if value is None:
+        return None
+    if key == "month":
+        return f"{int(value) // 100:04d}-{int(value) % 100:02d}"
+    return str(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="What-if total cost of accepted appointments")
+    parser.add_argument("--rule", action="append", choices=sorted(RULES),
+                        help="rate rule(s) to compare (default: current and commission)")
+    parser.add_argument("--by", default="", help=f"comma separated group keys: {', '.join(GROUP_KEYS)}")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    frame = AppointmentFrame(get_engine()).load()
+    print(f"loaded {len(frame):,} accepted appointments and {len(frame.caregivers):,} caregivers "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    by = tuple(k for k in args.by.split(",") if k)
+    for name in args.rule or ["current", "commission"]:
+        started = time.perf_counter()
+        result = frame.total_cost(RULES[name], by)
+        elapsed = (time.perf_counter() - started) * 1000
+        if not by:
+            print(f"{name:12} {result:>16,.2f}   ({elapsed:.2f} ms)")
+            continue
+        print(f"{name} ({elapsed:.2f} ms)")
+        for key, total in sorted(result.items(), key=lambda kv: str(kv[0])):
+            print(f"  {' / '.join(map(str, key)):40} {total:>16,.2f}")
+
+
+if __name__ == "__main__":
+    main()
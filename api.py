@@ -0,0 +1,518 @@
+"""
+JSON API, version 1, mounted at /api/v1.
+
+    GET /api/v1/<resource>                 collection, keyset paginated
+    GET /api/v1/<resource>/<id>            one object (job_applications: <caregiver_user_id>/<job_id>)
+    POST /api/v1/job_applications/batch    create many, see batch_job_applications()
+    POST /api/v1/appointments/batch        create many, see batch_appointments()
+
+Resources: users, caregivers, members, addresses, jobs, job_applications,
+appointments.  Query parameters on collections:
+
+    fields=a,b              only these fields (the key is always returned)
+    fields[<include>]=a,b   the same for an included relation
+    <field>=v               equality filter on a filterable field
+    <field>__gte=v          also __gt, __lt, __lte, and __in=v1,v2
+    include=a,b             embed related objects, one batched query per relation
+    per_page, after, before keyset pagination as on the HTML list pages
+
+Rows are selected as plain column tuples and serialized directly; no ORM
+objects are built.  Collection responses carry an ETag and answer a matching
+If-None-Match with 304 Not Modified.
+"""
+import json
+import os
+from collections import namedtuple
+from contextlib import ExitStack
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+
+from flask import Blueprint, Response, abort, current_app, request
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import User, Caregiver, Member, Address, Job, JobApplication, Appointment
+from pagination import keyset_query, page_from_rows, page_size_from
+import scheduling
+
+bp = Blueprint("api_v1", __name__, url_prefix="/api/v1")
+
+FILTER_OPS = {
+    "gt": lambda c, v: c > v,
+    "gte": lambda c, v: c >= v,
+    "lt": lambda c, v: c < v,
+    "lte": lambda c, v: c <= v,
+}
+
+# A relation embedded with include=: rows of `resource` whose `remote` column
+# equals this row's `local` field; `many` gives a list instead of one object.
+Include = namedtuple("Include", "resource local remote many")
+
+
+class Resource:
+    def __init__(self, model, fields, key, filters=(), includes=None):
+        self.model = model
+        self.columns = {name: getattr(model, name) for name in fields}
+        self.key = [self.columns[name] for name in key]
+        self.filters = frozenset(filters)
+        self.includes = includes or {}
+        self.converters = {name: _converter(col) for name, col in self.columns.items()}
+
+    def select_fields(self, requested):
+        """Field names to return: all of them, or the requested ones plus the key."""
+        if not requested:
+            return list(self.columns)
+        names = [n for n in requested.split(",") if n]
+        unknown = [n for n in names if n not in self.columns]
+        if unknown:
+            abort(400, f"unknown field(s): {', '.join(unknown)}")
+        return [c.key for c in self.key if c.key not in names] + names
+
+    def serialize(self, rows, names):
+        converters = [self.converters[n] for n in names]
+        return [{n: (v if conv is None or v is None else conv(v)) for n, conv, v in zip(names, converters, row)}
+                for row in rows]
+
+
+def _converter(column):
+    python_type = column.type.python_type
+    if python_type in (date, datetime, time):
+        return python_type.isoformat
+    if python_type is Decimal:
+        return str
+    return None
+
+
+def _parse(column, raw):
+    python_type = column.type.python_type
+    try:
+        if python_type in (date, datetime, time):
+            return python_type.fromisoformat(raw)
+        return python_type(raw)
+    except (ValueError, TypeError, ArithmeticError):
+        abort(400, f"invalid value for {column.key}: {raw!r}")
+
+
+USER_FIELDS = ("user_id", "email", "given_name", "surname", "city", "phone_number", "profile_description")
+
+RESOURCES = {
+    "users": Resource(User, USER_FIELDS, ["user_id"], filters=("email", "city", "given_name", "surname"), includes={
+        "caregiver": Include("caregivers", "user_id", "caregiver_user_id", False),
+        "member": Include("members", "user_id", "member_user_id", False),
+    }),
+    "caregivers": Resource(Caregiver, ("caregiver_user_id", "photo", "gender", "caregiving_type", "hourly_rate"),
+                           ["caregiver_user_id"], filters=("gender", "caregiving_type", "hourly_rate"), includes={
+        "user": Include("users", "caregiver_user_id", "user_id", False),
+        "applications": Include("job_applications", "caregiver_user_id", "caregiver_user_id", True),
+        "appointments": Include("appointments", "caregiver_user_id", "caregiver_user_id", True),
+    }),
+    "members": Resource(Member, ("member_user_id", "house_rules", "dependent_description"), ["member_user_id"],
+                        includes={
+        "user": Include("users", "member_user_id", "user_id", False),
+        "address": Include("addresses", "member_user_id", "member_user_id", False),
+        "jobs": Include("jobs", "member_user_id", "member_user_id", True),
+        "appointments": Include("appointments", "member_user_id", "member_user_id", True),
+    }),
+    "addresses": Resource(Address, ("member_user_id", "house_number", "street", "town"), ["member_user_id"],
+                          filters=("street", "town"), includes={
+        "member": Include("members", "member_user_id", "member_user_id", False),
+    }),
+    "jobs": Resource(Job, ("job_id", "member_user_id", "required_caregiving_type", "other_requirements", "date_posted"),
+                     ["job_id"], filters=("member_user_id", "required_caregiving_type", "date_posted"), includes={
+        "member": Include("members", "member_user_id", "member_user_id", False),
+        "applications": Include("job_applications", "job_id", "job_id", True),
+    }),
+    "job_applications": Resource(JobApplication, ("caregiver_user_id", "job_id", "date_applied"),
+                                 ["caregiver_user_id", "job_id"], filters=("caregiver_user_id", "job_id", "date_applied"),
+                                 includes={
+        "caregiver": Include("caregivers", "caregiver_user_id", "caregiver_user_id", False),
+        "job": Include("jobs", "job_id", "job_id", False),
+    }),
+    "appointments": Resource(Appointment, ("appointment_id", "caregiver_user_id", "member_user_id", "appointment_date",
+                                           "appointment_time", "work_hours", "status"), ["appointment_id"],
+                             filters=("caregiver_user_id", "member_user_id", "appointment_date", "status", "work_hours"),
+                             includes={
+        "caregiver": Include("caregivers", "caregiver_user_id", "caregiver_user_id", False),
+        "member": Include("members", "member_user_id", "member_user_id", False),
+    }),
+}
+
+RESERVED_PARAMS = frozenset(("fields", "include", "per_page", "after", "before"))
+
+
+@bp.record_once
+def _configure(state):
+    # register_blueprint(bp, session_factory=..., write_session_factory=...) supplies the sessions.
+    state.app.extensions["api_v1_session"] = state.options["session_factory"]
+    state.app.extensions["api_v1_write_session"] = state.options["write_session_factory"]
+
+
+def _session():
+    return current_app.extensions["api_v1_session"]()
+
+
+def _write_session():
+    return current_app.extensions["api_v1_write_session"]()
+
+
+def _resource(name):
+    resource = RESOURCES.get(name)
+    if resource is None:
+        abort(404, f"no such resource: {name}")
+    return resource
+
+
+def _filters(resource, args):
+    conditions = []
+    for param, raw in args.items():
+        if param in RESERVED_PARAMS or param.startswith("fields["):
+            continue
+        name, _, op = param.partition("__")
+        if name not in resource.filters or (op and op != "in" and op not in FILTER_OPS):
+            abort(400, f"cannot filter on {param}")
+        column = resource.columns[name]
+        if op == "in":
+            conditions.append(column.in_([_parse(column, v) for v in raw.split(",")]))
+        elif op:
+            conditions.append(FILTER_OPS[op](column, _parse(column, raw)))
+        else:
+            conditions.append(column == _parse(column, raw))
+    return conditions
+
+
+def _includes(resource, args):
+    names = [n for n in args.get("include", "").split(",") if n]
+    unknown = [n for n in names if n not in resource.includes]
+    if unknown:
+        abort(400, f"unknown include(s): {', '.join(unknown)}")
+    return names
+
+
+def _embed(session, resource, objects, includes, args):
+    """Attach each requested relation to `objects` with one IN query per relation."""
+    for name in includes:
+        inc = resource.includes[name]
+        target = RESOURCES[inc.resource]
+        values = {obj[inc.local] for obj in objects if obj.get(inc.local) is not None}
+        names = target.select_fields(args.get(f"fields[{name}]"))
+        if inc.remote not in names:
+            names.append(inc.remote)
+        related = {}
+        if values:
+            stmt = select(*[target.columns[n] for n in names]).where(target.columns[inc.remote].in_(values))
+            for item in target.serialize(session.execute(stmt), names):
+                if inc.many:
+                    related.setdefault(item[inc.remote], []).append(item)
+                else:
+                    related[item[inc.remote]] = item
+        empty = [] if inc.many else None
+        for obj in objects:
+            obj[name] = related.get(obj.get(inc.local), empty)
+
+
+def _json(payload, status=200):
+    return Response(json.dumps(payload, separators=(",", ":")), status=status, mimetype="application/json")
+
+
+@bp.errorhandler(400)
+@bp.errorhandler(404)
+@bp.errorhandler(409)
+@bp.errorhandler(413)
+@bp.errorhandler(501)
+def _error(e):
+    return _json({"error": e.description}, e.code)
+
+
+@bp.route("/<name>")
+def collection(name):
+    resource = _resource(name)
+    args = request.args
+    names = resource.select_fields(args.get("fields"))
+    includes = _includes(resource, args)
+    # The cursor needs the key columns and an include needs its local column, even if not asked for.
+    needed = [c.key for c in resource.key] + [resource.includes[i].local for i in includes]
+    selected = names + [n for n in dict.fromkeys(needed) if n not in names]
+
+    per_page = page_size_from(args)
+    after, before = args.get("after"), args.get("before")
+    stmt = select(*[resource.columns[n] for n in selected]).where(*_filters(resource, args))
+    session = _session()
+    try:
+        try:
+            stmt = keyset_query(stmt, resource.key, after=after, before=before, page_size=per_page)
+        except ValueError:
+            abort(400, "invalid cursor")
+        page = page_from_rows(session.execute(stmt), resource.key, after, before, per_page)
+        objects = resource.serialize(page.items, selected)
+        _embed(session, resource, objects, includes, args)
+    finally:
+        session.close()
+    hidden = [n for n in selected if n not in names]
+    for obj in objects:
+        for n in hidden:
+            del obj[n]
+
+    response = _json({"data": objects, "next": page.next_cursor, "prev": page.prev_cursor})
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@bp.route("/<name>/<int:key>")
+@bp.route("/<name>/<int:key>/<int:key2>")
+def item(name, key, key2=None):
+    resource = _resource(name)
+    values = [key] if key2 is None else [key, key2]
+    if len(values) != len(resource.key):
+        abort(404, f"{name} are addressed by {len(resource.key)} key(s)")
+    names = resource.select_fields(request.args.get("fields"))
+    includes = _includes(resource, request.args)
+    needed = dict.fromkeys(resource.includes[i].local for i in includes)
+    selected = names + [n for n in needed if n not in names]
+    stmt = select(*[resource.columns[n] for n in selected]).where(*[c == v for c, v in zip(resource.key, values)])
+    session = _session()
+    try:
+        row = session.execute(stmt).first()
+        if row is None:
+            abort(404, f"{name} {'/'.join(map(str, values))} not found")
+        obj = resource.serialize([row], selected)[0]
+        _embed(session, resource, [obj], includes, request.args)
+    finally:
+        session.close()
+    for n in selected[len(names):]:
+        del obj[n]
+    return _json({"data": obj})
+
+
+# --- batch writes ---
+#
+# Both endpoints take a JSON array of records and answer with one result per
+# record, in input order: {"index": i, "status": ..., "error"?: ...}, where
+# status is "created", "exists" (already stored, nothing changed), "duplicate"
+# (repeats an earlier record of the same batch), "conflict" (overlaps an
+# active booking) or "invalid".  Valid records are inserted in one statement
+# and committed together; invalid ones do not stop the rest.
+
+BATCH_MAX_ROWS = int(os.environ.get("API_BATCH_MAX_ROWS", 10_000))
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def _records():
+    records = request.get_json(silent=True)
+    if not isinstance(records, list):
+        abort(400, "expected a JSON array of records")
+    if len(records) > BATCH_MAX_ROWS:
+        abort(413, f"at most {BATCH_MAX_ROWS} records per batch")
+    return records
+
+
+def _field(record, name, convert, default=None):
+    value = record.get(name, default)
+    if value is None:
+        raise InvalidRecord(f"{name} is required")
+    try:
+        return convert(value)
+    except (ValueError, TypeError, InvalidOperation):
+        raise InvalidRecord(f"invalid {name}: {value!r}")
+
+
+def _integer(value):
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise TypeError(value)
+    return int(value)
+
+
+def _validate(records, parse):
+    """(results, valid) where valid is a list of (index, values) for records that parsed."""
+    results = [None] * len(records)
+    valid = []
+    for i, record in enumerate(records):
+        try:
+            if not isinstance(record, dict):
+                raise InvalidRecord("record must be an object")
+            valid.append((i, parse(record)))
+        except InvalidRecord as e:
+            results[i] = {"index": i, "status": "invalid", "error": str(e)}
+    return results, valid
+
+
+def _check_references(session, results, valid, references):
+    """
+    Drop records whose foreign keys do not exist, with one IN query per
+    referenced column: references is [(field, primary key column), ...].
+    """
+    for field, column in references:
+        wanted = {values[field] for _, values in valid}
+        if not wanted:
+            continue
+        found = set(session.execute(select(column).where(column.in_(wanted))).scalars())
+        kept = []
+        for i, values in valid:
+            if values[field] in found:
+                kept.append((i, values))
+            else:
+                results[i] = {"index": i, "status": "invalid", "error": f"unknown {field} {values[field]}"}
+        valid = kept
+    return valid
+
+
+def _insert_ignoring_conflicts(session, model):
+    """INSERT ... ON CONFLICT DO NOTHING for the session's dialect."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing()
+    abort(501, f"batch inserts are not supported on {dialect}")
+
+
+def _batch_response(results):
+    created = sum(1 for r in results if r["status"] == "created")
+    return _json({"created": created, "results": results})
+
+
+def _parse_application(record):
+    return {
+        "caregiver_user_id": _field(record, "caregiver_user_id", _integer),
+        "job_id": _field(record, "job_id", _integer),
+        "date_applied": _field(record, "date_applied", date.fromisoformat, date.today().isoformat()),
+    }
+
+
+@bp.route("/job_applications/batch", methods=["POST"])
+def batch_job_applications():
+    """
+    [{"caregiver_user_id": 3, "job_id": 7, "date_applied": "2024-05-01"}, ...]
+    date_applied defaults to today.  An application that already exists is
+    left untouched (ON CONFLICT DO NOTHING on the primary key) and reported
+    as "exists".
+    """
+    records = _records()
+    results, valid = _validate(records, _parse_application)
+
+    seen = set()
+    unique = []
+    for i, values in valid:
+        key = (values["caregiver_user_id"], values["job_id"])
+        if key in seen:
+            results[i] = {"index": i, "status": "duplicate"}
+        else:
+            seen.add(key)
+            unique.append((i, values))
+
+    session = _write_session()
+    try:
+        unique = _check_references(session, results, unique, [
+            ("caregiver_user_id", Caregiver.caregiver_user_id), ("job_id", Job.job_id),
+        ])
+        inserted = set()
+        if unique:
+            stmt = _insert_ignoring_conflicts(session, JobApplication).returning(
+                JobApplication.caregiver_user_id, JobApplication.job_id)
+            inserted = {tuple(row) for row in session.execute(stmt, [values for _, values in unique])}
+            session.commit()
+        for i, values in unique:
+            key = (values["caregiver_user_id"], values["job_id"])
+            results[i] = {"index": i, "status": "created" if key in inserted else "exists"}
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return _batch_response(results)
+
+
+_APPOINTMENT_STATUSES = ("pending", "accepted", "declined")
+_APPOINTMENT_FIELDS = ("caregiver_user_id", "member_user_id", "appointment_date", "appointment_time",
+                       "work_hours", "status")
+
+
+def _parse_appointment(record):
+    values = {
+        "caregiver_user_id": _field(record, "caregiver_user_id", _integer),
+        "member_user_id": _field(record, "member_user_id", _integer),
+        "appointment_date": _field(record, "appointment_date", date.fromisoformat),
+        "appointment_time": _field(record, "appointment_time", time.fromisoformat),
+        "work_hours": _field(record, "work_hours", lambda v: Decimal(str(v)).quantize(Decimal("0.01"))),
+        "status": _field(record, "status", str, "pending"),
+    }
+    if not values["work_hours"].is_finite() or not 0 < values["work_hours"] <= 24:
+        raise InvalidRecord("work_hours must be between 0 and 24")
+    if values["status"] not in _APPOINTMENT_STATUSES:
+        raise InvalidRecord(f"status must be one of {', '.join(_APPOINTMENT_STATUSES)}")
+    return values
+
+
+def _appointment_key(values):
+    return tuple(values[f] for f in _APPOINTMENT_FIELDS)
+
+
+@bp.route("/appointments/batch", methods=["POST"])
+def batch_appointments():
+    """
+    [{"caregiver_user_id": 3, "member_user_id": 12, "appointment_date": "2024-05-01",
+      "appointment_time": "09:00", "work_hours": 3, "status": "pending"}, ...]
+    Pending and accepted records are checked against the caregivers' existing
+    bookings and against each other; clashes are reported as "conflict" with
+    the appointment ids and the indexes of earlier records they overlap.  On
+    PostgreSQL the exclusion constraint also skips rows that a concurrent
+    writer booked first; on SQLite the triggers reject the batch with 409.
+    Created rows carry their appointment_id.
+    """
+    records = _records()
+    results, valid = _validate(records, _parse_appointment)
+
+    session = _write_session()
+    try:
+        valid = _check_references(session, results, valid, [
+            ("caregiver_user_id", Caregiver.caregiver_user_id), ("member_user_id", Member.member_user_id),
+        ])
+        scheduler = scheduling.shared_scheduler(session.get_bind())
+        caregivers = sorted({values["caregiver_user_id"] for _, values in valid})
+        with ExitStack() as locks:
+            # Same lock as the HTML form, taken in id order so two batches cannot deadlock.
+            for caregiver_user_id in caregivers:
+                locks.enter_context(scheduler.booking(caregiver_user_id))
+            if caregivers:
+                scheduler.refresh(caregivers, session.connection())
+            booked = {}  # caregiver -> Calendar of this batch's active records, by index
+            accepted = []
+            for i, values in valid:
+                if values["status"] in scheduling.ACTIVE_STATUSES:
+                    args = (values["caregiver_user_id"], values["appointment_date"], values["appointment_time"],
+                            values["work_hours"])
+                    start, end = scheduling.booking_interval(*args[1:])
+                    calendar = booked.setdefault(values["caregiver_user_id"], scheduling.Calendar())
+                    stored = scheduler.conflicts(*args)
+                    earlier = [e[2] for e in calendar.overlapping(start, end)]
+                    if stored or earlier:
+                        results[i] = {"index": i, "status": "conflict", "appointments": stored, "records": earlier}
+                        continue
+                    calendar.add(start, end, i)
+                accepted.append((i, values))
+
+            if accepted:
+                stmt = _insert_ignoring_conflicts(session, Appointment).returning(
+                    Appointment.appointment_id, *[getattr(Appointment, f) for f in _APPOINTMENT_FIELDS])
+                created = {}
+                for row in session.execute(stmt, [values for _, values in accepted]):
+                    created.setdefault(tuple(row[1:]), []).append(row.appointment_id)
+                session.commit()
+                for i, values in accepted:
+                    ids = created.get(_appointment_key(values))
+                    if ids:
+                        results[i] = {"index": i, "status": "created", "appointment_id": ids.pop(0)}
+                    else:
+                        results[i] = {"index": i, "status": "conflict", "appointments": [], "records": []}
+    except scheduling.ScheduleConflict:
+        # The SQLite triggers abort the whole statement when another process booked first.
+        session.rollback()
+        abort(409, "a concurrent booking overlaps this batch; nothing was created, retry it")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return _batch_response(results)
@@ -0,0 +1,495 @@
+"""
+Async (ASGI) serving mode: the routes and templates of app.py on Quart and
+SQLAlchemy's asyncio extension (asyncpg on PostgreSQL, aiosqlite on SQLite).
+
+    hypercorn async_app:app --bind 0.0.0.0:$PORT --workers 2
+
+A slow query only suspends its own request; the worker keeps serving others
+on the same event loop.  Configuration (DATABASE_URL, DB_POOL_*, CACHE_*,
+READ_YOUR_WRITES_SECONDS) is shared with app.py.  Reads always go to the
+primary here; replica routing is only implemented for the sync app.
+
+This app covers the HTML views, sign-in, the small JSON helpers
+(/api/caregivers/<id>/free_slots, /api/jobs/<id>/matches), /reports,
+/metrics and the CSV export.  The REST API under /api/v1 (api.py) is a
+Flask blueprint and is only served by the sync app.
+
+Unlike psycopg2, asyncpg does not coerce strings, so form values are
+converted to date/time/Decimal before they reach the ORM.
+"""
+import asyncio
+import functools
+import os
+import time
+from datetime import date, time as time_of_day
+from decimal import Decimal, InvalidOperation
+
+from quart import Quart, Response, jsonify, render_template, request, redirect, url_for, flash, abort, g, session as client_session
+from sqlalchemy import select
+from sqlalchemy.orm import contains_eager, raiseload
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from models import User, Caregiver, Member, Address, Job, JobApplication, Appointment
+from pagination import keyset_query, page_from_rows, page_size_from
+import data_io
+from migrations import ensure_schema
+import search as fulltext
+import matviews
+import metrics
+import cache
+import matching
+import scheduling
+import profiling
+import reporting
+import credentials
+from db import get_engine, get_async_engine
+
+app = Quart(__name__)
+app.secret_key = os.environ.get("SECRET_KEY", "dev-fallback-key-for-render")
+
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("READ_YOUR_WRITES_SECONDS", 5))
+
+page_cache = cache.watch(cache.from_env("pages"))
+job_applicants_refresher = None
+Session = None
+
+
+@app.before_serving
+async def startup():
+    global Session, job_applicants_refresher
+    # The schema check and the view refresher are synchronous; run them off the event loop.
+    try:
+        await asyncio.to_thread(ensure_schema, get_engine())
+    except Exception:
+        pass  # logged by ensure_schema
+    job_applicants_refresher = matviews.watch(matviews.DebouncedRefresher(
+        get_engine(),
+        delay=float(os.environ.get("JOB_APPLICANTS_REFRESH_DELAY", 2)),
+        max_delay=float(os.environ.get("JOB_APPLICANTS_REFRESH_MAX_DELAY", 30)),
+    ))
+    Session = async_sessionmaker(get_async_engine(), expire_on_commit=False)
+
+
+@app.after_serving
+async def shutdown():
+    job_applicants_refresher.stop()
+    await get_async_engine().dispose()
+
+
+@app.before_request
+async def note_recent_write():
+    g.recent_write = time.time() - client_session.get("last_write", 0) < READ_YOUR_WRITES_SECONDS
+
+
+@app.after_request
+async def remember_write(response):
+    if request.method == "POST" and response.status_code < 400:
+        client_session["last_write"] = time.time()
+    return response
+
+
+# Profiling hooks are async here: Quart runs sync hooks in a thread, outside the request's context.
+if profiling.ENABLED:
+    @app.before_request
+    async def start_profile():
+        g.profile_token = profiling.start(request.method, request.full_path.rstrip("?"))
+
+    @app.after_request
+    async def time_response(response):
+        if g.get("profile_token") is not None:
+            g.profile_status = response.status_code
+            response.headers["Server-Timing"] = profiling.server_timing(profiling.current())
+        return response
+
+    @app.teardown_request
+    async def finish_profile(exc):
+        # Teardown runs even when the view raised and after_request was skipped.
+        token = g.pop("profile_token", None)
+        if token is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else None
+            profiling.finish(token, rule, g.get("profile_status", 500))
+
+
+def cached_view(*models):
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            if g.get("recent_write"):
+                return await view(*args, **kwargs)
+            full_key, html = page_cache.lookup(f"view:{request.full_path}", models)
+            if html is None:
+                html = await view(*args, **kwargs)
+                page_cache.store(full_key, html)
+            return html
+        return wrapper
+    return decorator
+
+
+async def cached_rows(session, key, models, stmt):
+    full_key, rows = page_cache.lookup(key, models)
+    if rows is None:
+        rows = (await session.execute(stmt)).all()
+        page_cache.store(full_key, rows)
+    return rows
+
+
+def caregiver_options(session):
+    return cached_rows(session, "options:caregivers", (Caregiver, User), select(
+        Caregiver.caregiver_user_id, User.given_name, User.surname
+    ).join(User, Caregiver.caregiver_user_id == User.user_id).order_by(Caregiver.caregiver_user_id))
+
+
+def member_options(session):
+    return cached_rows(session, "options:members", (Member, User), select(
+        Member.member_user_id, User.given_name, User.surname
+    ).join(User, Member.member_user_id == User.user_id).order_by(Member.member_user_id))
+
+
+def job_options(session):
+    return cached_rows(session, "options:jobs", (Job,), select(
+        Job.job_id, Job.member_user_id
+    ).order_by(Job.job_id))
+
+
+# Lists are paged only: ?stream=1 is ignored here, so _pager.html hides its "All rows" link.
+app.jinja_env.globals["list_streaming"] = False
+
+
+async def paginate(session, stmt, columns, descending=False):
+    per_page = page_size_from(request.args)
+    after, before = request.args.get("after"), request.args.get("before")
+    try:
+        stmt = keyset_query(stmt, columns, after, before, per_page, descending)
+    except ValueError:
+        abort(400)
+    rows = (await session.scalars(stmt)).all()
+    return page_from_rows(rows, columns, after, before, per_page), per_page
+
+
+@app.route("/")
+async def index():
+    return await render_template("index.html")
+
+@app.route("/users")
+@cached_view(User)
+async def users_list():
+    async with Session() as session:
+        page, per_page = await paginate(session, select(User).options(raiseload("*")), [User.user_id])
+        return await render_template("users/list.html", page=page, per_page=per_page)
+
+@app.route("/users/new", methods=["GET","POST"])
+async def users_new():
+    async with Session() as session:
+        try:
+            if request.method == "POST":
+                form = await request.form
+                u = User(email=form["email"], given_name=form["given_name"], surname=form["surname"],
+                         city=form.get("city"), phone_number=form.get("phone_number"),
+                         profile_description=form.get("profile_description"), password=await credentials.hash_password_async(form.get("password")))
+                session.add(u)
+                await session.commit()
+                await flash("User created")
+                return redirect(url_for("users_list"))
+            return await render_template("users/form.html")
+        except credentials.MissingPassword as e:
+            await session.rollback()
+            await flash(f"Error: {str(e)}")
+            return await render_template("users/form.html"), 400
+        except Exception as e:
+            await session.rollback()
+            await flash(f"Error: {str(e)}")
+            return await render_template("users/form.html")
+
+# --- Caregivers list & create ---
+@app.route("/caregivers")
+@cached_view(Caregiver, User)
+async def caregivers_list():
+    async with Session() as session:
+        stmt = select(Caregiver).join(User, Caregiver.caregiver_user_id == User.user_id).\
+            options(contains_eager(Caregiver.user), raiseload("*"))
+        page, per_page = await paginate(session, stmt, [Caregiver.caregiver_user_id])
+        return await render_template("caregivers/list.html", page=page, per_page=per_page)
+
+@app.route("/caregivers/new", methods=["GET","POST"])
+async def caregivers_new():
+    async with Session() as session:
+        try:
+            if request.method == "POST":
+                form = await request.form
+                u = User(email=form["email"], given_name=form["given_name"], surname=form["surname"],
+                         city=form.get("city"), phone_number=form.get("phone_number"),
+                         profile_description=form.get("profile_description"),
+                         password=await credentials.hash_password_async(form.get("password")))
+                u.caregiver = Caregiver(photo=form.get("photo"), gender=form.get("gender"),
+                                        caregiving_type=form["caregiving_type"], hourly_rate=Decimal(form["hourly_rate"]))
+                session.add(u)
+                await session.commit()
+                await flash("Caregiver created")
+                return redirect(url_for("caregivers_list"))
+            return await render_template("caregivers/form.html")
+        except credentials.MissingPassword as e:
+            await session.rollback()
+            await flash(f"Error: {str(e)}")
+            return await render_template("caregivers/form.html"), 400
+        except Exception as e:
+            await session.rollback()
+            await flash(f"Error: {str(e)}")
+            return await render_template("caregivers/form.html")
+
+# --- Members list & create ---
+@app.route("/members")
+@cached_view(Member, User)
+async def members_list():
+    async with Session() as session:
+        stmt = select(Member).join(User, Member.member_user_id == User.user_id).\
+            options(contains_eager(Member.user), raiseload("*"))
+        page, per_page = await paginate(session, stmt, [Member.member_user_id])
+        return await render_template("members/list.html", page=page, per_page=per_page)
+
+@app.route("/members/new", methods=["GET","POST"])
+async def members_new():
+    async with Session() as session:
+        try:
+            if request.method == "POST":
+                form = await request.form
+                u = User(email=form["email"], given_name=form["given_name"], surname=form["surname"],
+                         city=form.get("city"), phone_number=form.get("phone_number"),
+                         profile_description=form.get("profile_description"), password=await credentials.hash_password_async(form.get("password")))
+                u.member = Member(house_rules=form.get("house_rules"),
+                                  dependent_description=form.get("dependent_description"))
+                if form.get("street"):
+                    u.member.address = Address(house_number=form.get("house_number"), street=form["street"],
+                                               town=form.get("town"))
+                session.add(u)
+                await session.commit()
+                await flash("Member created")
+                return redirect(url_for("members_list"))
+            return await render_template("members/form.html")
+        except credentials.MissingPassword as e:
+            await session.rollback()
+            await flash(f"Error: {str(e)}")
+            return await render_template("members/form.html"), 400
+        except Exception as e:
+            await session.rollback()
+            await flash(f"Error: {str(e)}")
+            return await render_template("members/form.html")
+
+# --- Jobs list & create ---
+@app.route("/jobs")
+@cached_view(Job)
+async def jobs_list():
+    async with Session() as session:
+        stmt = select(Job).options(raiseload("*"))
+        page, per_page = await paginate(session, stmt, [Job.date_posted, Job.job_id], descending=True)
+        return await render_template("jobs/list.html", page=page, per_page=per_page)
+
+@app.route("/jobs/new", methods=["GET","POST"])
+async def jobs_new():
+    async with Session() as session:
+        try:
+            if request.method == "POST":
+                form = await request.form
+                j = Job(member_user_id=int(form["member_user_id"]),
+                        required_caregiving_type=form["required_caregiving_type"],
+                        other_requirements=form.get("other_requirements"),
+                        date_posted=date.fromisoformat(form["date_posted"]) if form.get("date_posted") else None)
+                session.add(j)
+                await session.commit()
+                await flash("Job created")
+                return redirect(url_for("jobs_list"))
+            return await render_template("jobs/form.html", members=await member_options(session))
+        except Exception as e:
+            await session.rollback()
+            await flash(f"Error: {str(e)}")
+            return await render_template("jobs/form.html", members=await member_options(session))
+
+# --- Job applications (create) ---
+@app.route("/job_applications/new", methods=["GET","POST"])
+async def job_applications_new():
+    async with Session() as session:
+        try:
+            if request.method == "POST":
+                form = await request.form
+                ja = JobApplication(caregiver_user_id=int(form["caregiver_user_id"]), job_id=int(form["job_id"]),
+                                    date_applied=date.today())
+                session.add(ja)
+                await session.commit()
+                await flash("Application created")
+                return redirect(url_for("jobs_list"))
+            return await render_template("job_applications/form.html",
+                                         caregivers=await caregiver_options(session), jobs=await job_options(session))
+        except Exception as e:
+            await session.rollback()
+            await flash(f"Error: {str(e)}")
+            return await render_template("job_applications/form.html",
+                                         caregivers=await caregiver_options(session), jobs=await job_options(session))
+
+# --- Appointments (list + create) ---
+@app.route("/appointments")
+@cached_view(Appointment)
+async def appointments_list():
+    async with Session() as session:
+        page, per_page = await paginate(session, select(Appointment).options(raiseload("*")),
+                                        [Appointment.appointment_date, Appointment.appointment_id], descending=True)
+        return await render_template("appointments/list.html", page=page, per_page=per_page)
+
+@app.route("/appointments/new", methods=["GET","POST"])
+async def appointments_new():
+    async with Session() as session:
+        try:
+            if request.method == "POST":
+                form = await request.form
+                a = Appointment(caregiver_user_id=int(form["caregiver_user_id"]),
+                                member_user_id=int(form["member_user_id"]),
+                                appointment_date=date.fromisoformat(form["appointment_date"]),
+                                appointment_time=time_of_day.fromisoformat(form["appointment_time"]),
+                                work_hours=Decimal(form["work_hours"]), status=form["status"])
+                scheduler = scheduling.shared_scheduler(get_engine())
+                # Same booking lock as the sync app, awaited off the event loop; the calendar
+                # is re-read in this transaction and the database rejects what slips through.
+                async with scheduler.booking_async(a.caregiver_user_id, session):
+                    if a.status in scheduling.ACTIVE_STATUSES:
+                        scheduler.check(a.caregiver_user_id, a.appointment_date, a.appointment_time, a.work_hours)
+                    session.add(a)
+                    await session.commit()
+                await flash("Appointment created")
+                return redirect(url_for("appointments_list"))
+            return await render_template("appointments/form.html", caregivers=await caregiver_options(session),
+                                         members=await member_options(session))
+        except scheduling.ScheduleConflict as e:
+            await session.rollback()
+            await flash(f"Error: {str(e)}")
+            return await render_template("appointments/form.html", caregivers=await caregiver_options(session),
+                                         members=await member_options(session)), 409
+        except Exception as e:
+            await session.rollback()
+            await flash(f"Error: {str(e)}")
+            return await render_template("appointments/form.html", caregivers=await caregiver_options(session),
+                                         members=await member_options(session))
+
+@app.route("/api/caregivers/<int:caregiver_user_id>/free_slots")
+async def caregiver_free_slots(caregiver_user_id):
+    try:
+        date_from = date.fromisoformat(request.args["from"])
+        date_to = date.fromisoformat(request.args.get("to", request.args["from"]))
+        hours = Decimal(request.args.get("hours", "1"))
+        day_start = time_of_day.fromisoformat(request.args.get("day_start", scheduling.DAY_START.isoformat()))
+        day_end = time_of_day.fromisoformat(request.args.get("day_end", scheduling.DAY_END.isoformat()))
+    except (KeyError, ValueError, InvalidOperation):
+        abort(400)
+    if hours <= 0 or date_to < date_from or (date_to - date_from).days >= scheduling.MAX_SLOT_DAYS:
+        abort(400)
+    scheduler = scheduling.shared_scheduler(get_engine())
+    slots = await asyncio.to_thread(scheduler.free_slots, caregiver_user_id, date_from, date_to, hours,
+                                    day_start, day_end)
+    return jsonify(caregiver_user_id=caregiver_user_id, hours=float(hours),
+                   slots=[{"start": a.isoformat(), "end": b.isoformat()} for a, b in slots])
+
+# --- Search ---
+@app.route("/search")
+async def search():
+    q = request.args.get("q", "")
+    kind = request.args.get("type") or None
+    if kind and kind not in fulltext.KINDS:
+        abort(400)
+    city = request.args.get("city") or None
+    caregiving_type = request.args.get("caregiving_type") or None
+    async with Session() as session:
+        rows = await session.run_sync(fulltext.search, q, kinds=kind or fulltext.KINDS, city=city,
+                                      caregiving_type=caregiving_type, limit=page_size_from(request.args))
+        return await render_template("search.html", rows=rows, q=q, kind=kind, city=city,
+                                     caregiving_type=caregiving_type, kinds=fulltext.KINDS)
+
+# --- Matching ---
+@app.route("/api/jobs/<int:job_id>/matches")
+async def job_matches(job_id):
+    k = max(1, min(request.args.get("k", matching.DEFAULT_K, type=int), matching.MAX_K))
+    max_rate = request.args.get("max_rate", type=float)
+    # The first build reads every caregiver and each lookup reads the job: both block.
+    matches = await asyncio.to_thread(matching.shared_index(get_engine()).top_k, job_id, k, max_rate)
+    if matches is None:
+        abort(404)
+    return jsonify(job_id=job_id, matches=[m._asdict() for m in matches])
+
+# --- Sign in ---
+@app.route("/login", methods=["GET","POST"])
+async def login():
+    if request.method == "GET":
+        return await render_template("login.html")
+    form = await request.form
+    email = form["email"]
+    async with Session() as session:
+        try:
+            user = await credentials.authenticate_async(session, email, form["password"])
+            user_id = user.user_id if user is not None else None
+            user_email = user.email if user is not None else None
+            await session.commit()
+        except credentials.PoolBusy:
+            await session.rollback()
+            return await render_template("login.html", email=email,
+                                         error="Too many sign-ins right now, try again shortly"), 503
+    if user_id is None:
+        return await render_template("login.html", email=email, error="Invalid email or password"), 401
+    client_session["user_id"] = user_id
+    client_session["email"] = user_email
+    await flash("Signed in")
+    return redirect(url_for("index"))
+
+# --- Metrics ---
+@app.route("/metrics")
+async def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# --- Reports ---
+REPORT_PREVIEW_ROWS = 20
+# A run fans out over REPORT_WORKERS connections; cache misses queue here instead of piling up.
+_report_runs = asyncio.Semaphore(int(os.environ.get("REPORT_CONCURRENCY", 1)))
+
+@app.route("/reports")
+@cached_view(*reporting.SOURCE_MODELS)
+async def reports():
+    # reporting.run() fans out over its own thread pool and sync connections; wait for it off the event loop.
+    async with _report_runs:
+        report_run = await asyncio.to_thread(reporting.run)
+    tables = []
+    for name in reporting.DASHBOARD:
+        result = report_run.results[name]
+        rows, extra = result if isinstance(result, tuple) else (result, None)
+        tables.append(dict(name=name, rows=rows[:REPORT_PREVIEW_ROWS], count=len(rows), extra=extra,
+                           ms=report_run.timings[name] * 1000, fused=report_run.fused.get(name)))
+    return await render_template("reports.html", run=report_run, tables=tables)
+
+# --- Query profiling ---
+@app.route("/debug/queries")
+async def debug_queries():
+    if not profiling.debug_panel_enabled(app):
+        abort(404)
+    profiles = profiling.recent(request.args.get("limit", 20, type=int))
+    if request.args.get("format") == "json":
+        return jsonify(profiles=[p.as_dict() for p in profiles])
+    return await render_template("debug/queries.html", profiles=profiles, threshold=profiling.N_PLUS_ONE)
+
+# --- Bulk export ---
+async def _in_thread(iterator):
+    # The CSV exporter is a blocking generator; pull each chunk on a worker thread.
+    done = object()
+    while True:
+        chunk = await asyncio.to_thread(next, iterator, done)
+        if chunk is done:
+            return
+        yield chunk
+
+@app.route("/export/<name>.csv")
+async def export_csv(name):
+    if client_session.get("user_id") is None:
+        abort(401)
+    if not data_io.may_export(client_session.get("email")):
+        abort(403)
+    if name not in data_io.TABLES:
+        abort(404)
+    return Response(_in_thread(data_io.stream_export(name, bind=get_engine())), mimetype="text/csv",
+                    headers={"Content-Disposition": f"attachment; filename={name}.csv"})
+
+if __name__ == "__main__":
+    port = int(os.environ.get("PORT", 5000))
+    app.run(host='0.0.0.0', port=port, debug=False)
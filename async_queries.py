@@ -0,0 +1,74 @@
+"""
+Async equivalents of the reports in queries.py.
+
+Each wrapper runs the very same query code (queries.REPORTS[name].query)
+through AsyncSession.run_sync on the asyncio engine, so the SQL is defined
+once.  dashboard() runs several reports concurrently, each on its own
+connection:
+
+    results = asyncio.run(dashboard())
+"""
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import queries
+from db import get_async_engine
+
+DASHBOARD_REPORTS = (
+    "count_applicants_per_job",
+    "total_hours_by_caregiver_for_accepted",
+    "average_pay_of_caregivers",
+    "caregivers_earning_above_average",
+    "total_cost_all_accepted",
+)
+
+_session_factory = None
+
+
+def AsyncSession():
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = async_sessionmaker(get_async_engine(), expire_on_commit=False)
+    return _session_factory()
+
+
+async def run_report(name, *args, **kwargs):
+    report = queries.REPORTS[name]
+    async with AsyncSession() as session:
+        return await session.run_sync(report.query, *args, **kwargs)
+
+
+def _async_report(name):
+    async def wrapper(*args, **kwargs):
+        return await run_report(name, *args, **kwargs)
+    wrapper.__name__ = wrapper.__qualname__ = name
+    wrapper.__doc__ = queries.REPORTS[name].__doc__
+    return wrapper
+
+
+accepted_appointments_names = _async_report("accepted_appointments_names")
+jobs_with_soft_spoken = _async_report("jobs_with_soft_spoken")
+babysitter_work_hours = _async_report("babysitter_work_hours")
+members_looking_elderly_astana_no_pets = _async_report("members_looking_elderly_astana_no_pets")
+search = _async_report("search")
+count_applicants_per_job = _async_report("count_applicants_per_job")
+total_hours_by_caregiver_for_accepted = _async_report("total_hours_by_caregiver_for_accepted")
+average_pay_of_caregivers = _async_report("average_pay_of_caregivers")
+caregivers_earning_above_average = _async_report("caregivers_earning_above_average")
+total_cost_all_accepted = _async_report("total_cost_all_accepted")
+fetch_job_applicants_view = _async_report("fetch_job_applicants_view")
+fetch_job_applicants = _async_report("fetch_job_applicants")
+fetch_job_applicants_page = _async_report("fetch_job_applicants_page")
+
+
+async def dashboard(names=DASHBOARD_REPORTS):
+    """Run the named reports concurrently; returns {name: result}."""
+    results = await asyncio.gather(*(run_report(name) for name in names))
+    return dict(zip(names, results))
+
+
+if __name__ == "__main__":
+    for name, result in asyncio.run(dashboard()).items():
+        rows = result[0] if isinstance(result, tuple) else result
+        print(f"{name}: {len(rows)} rows")
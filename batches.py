@@ -0,0 +1,163 @@
+"""
+Chunked, resumable set-based UPDATE/DELETE.
+
+A batch operation walks the keys selected by a query in ascending order,
+`batch_size` at a time (keyset: WHERE key > last ORDER BY key LIMIT n), and
+applies its statements to one chunk per transaction.  Locks are held for one
+chunk only and WAL is written in small pieces, so live traffic keeps moving;
+`pause` adds a sleep between chunks for extra headroom.
+
+The last key of every committed chunk is written to batch_checkpoint in the
+same transaction as the chunk itself.  If a run dies, running the same
+operation again continues after the last committed chunk instead of
+starting over (which matters for non-idempotent updates such as adding a
+commission); once a run completes, the next run starts from the beginning.
+
+    python batches.py add_commission_to_caregivers --batch-size 500 --pause 0.05
+"""
+import argparse
+import sys
+import time
+
+from sqlalchemy import (
+    Table, Column, Integer, String, DateTime, Boolean, MetaData, func, select, insert, update
+)
+
+DEFAULT_BATCH_SIZE = 1000
+
+checkpoint_metadata = MetaData()
+batch_checkpoint = Table(
+    "batch_checkpoint", checkpoint_metadata,
+    Column("name", String(100), primary_key=True),
+    Column("last_key", Integer),
+    Column("keys_done", Integer, nullable=False, default=0),
+    Column("rows_done", Integer, nullable=False, default=0),
+    Column("finished", Boolean, nullable=False, default=False),
+    Column("updated_at", DateTime, nullable=False, server_default=func.current_timestamp()),
+)
+
+
+class BatchProgress:
+    def __init__(self, name, total=None, resumed_from=None):
+        self.name = name
+        self.total = total
+        self.resumed_from = resumed_from
+        self.last_key = resumed_from
+        self.batches = 0
+        self.keys_done = 0
+        self.rows_done = 0
+        self.rows_before = 0  # rows done by earlier, interrupted runs
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return (self.rows_done - self.rows_before) / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        done = f"{self.keys_done}/{self.total}" if self.total is not None else str(self.keys_done)
+        return (f"{self.name}: batch {self.batches}, keys {done}, rows {self.rows_done}, "
+                f"{self.rows_per_second:,.0f} rows/s, {self.elapsed:.1f}s")
+
+
+def print_progress(progress):
+    print(progress, file=sys.stderr)
+
+
+def _load_checkpoint(session, name):
+    return session.execute(select(batch_checkpoint).where(batch_checkpoint.c.name == name)).first()
+
+
+def _save_checkpoint(session, name, progress, finished=False):
+    values = dict(last_key=progress.last_key, keys_done=progress.keys_done, rows_done=progress.rows_done,
+                  finished=finished, updated_at=func.current_timestamp())
+    updated = session.execute(update(batch_checkpoint).where(batch_checkpoint.c.name == name).values(**values))
+    if updated.rowcount == 0:
+        session.execute(insert(batch_checkpoint).values(name=name, **values))
+
+
+def run(name, keys, apply, session_factory, batch_size=DEFAULT_BATCH_SIZE, resume=True,
+        pause=0.0, progress=None, count_total=True):
+    """
+    Run a batch operation and return its BatchProgress.
+
+    keys:     select() of one integer column, filtered to the rows to process
+              (the column should be indexed, e.g. a primary key)
+    apply:    apply(session, key_list) -> affected row count; runs the chunk's
+              statements, the commit is done here
+    progress: called with the BatchProgress after every committed chunk
+    """
+    key = keys.selected_columns[0]
+    session = session_factory()
+    try:
+        checkpoint_metadata.create_all(session.connection())
+        saved = _load_checkpoint(session, name) if resume else None
+        after = saved.last_key if saved is not None and not saved.finished else None
+        state = BatchProgress(name, resumed_from=after)
+        if after is not None:
+            state.keys_done, state.rows_done = saved.keys_done, saved.rows_done
+            state.rows_before = saved.rows_done
+        if count_total:
+            remaining = keys if after is None else keys.where(key > after)
+            state.total = state.keys_done + session.execute(
+                select(func.count()).select_from(remaining.subquery())).scalar()
+        session.commit()
+
+        while True:
+            chunk = keys.order_by(key).limit(batch_size)
+            if state.last_key is not None:
+                chunk = chunk.where(key > state.last_key)
+            ids = session.execute(chunk).scalars().all()
+            if not ids:
+                break
+            affected = apply(session, ids)
+            state.batches += 1
+            state.keys_done += len(ids)
+            state.rows_done += affected if affected is not None and affected >= 0 else len(ids)
+            state.last_key = ids[-1]
+            _save_checkpoint(session, name, state)
+            session.commit()
+            state.elapsed = time.perf_counter() - state.started
+            if progress is not None:
+                progress(state)
+            if len(ids) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+        _save_checkpoint(session, name, state, finished=True)
+        session.commit()
+        state.elapsed = time.perf_counter() - state.started
+        return state
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def main(argv=None):
+    import queries
+    import credentials
+
+    operations = {
+        "add_commission_to_caregivers": queries.add_commission_to_caregivers,
+        "delete_members_on_kabanbay_batyr": queries.delete_members_on_kabanbay_batyr,
+        "rehash_passwords": credentials.rehash_passwords,
+    }
+    parser = argparse.ArgumentParser(description="Run a chunked maintenance operation")
+    parser.add_argument("operation", choices=sorted(operations))
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between chunks")
+    parser.add_argument("--restart", action="store_true", help="ignore an unfinished checkpoint")
+    args = parser.parse_args(argv)
+
+    state = operations[args.operation](batch_size=args.batch_size, pause=args.pause,
+                                       resume=not args.restart, progress=print_progress)
+    if state.resumed_from is not None:
+        print(f"resumed after key {state.resumed_from}")
+    print(state)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Query result / rendered fragment cache with write-driven invalidation.
+
+Entries are tagged with the tables they were built from.  Every table has a
+generation counter that is part of the cache key; a commit that inserted,
+updated or deleted rows of a table bumps its generation, so every entry
+built from it stops matching at once and ages out of the backend.
+
+Backends (CACHE_URL):
+
+    memory://              in-process LRU with TTL (default)
+    redis://host:6379/0    shared between processes; needs the redis package
+
+    CACHE_TTL              seconds an entry lives                     (default 60)
+    CACHE_MAX_ENTRIES      LRU capacity of the memory backend         (default 1024)
+
+Only ORM writes are seen by watch(); code that changes rows with Core or raw
+SQL has to call cache.invalidate(table_name, ...) itself.  Invalidation is
+per process with the memory backend: other workers keep their copies until
+the TTL expires.  Values stored here should be read from the primary; a
+lagging replica read right after a generation bump would stay cached for
+the whole TTL.
+"""
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session as OrmSession
+
+import metrics
+
+try:
+    import redis
+except ImportError:  # optional, only needed for CACHE_URL=redis://...
+    redis = None
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class MemoryBackend:
+    """Thread-safe LRU with a per-entry expiry time."""
+
+    name = "memory"
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def counters(self, keys):
+        with self._lock:
+            return [self._counters.get(k, 0) for k in keys]
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shared backend; any client with get/set/mget/incr/scan_iter/delete can stand in for redis."""
+
+    name = "redis"
+    evictions = 0  # evictions happen inside redis (maxmemory-policy)
+
+    def __init__(self, url=None, client=None, prefix="cache:"):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("CACHE_URL is a redis:// URL but the redis package is not installed")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=int(ttl))
+
+    def counters(self, keys):
+        return [int(v or 0) for v in self.client.mget([self.prefix + k for k in keys])]
+
+    def incr(self, key):
+        self.client.incr(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(self.prefix + "*"))
+
+
+def _table_name(model):
+    return model if isinstance(model, str) else inspect(model).local_table.name
+
+
+class Cache:
+    def __init__(self, backend, ttl=DEFAULT_TTL, name="default"):
+        self.backend = backend
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        _caches.append(self)
+
+    def _key(self, key, tables):
+        generations = self.backend.counters([f"gen:{t}" for t in tables])
+        return key + "|" + ",".join(f"{t}@{g}" for t, g in zip(tables, generations))
+
+    def lookup(self, key, models):
+        """
+        (full_key, value) for `key` built from `models` (mapped classes or table
+        names); value is None on a miss, then store(full_key, ...) fills it in.
+        """
+        tables = sorted({_table_name(m) for m in models})
+        full_key = self._key(key, tables)
+        value = self.backend.get(full_key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return full_key, value
+
+    def store(self, full_key, value, ttl=None):
+        self.backend.set(full_key, value, ttl or self.ttl)
+
+    def get_or_set(self, key, models, compute, ttl=None):
+        """Return the cached value for `key`, or compute() and store it."""
+        full_key, value = self.lookup(key, models)
+        if value is None:
+            value = compute()
+            self.store(full_key, value, ttl)
+        return value
+
+    def invalidate(self, *models):
+        for table in {_table_name(m) for m in models}:
+            self.backend.incr(f"gen:{table}")
+
+    def clear(self):
+        self.backend.clear()
+
+
+_caches = []
+
+
+def from_env(name="default"):
+    url = os.environ.get("CACHE_URL", "memory://")
+    ttl = float(os.environ.get("CACHE_TTL", DEFAULT_TTL))
+    if url.startswith("redis"):
+        backend = RedisBackend(url)
+    elif url.startswith("memory"):
+        backend = MemoryBackend(int(os.environ.get("CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)))
+    else:
+        raise ValueError(f"Unsupported CACHE_URL {url!r}")
+    return Cache(backend, ttl=ttl, name=name)
+
+
+def watch(cache, session_class=OrmSession):
+    """Invalidate the tables a session wrote to once its transaction commits."""
+    # One set per watch, so a cache watching a parent session class does not consume this one's.
+    info_key = f"cache_dirty_tables:{id(cache)}"
+
+    def _dirty(session):
+        return session.info.setdefault(info_key, set())
+
+    @event.listens_for(session_class, "after_flush")
+    def _after_flush(session, flush_context):
+        tables = _dirty(session)
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            tables.update(t.name for t in inspect(obj).mapper.tables)
+
+    @event.listens_for(session_class, "do_orm_execute")
+    def _bulk_statement(orm_execute_state):
+        if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+            mapper = orm_execute_state.bind_mapper
+            if mapper is not None:
+                _dirty(orm_execute_state.session).update(t.name for t in mapper.tables)
+
+    @event.listens_for(session_class, "after_commit")
+    def _after_commit(session):
+        tables = session.info.pop(info_key, None)
+        if tables:
+            cache.invalidate(*tables)
+
+    @event.listens_for(session_class, "after_rollback")
+    def _after_rollback(session):
+        session.info.pop(info_key, None)
+
+    return cache
+
+
+@metrics.register
+def cache_metrics():
+    def family(name, kind, help_text, value):
+        return (name, kind, help_text,
+                [({"cache": c.name, "backend": c.backend.name}, value(c)) for c in _caches])
+    return [
+        family("cache_hits_total", "counter", "Cache lookups answered from the cache", lambda c: c.hits),
+        family("cache_misses_total", "counter", "Cache lookups that had to compute the value", lambda c: c.misses),
+        family("cache_evictions_total", "counter", "Entries dropped to stay within capacity",
+               lambda c: c.backend.evictions),
+    ]
@@ -0,0 +1,372 @@
+"""
+Password hashing.
+
+Passwords are stored as scrypt hashes (hashlib.scrypt) in a self-describing
+string that records the parameters they were made with:
+
+    scrypt$<n>$<r>$<p>$<salt>$<hash>          (urlsafe base64, no padding)
+
+The cost is chosen per environment: PASSWORD_COST picks a preset (low for
+tests and local seeding, default, high) and PASSWORD_SCRYPT_N/R/P override
+single parameters.  One hash needs about 128 * n * r bytes of memory, so the
+cost is a CPU and a memory budget.
+
+Hashing runs in a bounded pool of worker processes per server process, so a
+burst of signups queues for PASSWORD_HASH_WORKERS CPUs instead of stalling
+every request thread of the worker; at most PASSWORD_HASH_QUEUE hashes are
+running or waiting, further callers wait up to PASSWORD_HASH_TIMEOUT seconds
+for a slot and then get PoolBusy.  The pool is started on first use with the
+spawn method (forking a threaded server is unsafe) and is never inherited
+across fork.
+
+authenticate() checks a login and rehashes the password when it was stored
+with other parameters than the current ones, so raising the cost upgrades
+accounts as they sign in.  Rows that still hold a plaintext password (from
+before hashing, or seed_data.generate(plaintext_passwords=True)) are
+accepted and upgraded the same way; a value starting with "scrypt$" is
+always treated as a hash, so a damaged one fails instead of matching its own
+text.  rehash_passwords() converts the plaintext rows in resumable batches,
+hashing each batch in parallel on the pool:
+
+    python batches.py rehash_passwords --batch-size 500
+
+    PASSWORD_COST          low / default / high                       (default default)
+    PASSWORD_SCRYPT_N      CPU/memory cost, a power of two            (preset)
+    PASSWORD_SCRYPT_R      block size                                 (preset)
+    PASSWORD_SCRYPT_P      parallelism                                (preset)
+    PASSWORD_HASH_WORKERS  hashing processes, 0 = hash in the caller  (default min(4, CPUs))
+    PASSWORD_HASH_QUEUE    hashes running or waiting per process      (default 4 * workers)
+    PASSWORD_HASH_TIMEOUT  seconds to wait for a slot                 (default 10)
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import bindparam, not_, select, update
+from sqlalchemy.orm import sessionmaker
+
+from models import User
+from db import get_engine
+import batches
+import metrics
+
+ALGORITHM = "scrypt"
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+class Cost(namedtuple("Cost", "n r p")):
+    __slots__ = ()
+
+    @property
+    def maxmem(self):
+        # OpenSSL needs 128 * r * (n + p + 2) bytes; leave some headroom.
+        return 128 * self.r * (self.n + self.p + 2) + 1024 * 1024
+
+    def __str__(self):
+        return f"n={self.n} r={self.r} p={self.p}"
+
+
+COSTS = {
+    "low": Cost(2 ** 10, 8, 1),       # ~1 MB, tests and local seeding only
+    "default": Cost(2 ** 14, 8, 1),   # ~16 MB
+    "high": Cost(2 ** 16, 8, 1),      # ~64 MB
+}
+
+
+def cost_from_env():
+    preset = COSTS[os.environ.get("PASSWORD_COST", "default").strip().lower()]
+    return Cost(int(os.environ.get("PASSWORD_SCRYPT_N", preset.n)),
+                int(os.environ.get("PASSWORD_SCRYPT_R", preset.r)),
+                int(os.environ.get("PASSWORD_SCRYPT_P", preset.p)))
+
+
+COST = cost_from_env()
+WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+QUEUE = int(os.environ.get("PASSWORD_HASH_QUEUE", 4 * max(WORKERS, 1)))
+TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))
+
+
+class PoolBusy(RuntimeError):
+    """No hashing slot became free within PASSWORD_HASH_TIMEOUT."""
+
+
+class MissingPassword(ValueError):
+    """A new account was submitted without a password."""
+
+
+def configure(cost):
+    """Hash new passwords with `cost` (a Cost or a COSTS name) from now on."""
+    global COST
+    COST = COSTS[cost] if isinstance(cost, str) else cost
+
+
+# --- the hash format (runs inside the pool's processes) ---
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _derive(password, salt, cost):
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=cost.n, r=cost.r, p=cost.p,
+                          maxmem=cost.maxmem, dklen=HASH_BYTES)
+
+
+def _hash(password, cost):
+    salt = os.urandom(SALT_BYTES)
+    return "$".join((ALGORITHM, str(cost.n), str(cost.r), str(cost.p), _b64(salt), _b64(_derive(password, salt, cost))))
+
+
+def _parse(stored):
+    """(Cost, salt, hash) of a stored scrypt hash, or None for anything else (plaintext)."""
+    parts = stored.split("$")
+    if len(parts) != 6 or parts[0] != ALGORITHM:
+        return None
+    try:
+        return Cost(int(parts[1]), int(parts[2]), int(parts[3])), _unb64(parts[4]), _unb64(parts[5])
+    except ValueError:
+        return None
+
+
+def _verify(password, stored):
+    if not stored.startswith(ALGORITHM + "$"):
+        # Legacy plaintext row; accepted until it is rehashed.
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+    parsed = _parse(stored)
+    if parsed is None:
+        return False  # truncated or corrupted hash: its text is not a password
+    cost, salt, expected = parsed
+    try:
+        return hmac.compare_digest(_derive(password, salt, cost), expected)
+    except (ValueError, TypeError, OverflowError):
+        return False  # parameters hashlib.scrypt refuses (n not a power of two, negative, too large)
+
+
+def needs_rehash(stored, cost=None):
+    """True when `stored` is plaintext or was hashed with other parameters than `cost`."""
+    parsed = _parse(stored)
+    return parsed is None or parsed[0] != (cost or COST)
+
+
+# --- the pool ---
+
+class HashPool:
+    def __init__(self, workers=WORKERS, queue=QUEUE, timeout=TIMEOUT):
+        self.workers = workers
+        self.queue = queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(queue, 1))
+        self._executor = None
+        self._lock = threading.Lock()
+        # Metrics.
+        self.in_flight = 0
+        self.calls = Counter()       # operation -> calls
+        self.seconds = Counter()     # operation -> seconds spent, waiting included
+        self.rejected = 0
+        self.rehashed = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def _run(self, operation, fn, *args):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.rejected += 1
+            raise PoolBusy(f"password hashing is saturated ({self.queue} in flight)")
+        with self._lock:
+            self.in_flight += 1
+        try:
+            if self.workers == 0:
+                return fn(*args)
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.in_flight -= 1
+                self.calls[operation] += 1
+                self.seconds[operation] += time.perf_counter() - started
+
+    def hash(self, password, cost=None):
+        return self._run("hash", _hash, password, cost or COST)
+
+    def verify(self, password, stored):
+        return self._run("verify", _verify, password, stored)
+
+    def hash_many(self, passwords, cost=None):
+        """Hashes of `passwords` in order, spread over every worker (for bulk jobs, not requests)."""
+        passwords = list(passwords)
+        cost = cost or COST
+        started = time.perf_counter()
+        if self.workers == 0 or len(passwords) < 2:
+            hashes = [_hash(p, cost) for p in passwords]
+        else:
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            hashes = list(self._get_executor().map(_hash, passwords, [cost] * len(passwords), chunksize=chunksize))
+        with self._lock:
+            self.calls["hash"] += len(passwords)
+            self.seconds["hash"] += time.perf_counter() - started
+        return hashes
+
+    def count_rehash(self):
+        with self._lock:
+            self.rehashed += 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    """The process-wide HashPool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashPool()
+        return _pool
+
+
+def _forget_pool():
+    # A forked child must start its own pool; the parent's worker processes are not its children.
+    global _pool, _pool_lock
+    _pool, _pool_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_pool)
+
+
+def hash_password(password, cost=None):
+    """Hash for storing in User.password, computed on the pool; an empty password raises MissingPassword."""
+    if not password:
+        raise MissingPassword("a password is required")
+    return pool().hash(password, cost)
+
+
+def verify_password(password, stored):
+    return pool().verify(password, stored)
+
+
+def hash_passwords(passwords, cost=None):
+    return pool().hash_many(passwords, cost)
+
+
+async def hash_password_async(password, cost=None):
+    if not password:
+        raise MissingPassword("a password is required")
+    # A thread waits for the slot and the worker, so the event loop never blocks.
+    return await asyncio.to_thread(hash_password, password, cost)
+
+
+# --- login ---
+
+_dummy_hashes = {}
+
+
+def _dummy_hash():
+    """A hash at the current cost to verify against for unknown emails, so they take as long as known ones."""
+    if COST not in _dummy_hashes:
+        _dummy_hashes[COST] = hash_password(os.urandom(8).hex())
+    return _dummy_hashes[COST]
+
+
+def authenticate(session, email, password):
+    """
+    The User with this email and password, or None.  A password stored as
+    plaintext or with outdated parameters is replaced by a current hash on
+    the user; the caller commits.
+    """
+    user = session.scalars(select(User).where(User.email == email)).first()
+    stored = user.password if user is not None else _dummy_hash()
+    if not verify_password(password, stored) or user is None:
+        return None
+    if needs_rehash(stored):
+        user.password = hash_password(password)
+        pool().count_rehash()
+    return user
+
+
+async def authenticate_async(session, email, password):
+    """authenticate() for an AsyncSession."""
+    user = (await session.scalars(select(User).where(User.email == email))).first()
+    stored = user.password if user is not None else await asyncio.to_thread(_dummy_hash)
+    if not await asyncio.to_thread(verify_password, password, stored) or user is None:
+        return None
+    if needs_rehash(stored):
+        user.password = await hash_password_async(password)
+        pool().count_rehash()
+    return user
+
+
+# --- bulk migration of plaintext rows ---
+
+_users = User.__table__
+_replace_password = update(_users).\
+    where(_users.c.user_id == bindparam("b_user_id"), _users.c.password == bindparam("b_old")).\
+    values(password=bindparam("b_new"))
+
+
+def _rehash_chunk(session, ids):
+    rows = session.execute(select(User.user_id, User.password).
+                           where(User.user_id.in_(ids), not_(User.password.startswith(ALGORITHM + "$")))).all()
+    if not rows:
+        return 0
+    hashes = hash_passwords([r.password for r in rows])
+    # Matching on the old value leaves a password changed meanwhile alone.
+    session.execute(_replace_password, [
+        {"b_user_id": r.user_id, "b_old": r.password, "b_new": h} for r, h in zip(rows, hashes)
+    ])
+    return len(rows)
+
+
+def rehash_passwords(batch_size=500, pause=0.0, resume=True, progress=None, session_factory=None):
+    """
+    Replace every plaintext password by a hash at the current cost, in
+    resumable batches (see batches.run).  Rows that are already hashed, with
+    any parameters, are left to authenticate(): their plaintext is unknown.
+    """
+    keys = select(User.user_id).where(not_(User.password.startswith(ALGORITHM + "$")))
+    return batches.run("rehash_passwords", keys, _rehash_chunk,
+                       session_factory or sessionmaker(bind=get_engine()),
+                       batch_size=batch_size, resume=resume, pause=pause, progress=progress)
+
+
+@metrics.register
+def credential_metrics():
+    if _pool is None:
+        return []
+    with _pool._lock:
+        return [
+            ("password_hash_operations_total", "counter", "Password hashes and verifications computed",
+             [({"operation": op}, n) for op, n in sorted(_pool.calls.items())]),
+            ("password_hash_seconds_total", "counter", "Time spent hashing and verifying passwords, waits included",
+             [({"operation": op}, s) for op, s in sorted(_pool.seconds.items())]),
+            ("password_hash_in_flight", "gauge", "Hashes running or waiting for a worker",
+             [({}, _pool.in_flight)]),
+            ("password_hash_rejected_total", "counter", "Hash requests that found the pool saturated",
+             [({}, _pool.rejected)]),
+            ("password_rehashes_total", "counter", "Passwords rehashed at login with the current cost",
+             [({}, _pool.rehashed)]),
+            ("password_hash_cost", "gauge", "Current scrypt parameters",
+             [({"parameter": k}, v) for k, v in COST._asdict().items()]),
+        ]
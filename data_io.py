@@ -0,0 +1,218 @@
+"""
+Bulk CSV import/export for every table in models.py.
+
+    python data_io.py export dump/            # one <table>.csv per table
+    python data_io.py import dump/ --tables user caregiver
+
+Export streams rows through a server-side cursor (stream_results + yield_per),
+so memory use does not depend on table size.  Import uses COPY FROM STDIN on
+PostgreSQL/psycopg2 and falls back to batched executemany on other backends.
+Neither path builds ORM objects.
+
+The command line dumps whole tables.  The web export (stream_export) serves
+only the columns listed in EXPORT_COLUMNS, never the password hashes, and only
+to signed-in users whose email is in EXPORT_ADMIN_EMAILS (comma separated;
+when it is unset nobody may export).
+"""
+import argparse
+import csv
+import io
+import os
+import time
+
+from sqlalchemy import select, text
+
+from models import User, Caregiver, Member, Address, Job, JobApplication, Appointment
+from db import get_engine
+
+
+# Parents before children, so importing in this order satisfies the foreign keys.
+TABLES = {
+    "user": User.__table__,
+    "caregiver": Caregiver.__table__,
+    "member": Member.__table__,
+    "address": Address.__table__,
+    "job": Job.__table__,
+    "job_application": JobApplication.__table__,
+    "appointment": Appointment.__table__,
+}
+
+# Columns the web export may serve, per table.  USER.password is deliberately absent.
+EXPORT_COLUMNS = {
+    "user": ("user_id", "email", "given_name", "surname", "city", "phone_number", "profile_description"),
+    "caregiver": ("caregiver_user_id", "photo", "gender", "caregiving_type", "hourly_rate"),
+    "member": ("member_user_id", "house_rules", "dependent_description"),
+    "address": ("member_user_id", "house_number", "street", "town"),
+    "job": ("job_id", "member_user_id", "required_caregiving_type", "other_requirements", "date_posted"),
+    "job_application": ("caregiver_user_id", "job_id", "date_applied"),
+    "appointment": ("appointment_id", "caregiver_user_id", "member_user_id", "appointment_date",
+                    "appointment_time", "work_hours", "status"),
+}
+
+EXPORT_ADMIN_EMAILS = frozenset(
+    e.strip().lower() for e in os.environ.get("EXPORT_ADMIN_EMAILS", "").split(",") if e.strip()
+)
+
+STREAM_CHUNK_ROWS = 2000
+IMPORT_BATCH_SIZE = 5000
+
+
+def get_table(name):
+    try:
+        return TABLES[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown table {name!r}; expected one of {', '.join(TABLES)}")
+
+
+def may_export(email):
+    """Whether the signed-in user with this email may use the web export."""
+    return bool(email) and email.lower() in EXPORT_ADMIN_EMAILS
+
+
+def _csv_writer(buf):
+    # QUOTE_NONNUMERIC writes NULL as a bare empty field and '' as "", which is
+    # exactly how COPY ... (FORMAT csv) tells the two apart on the way back in.
+    return csv.writer(buf, quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+
+
+def _export_value(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return str(value)
+
+
+def iter_csv(table, connection, chunk_rows=STREAM_CHUNK_ROWS, stats=None, columns=None):
+    """Yield the table (or just `columns`) as CSV text chunks (header first) from a server-side cursor."""
+    selected = [table.c[name] for name in columns] if columns is not None else list(table.columns)
+    buf = io.StringIO()
+    writer = _csv_writer(buf)
+    writer.writerow([c.name for c in selected])
+
+    stmt = select(*selected).order_by(*table.primary_key.columns)
+    result = connection.execution_options(stream_results=True, yield_per=chunk_rows).execute(stmt)
+    for partition in result.partitions():
+        for row in partition:
+            writer.writerow([_export_value(v) for v in row])
+        if stats is not None:
+            stats["rows"] = stats.get("rows", 0) + len(partition)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def stream_export(name, bind=None):
+    """Generator for an HTTP response body; owns its connection for the lifetime of the stream."""
+    table = get_table(name)
+    with (bind or get_engine()).connect() as conn:
+        yield from iter_csv(table, conn, columns=EXPORT_COLUMNS[name.lower()])
+
+
+def export_table(name, path, bind=None):
+    table = get_table(name)
+    stats = {"rows": 0}
+    with (bind or get_engine()).connect() as conn, open(path, "w", newline="", encoding="utf-8") as f:
+        for chunk in iter_csv(table, conn, stats=stats):
+            f.write(chunk)
+    return stats["rows"]
+
+
+def _import_copy(conn, table, fileobj, columns):
+    cols = ", ".join(conn.dialect.identifier_preparer.quote(c) for c in columns)
+    name = conn.dialect.identifier_preparer.format_table(table)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {name} ({cols}) FROM STDIN WITH (FORMAT csv)", fileobj)
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def _convert(column, value):
+    if value == "":
+        return None
+    python_type = column.type.python_type
+    if python_type is str:
+        return value
+    if hasattr(python_type, "fromisoformat"):
+        return python_type.fromisoformat(value)
+    return python_type(value)
+
+
+def _import_executemany(conn, table, reader, columns, batch_size):
+    cols = [table.c[name] for name in columns]
+    insert = table.insert()
+    count = 0
+    batch = []
+    for row in reader:
+        batch.append({c.name: _convert(c, v) for c, v in zip(cols, row)})
+        if len(batch) >= batch_size:
+            conn.execute(insert, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        conn.execute(insert, batch)
+        count += len(batch)
+    return count
+
+
+def reset_sequence(conn, table):
+    # COPY/executemany with explicit ids bypasses the SERIAL sequence.
+    column = table.autoincrement_column
+    if conn.dialect.name != "postgresql" or column is None:
+        return
+    quote = conn.dialect.identifier_preparer
+    conn.execute(
+        text(f"SELECT setval(pg_get_serial_sequence(:t, :c), COALESCE(MAX({quote.quote(column.name)}), 1)) "
+             f"FROM {quote.format_table(table)}"),
+        {"t": quote.format_table(table), "c": column.name},
+    )
+
+
+def import_table(name, fileobj, bind=None, batch_size=IMPORT_BATCH_SIZE):
+    """Load CSV (with a header naming the columns) from a text file object; returns rows loaded."""
+    table = get_table(name)
+    header = next(csv.reader([fileobj.readline()]))
+    unknown = set(header) - set(table.c.keys())
+    if unknown:
+        raise ValueError(f"Unknown columns for {table.name}: {', '.join(sorted(unknown))}")
+
+    with (bind or get_engine()).begin() as conn:
+        if conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2":
+            count = _import_copy(conn, table, fileobj, header)
+        else:
+            count = _import_executemany(conn, table, csv.reader(fileobj), header, batch_size)
+        reset_sequence(conn, table)
+    return count
+
+
+def import_file(name, path, bind=None):
+    with open(path, newline="", encoding="utf-8") as f:
+        return import_table(name, f, bind=bind)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk CSV import/export")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("directory")
+    parser.add_argument("--tables", nargs="*", default=list(TABLES), choices=list(TABLES))
+    args = parser.parse_args(argv)
+
+    if args.action == "export":
+        os.makedirs(args.directory, exist_ok=True)
+    for name in [t for t in TABLES if t in args.tables]:
+        path = os.path.join(args.directory, f"{name}.csv")
+        start = time.perf_counter()
+        if args.action == "export":
+            count = export_table(name, path)
+        else:
+            if not os.path.exists(path):
+                continue
+            count = import_file(name, path)
+        elapsed = time.perf_counter() - start
+        print(f"{args.action} {name}: {count} rows in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
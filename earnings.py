@@ -0,0 +1,121 @@
+"""
+Incremental maintenance of the caregiver_earnings summary table.
+
+Row-level triggers on appointment add or subtract work_hours / count whenever
+an accepted appointment is inserted, deleted, or has its caregiver, hours or
+status changed, so the reporting queries read O(caregivers) rows instead of
+aggregating the whole appointment table.  rebuild() recomputes everything
+from scratch and is used to backfill the table and to repair it after bulk
+loads that bypass triggers (e.g. COPY with triggers disabled).
+"""
+from sqlalchemy import Float, cast, text
+
+from models import Caregiver, CaregiverEarnings
+
+POSTGRES_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION caregiver_earnings_apply() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'accepted' AND OLD.caregiver_user_id IS NOT NULL THEN
+            UPDATE caregiver_earnings
+               SET accepted_hours = accepted_hours - OLD.work_hours,
+                   accepted_count = accepted_count - 1
+             WHERE caregiver_user_id = OLD.caregiver_user_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'accepted' AND NEW.caregiver_user_id IS NOT NULL THEN
+            INSERT INTO caregiver_earnings (caregiver_user_id, accepted_hours, accepted_count)
+            VALUES (NEW.caregiver_user_id, NEW.work_hours, 1)
+            ON CONFLICT (caregiver_user_id) DO UPDATE
+               SET accepted_hours = caregiver_earnings.accepted_hours + EXCLUDED.accepted_hours,
+                   accepted_count = caregiver_earnings.accepted_count + 1;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS appointment_caregiver_earnings ON appointment",
+    """
+    CREATE TRIGGER appointment_caregiver_earnings
+    AFTER INSERT OR DELETE OR UPDATE OF caregiver_user_id, work_hours, status ON appointment
+    FOR EACH ROW EXECUTE FUNCTION caregiver_earnings_apply()
+    """,
+]
+
+_SQLITE_ADD = """
+    INSERT INTO caregiver_earnings (caregiver_user_id, accepted_hours, accepted_count)
+    VALUES (NEW.caregiver_user_id, NEW.work_hours, 1)
+    ON CONFLICT (caregiver_user_id) DO UPDATE
+       SET accepted_hours = accepted_hours + excluded.accepted_hours,
+           accepted_count = accepted_count + 1;
+"""
+_SQLITE_SUBTRACT = """
+    UPDATE caregiver_earnings
+       SET accepted_hours = accepted_hours - OLD.work_hours,
+           accepted_count = accepted_count - 1
+     WHERE caregiver_user_id = OLD.caregiver_user_id;
+"""
+
+SQLITE_DDL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS appointment_earnings_ai AFTER INSERT ON appointment
+    WHEN NEW.status = 'accepted' AND NEW.caregiver_user_id IS NOT NULL
+    BEGIN {_SQLITE_ADD} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS appointment_earnings_ad AFTER DELETE ON appointment
+    WHEN OLD.status = 'accepted' AND OLD.caregiver_user_id IS NOT NULL
+    BEGIN {_SQLITE_SUBTRACT} END
+    """,
+    # SQLite triggers cannot branch, so an update is split into its two halves.
+    f"""
+    CREATE TRIGGER IF NOT EXISTS appointment_earnings_au_old AFTER UPDATE OF caregiver_user_id, work_hours, status ON appointment
+    WHEN OLD.status = 'accepted' AND OLD.caregiver_user_id IS NOT NULL
+    BEGIN {_SQLITE_SUBTRACT} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS appointment_earnings_au_new AFTER UPDATE OF caregiver_user_id, work_hours, status ON appointment
+    WHEN NEW.status = 'accepted' AND NEW.caregiver_user_id IS NOT NULL
+    BEGIN {_SQLITE_ADD} END
+    """,
+]
+
+REBUILD_SQL = [
+    "DELETE FROM caregiver_earnings",
+    """
+    INSERT INTO caregiver_earnings (caregiver_user_id, accepted_hours, accepted_count)
+    SELECT a.caregiver_user_id, SUM(a.work_hours), COUNT(*)
+    FROM appointment a
+    JOIN caregiver c ON c.caregiver_user_id = a.caregiver_user_id
+    WHERE a.status = 'accepted'
+    GROUP BY a.caregiver_user_id
+    """,
+]
+
+
+def install(conn):
+    """Create the maintenance triggers for the connection's dialect and backfill the table."""
+    if conn.dialect.name == "postgresql":
+        statements = POSTGRES_DDL
+    elif conn.dialect.name == "sqlite":
+        statements = SQLITE_DDL
+    else:
+        # The reports read caregiver_earnings only, so running without the triggers would serve stale totals.
+        raise RuntimeError(f"Cannot migrate: caregiver_earnings triggers are only written for PostgreSQL and "
+                           f"SQLite, not {conn.dialect.name}; port POSTGRES_DDL in earnings.py first")
+    for statement in statements:
+        conn.execute(text(statement))
+    rebuild(conn)
+
+
+def rebuild(conn):
+    for statement in REBUILD_SQL:
+        conn.execute(text(statement))
+
+
+def average_income(dialect):
+    """A caregiver's average pay per accepted appointment: hourly_rate * accepted_hours / accepted_count."""
+    count = CaregiverEarnings.accepted_count
+    if dialect == "sqlite":
+        # SQLite stores whole NUMERIC values as INTEGER, and INTEGER / INTEGER truncates.
+        count = cast(count, Float)
+    return Caregiver.hourly_rate * CaregiverEarnings.accepted_hours / count
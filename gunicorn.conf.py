@@ -0,0 +1,36 @@
+"""
+Gunicorn settings for the sync app (the Procfile runs `gunicorn -c gunicorn.conf.py`).
+
+The app is imported once in the master (preload_app) and the workers are
+forked from it, so they start serving without importing anything.  Before
+forking, the master checks the schema and applies pending migrations once
+(migrations.ensure_schema); the workers inherit that result and skip the
+check.  Connections the master opened are closed before the fork, and db.py
+gives every forked worker fresh connection pools in any case.
+
+Workers are threaded (gthread, GUNICORN_THREADS per worker, default 4):
+sign-up and sign-in wait on the password hashing pool (credentials.py), and
+a sync worker would serve nothing else while it waits.
+
+Bind address (PORT), worker count (WEB_CONCURRENCY) and the other usual
+settings still come from gunicorn's environment variables and command line.
+"""
+import os
+
+wsgi_app = "app:create_app()"
+preload_app = True
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+
+def on_starting(server):
+    from db import dispose_all, get_engine
+    from migrations import ensure_schema
+
+    try:
+        applied = ensure_schema(get_engine())
+        server.log.info("schema verified%s", f", applied {applied}" if applied else "")
+    except Exception as e:
+        # As before: a database that is down at boot does not stop the server; workers retry per request.
+        server.log.warning("schema check failed, workers will retry: %s", e)
+    dispose_all()
@@ -0,0 +1,384 @@
+"""
+Caregiver suggestions for a job, served from an in-memory candidate index.
+
+The index groups caregivers by caregiving_type, then by city, and keeps each
+group in two parallel arrays sorted by hourly_rate.  Ranking for a job:
+
+  1. only caregivers of the job's required_caregiving_type (and at most
+     max_rate per hour when given) are candidates;
+  2. caregivers in the job's city (the member's Address.town, else their
+     User.city) rank above everyone else;
+  3. inside each of those two tiers the score is
+        TEXT_WEIGHT * text overlap + RATE_WEIGHT * rate band score
+     where text overlap is the share of the job's other_requirements words
+     found in the caregiver's profile_description, and cheaper RATE_BANDS
+     score higher.
+
+Because every group is rate-sorted, the scan of a group stops as soon as no
+remaining (more expensive) caregiver could beat the current top k.
+
+The index holds caregivers only (type, rate, city and profile words); the
+job being matched is read by primary key on every lookup, so jobs, members
+and addresses never go stale.  It is built once per process and then kept
+current from session events: ORM inserts, updates and deletes of caregivers
+and users are applied after commit.  Bulk statements mark it stale; it is
+then rebuilt, as it is every MATCH_INDEX_MAX_AGE seconds (default 300) to
+pick up writes made by other processes.  Rebuilds after the first run on a
+background thread and swap the new build in atomically; lookups keep using
+the previous build meanwhile, and changes committed during a rebuild are
+replayed onto its result.
+"""
+import bisect
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session as OrmSession
+
+from models import User, Caregiver, Address, Job
+from search import terms
+
+log = logging.getLogger("matching")
+
+DEFAULT_K = 10
+MAX_K = 100
+
+# Upper bounds of the hourly_rate bands; band 0 is the cheapest.
+RATE_BANDS = (10, 15, 20, 25, 30)
+TEXT_WEIGHT = 0.6
+RATE_WEIGHT = 0.4
+
+STOPWORDS = frozenset("""
+    a an and are as at be but by for from has have i in is it its of on or that the this to
+    was we with will would our my me you your who must should can
+""".split())
+
+Match = namedtuple("Match", "caregiver_user_id given_name surname city caregiving_type hourly_rate "
+                            "score same_city text_overlap")
+
+
+def keywords(value):
+    return frozenset(w for w in terms(value) if len(w) > 2 and w not in STOPWORDS)
+
+
+def _city_key(value):
+    return (value or "").strip().lower()
+
+
+def rate_score(rate):
+    return 1.0 - bisect.bisect_right(RATE_BANDS, rate) / len(RATE_BANDS)
+
+
+class RateGroup:
+    """Caregiver ids kept in hourly_rate order (parallel lists for bisect)."""
+
+    __slots__ = ("rates", "ids")
+
+    def __init__(self):
+        self.rates = []
+        self.ids = []
+
+    def add(self, rate, caregiver_id):
+        i = bisect.bisect_right(self.rates, rate)
+        self.rates.insert(i, rate)
+        self.ids.insert(i, caregiver_id)
+
+    def remove(self, rate, caregiver_id):
+        i = bisect.bisect_left(self.rates, rate)
+        while i < len(self.rates) and self.rates[i] == rate:
+            if self.ids[i] == caregiver_id:
+                del self.rates[i]
+                del self.ids[i]
+                return
+            i += 1
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class Candidates:
+    """One build of the index: caregivers grouped by type and city, plus the user fields the ranking shows."""
+
+    def __init__(self):
+        self.groups = {}        # caregiving_type -> city -> RateGroup
+        self.caregivers = {}    # caregiver id -> (caregiving_type, hourly_rate)
+        self.users = {}         # caregiver id -> (given_name, surname, city, keywords)
+
+    def _city(self, caregiver_id):
+        user = self.users.get(caregiver_id)
+        return _city_key(user[2]) if user else ""
+
+    def put(self, caregiver_id, caregiving_type, rate, user=None):
+        self.drop(caregiver_id)
+        if user is not None:
+            self.users[caregiver_id] = user
+        self.caregivers[caregiver_id] = (caregiving_type, rate)
+        self.groups.setdefault(caregiving_type, {}).setdefault(self._city(caregiver_id), RateGroup()).add(rate, caregiver_id)
+
+    def drop(self, caregiver_id):
+        entry = self.caregivers.pop(caregiver_id, None)
+        if entry is None:
+            return
+        caregiving_type, rate = entry
+        self.groups[caregiving_type][self._city(caregiver_id)].remove(rate, caregiver_id)
+
+    def apply(self, changes):
+        """
+        Apply (kind, values) snapshots collected by watch() after a commit.
+        False when a caregiver arrives without the user fields to show it
+        (its user row was not part of the commit); the index needs a rebuild then.
+        """
+        users = {v["user_id"]: (v["given_name"], v["surname"], v["city"], keywords(v["profile_description"]))
+                 for kind, v in changes if kind == "user"}
+        followed = True
+        for kind, v in changes:
+            if kind == "caregiver":
+                cid = v["caregiver_user_id"]
+                user = users.get(cid, self.users.get(cid))
+                if user is None:
+                    followed = False
+                    continue
+                self.put(cid, v["caregiving_type"], float(v["hourly_rate"]), user)
+            elif kind in ("caregiver-deleted", "user-deleted"):
+                cid = v.get("caregiver_user_id", v.get("user_id"))
+                self.drop(cid)
+                self.users.pop(cid, None)
+            elif kind == "user":
+                # Re-file the caregiver under its (possibly new) city; other users are not indexed.
+                entry = self.caregivers.get(v["user_id"])
+                if entry is not None:
+                    self.put(v["user_id"], *entry, users[v["user_id"]])
+        return followed
+
+    def _scan(self, group, job_words, max_rate, same_city, heap, k):
+        end = len(group.rates) if max_rate is None else bisect.bisect_right(group.rates, max_rate)
+        for i in range(end):
+            rate = group.rates[i]
+            rate_part = RATE_WEIGHT * rate_score(rate)
+            # Rates only go up from here: stop once even a perfect text match cannot make the top k.
+            if len(heap) == k and heap[0][0] >= (same_city, rate_part + TEXT_WEIGHT):
+                return
+            caregiver_id = group.ids[i]
+            overlap = len(job_words & self.users[caregiver_id][3]) / len(job_words) if job_words else 0.0
+            item = ((same_city, rate_part + TEXT_WEIGHT * overlap), -caregiver_id, overlap, rate)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+
+    def top_k(self, caregiving_type, city, job_words, k, max_rate):
+        by_city = self.groups.get(caregiving_type, {})
+        heap = []
+        if city in by_city:
+            self._scan(by_city[city], job_words, max_rate, 1, heap, k)
+        if len(heap) < k:
+            for other, group in by_city.items():
+                if other != city:
+                    self._scan(group, job_words, max_rate, 0, heap, k)
+        matches = []
+        for (same_city, score), neg_id, overlap, rate in sorted(heap, reverse=True):
+            given_name, surname, user_city, _ = self.users[-neg_id]
+            matches.append(Match(-neg_id, given_name, surname, user_city, caregiving_type, rate,
+                                 round(score, 4), bool(same_city), round(overlap, 4)))
+        return matches
+
+
+class MatchIndex:
+    def __init__(self, bind, max_age=300.0):
+        self.bind = bind
+        self.max_age = max_age
+        self.built_at = None
+        self.stale = True
+        self.rebuilds = 0
+        self._candidates = None
+        self._building = False
+        self._replay = None               # changes committed while a build runs; replayed onto it
+        self._lock = threading.Lock()     # guards the fields above and the candidates' contents
+        self._build_lock = threading.Lock()  # one build at a time
+
+    # --- building ---
+
+    def _load(self):
+        candidates = Candidates()
+        stmt = (select(Caregiver.caregiver_user_id, Caregiver.caregiving_type, Caregiver.hourly_rate,
+                       User.given_name, User.surname, User.city, User.profile_description)
+                .join(User, User.user_id == Caregiver.caregiver_user_id))
+        with self.bind.connect() as conn:
+            for row in conn.execute(stmt):
+                candidates.put(row.caregiver_user_id, row.caregiving_type, float(row.hourly_rate),
+                               (row.given_name, row.surname, row.city, keywords(row.profile_description)))
+        return candidates
+
+    def _build(self):
+        started = time.perf_counter()
+        with self._lock:
+            self._replay = []
+            self.stale = False  # a mark_stale() from here on asks for the next build
+        try:
+            candidates = self._load()
+        except Exception:
+            with self._lock:
+                self._replay = None
+                self.stale = True
+            raise
+        with self._lock:
+            if not candidates.apply(self._replay):
+                self.stale = True
+            self._replay = None
+            self._candidates = candidates
+            self.built_at = time.monotonic()
+            self.rebuilds += 1
+        return time.perf_counter() - started
+
+    def rebuild(self):
+        """Build the index now (waiting for a build already running); returns the seconds it took."""
+        with self._build_lock:
+            return self._build()
+
+    def _rebuild_in_background(self):
+        try:
+            with self._build_lock:
+                self._build()
+        except Exception as e:
+            log.warning("match index rebuild failed, serving the previous build: %s", e)
+        finally:
+            with self._lock:
+                self._building = False
+
+    def ensure_fresh(self):
+        """
+        Build the index on first use.  Later, when it is stale or older than
+        max_age, one thread starts a rebuild in the background and lookups keep
+        using the previous build until the new one is swapped in.
+        """
+        if self._candidates is None:
+            with self._build_lock:
+                if self._candidates is None:
+                    self._build()
+            return
+        with self._lock:
+            if self._building or not (self.stale or time.monotonic() - self.built_at > self.max_age):
+                return
+            self._building = True
+        threading.Thread(target=self._rebuild_in_background, name="match-index-rebuild", daemon=True).start()
+
+    # --- incremental updates ---
+
+    def apply(self, changes):
+        """Apply (kind, values) snapshots collected by watch() after a commit."""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.extend(changes)
+            if self._candidates is not None and not self._candidates.apply(changes):
+                self.stale = True
+
+    def mark_stale(self):
+        with self._lock:
+            self.stale = True
+
+    # --- lookups ---
+
+    def _job(self, job_id):
+        """(required_caregiving_type, city key, keywords) of the job, read by primary key; None if absent."""
+        stmt = (select(Job.required_caregiving_type, Job.other_requirements, Address.town, User.city)
+                .outerjoin(Address, Address.member_user_id == Job.member_user_id)
+                .outerjoin(User, User.user_id == Job.member_user_id)
+                .where(Job.job_id == job_id))
+        with self.bind.connect() as conn:
+            row = conn.execute(stmt).first()
+        if row is None:
+            return None
+        # The member's address town, else the city on their user profile.
+        return row.required_caregiving_type, _city_key(row.town or row.city), keywords(row.other_requirements)
+
+    def top_k(self, job_id, k=DEFAULT_K, max_rate=None):
+        """Best `k` caregivers for the job as Match tuples, best first; None if the job is unknown."""
+        self.ensure_fresh()
+        job = self._job(job_id)
+        if job is None:
+            return None
+        caregiving_type, city, job_words = job
+        with self._lock:
+            return self._candidates.top_k(caregiving_type, city, job_words, k, max_rate)
+
+
+# --- keeping the index current ---
+
+_SNAPSHOTS = {
+    Caregiver: ("caregiver", ("caregiver_user_id", "caregiving_type", "hourly_rate")),
+    User: ("user", ("user_id", "given_name", "surname", "city", "profile_description")),
+}
+_WATCHED = tuple(_SNAPSHOTS)
+
+
+def _snapshot(obj, deleted):
+    for model, (kind, fields) in _SNAPSHOTS.items():
+        if isinstance(obj, model):
+            break
+    else:
+        return None
+    values = inspect(obj).dict
+    if deleted:
+        # Deleting a user cascades to its caregiver row in the database.
+        key = fields[0]
+        return (f"{kind}-deleted", {key: values[key]}) if key in values else None
+    if any(f not in values for f in fields):
+        return None
+    return kind, {f: values[f] for f in fields}
+
+
+def watch(index, session_class=OrmSession):
+    """Feed committed ORM changes into `index` (anything it cannot follow marks it stale)."""
+
+    def _pending(session):
+        return session.info.setdefault("match_index_changes", [])
+
+    @event.listens_for(session_class, "after_flush")
+    def _after_flush(session, flush_context):
+        changes = _pending(session)
+        for objs, deleted in ((session.new, False), (session.dirty, False), (session.deleted, True)):
+            for obj in objs:
+                if not isinstance(obj, _WATCHED):
+                    continue
+                change = _snapshot(obj, deleted)
+                changes.append(change if change is not None else ("stale", None))
+
+    @event.listens_for(session_class, "do_orm_execute")
+    def _bulk_statement(orm_execute_state):
+        if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+            mapper = orm_execute_state.bind_mapper
+            if mapper is not None and issubclass(mapper.class_, _WATCHED):
+                _pending(orm_execute_state.session).append(("stale", None))
+
+    @event.listens_for(session_class, "after_commit")
+    def _after_commit(session):
+        changes = session.info.pop("match_index_changes", None)
+        if not changes:
+            return
+        if any(kind == "stale" for kind, _ in changes):
+            index.mark_stale()
+        else:
+            index.apply(changes)
+
+    @event.listens_for(session_class, "after_rollback")
+    def _after_rollback(session):
+        session.info.pop("match_index_changes", None)
+
+    return index
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_index(bind):
+    """The process-wide MatchIndex, created (and hooked to session events) on first use."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = watch(MatchIndex(bind, max_age=float(os.environ.get("MATCH_INDEX_MAX_AGE", 300))))
+    return _shared
@@ -0,0 +1,210 @@
+"""
+Materialized job_applicants view with background refresh.
+
+On PostgreSQL job_applicants_mv is a MATERIALIZED VIEW with a unique index on
+(job_id, applicant_key), so it can be refreshed CONCURRENTLY while readers
+keep using the previous contents.  SQLite has no materialized views; there it
+is a plain table rebuilt inside one transaction (readers see the old rows
+until it commits).
+
+Refreshing is debounced: writes to the underlying tables only *request* a
+refresh, and a background thread runs it once things have been quiet for
+`delay` seconds (or at the latest `max_delay` seconds after the first
+request).  `python matviews.py --every 60` runs a plain periodic refresher
+as a separate process instead.
+"""
+import argparse
+import threading
+import time
+
+from sqlalchemy import (
+    event, text, Table, Column, Integer, String, Text, Date, MetaData, Index
+)
+from sqlalchemy.orm import Session as OrmSession
+
+from models import User, Caregiver, Job, JobApplication
+from db import get_engine
+
+NAME = "job_applicants_mv"
+
+SELECT_SQL = """
+    SELECT
+      j.job_id,
+      j.required_caregiving_type,
+      j.other_requirements,
+      j.date_posted,
+      c.caregiver_user_id,
+      u.given_name AS caregiver_first,
+      u.surname AS caregiver_last,
+      ja.date_applied,
+      COALESCE(ja.caregiver_user_id, 0) AS applicant_key
+    FROM job j
+    LEFT JOIN job_application ja ON j.job_id = ja.job_id
+    LEFT JOIN caregiver c ON ja.caregiver_user_id = c.caregiver_user_id
+    LEFT JOIN "USER" u ON c.caregiver_user_id = u.user_id
+"""
+
+# Kept out of models.Base so create_all() never creates it as a table on PostgreSQL.
+view_metadata = MetaData()
+job_applicants_mv = Table(
+    NAME, view_metadata,
+    Column("job_id", Integer, nullable=False),
+    Column("required_caregiving_type", String(30)),
+    Column("other_requirements", Text),
+    Column("date_posted", Date),
+    Column("caregiver_user_id", Integer),
+    Column("caregiver_first", String(100)),
+    Column("caregiver_last", String(100)),
+    Column("date_applied", Date),
+    # caregiver_user_id, or 0 for a job without applicants: unique together with job_id.
+    Column("applicant_key", Integer, nullable=False),
+    Index(f"ux_{NAME}_job_applicant", "job_id", "applicant_key", unique=True),
+    Index(f"ix_{NAME}_type_date", "required_caregiving_type", "date_posted"),
+    Index(f"ix_{NAME}_date_posted", "date_posted"),
+)
+
+# Changes to these models can change the view contents.
+SOURCE_MODELS = (Job, JobApplication, Caregiver, User)
+
+
+def install(conn):
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {NAME} AS {SELECT_SQL} WITH DATA"))
+        for index in job_applicants_mv.indexes:
+            index.create(conn, checkfirst=True)
+    else:
+        job_applicants_mv.create(conn, checkfirst=True)
+        refresh(conn)
+
+
+def drop(conn):
+    """Drop the views that depend on the base tables (used before drop_all)."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {NAME}"))
+        conn.execute(text("DROP VIEW IF EXISTS job_applicants_view CASCADE"))
+    else:
+        job_applicants_mv.drop(conn, checkfirst=True)
+        conn.execute(text("DROP VIEW IF EXISTS job_applicants_view"))
+
+
+def refresh(conn, concurrently=True):
+    if conn.dialect.name == "postgresql":
+        mode = " CONCURRENTLY" if concurrently else ""
+        conn.execute(text(f"REFRESH MATERIALIZED VIEW{mode} {NAME}"))
+    else:
+        conn.execute(job_applicants_mv.delete())
+        conn.execute(job_applicants_mv.insert().from_select(
+            [c.name for c in job_applicants_mv.columns],
+            text(SELECT_SQL).columns(*job_applicants_mv.columns),
+        ))
+
+
+def refresh_now(bind, concurrently=True):
+    started = time.perf_counter()
+    with bind.begin() as conn:
+        refresh(conn, concurrently=concurrently)
+    return time.perf_counter() - started
+
+
+class DebouncedRefresher:
+    """Coalesces refresh requests into at most one refresh per quiet period."""
+
+    def __init__(self, bind, delay=2.0, max_delay=30.0):
+        self.bind = bind
+        self.delay = delay
+        self.max_delay = max_delay
+        self.refreshes = 0
+        self.last_duration = None
+        self.last_error = None
+        self._cond = threading.Condition()
+        self._first_request = None
+        self._last_request = None
+        self._thread = None
+        self._stopped = False
+
+    def request(self):
+        with self._cond:
+            now = time.monotonic()
+            if self._first_request is None:
+                self._first_request = now
+            self._last_request = now
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"{NAME}-refresher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _due_in(self, now):
+        return min(self._last_request + self.delay, self._first_request + self.max_delay) - now
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and self._first_request is None:
+                    self._cond.wait()
+                while not self._stopped and self._due_in(time.monotonic()) > 0:
+                    self._cond.wait(self._due_in(time.monotonic()))
+                if self._stopped:
+                    return
+                self._first_request = self._last_request = None
+            try:
+                self.last_duration = refresh_now(self.bind)
+                self.refreshes += 1
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+
+
+def watch(refresher, session_class=OrmSession):
+    """Request a refresh after every commit that touched a model the view reads."""
+    # One flag per watch, so a second refresher on a parent session class does not consume this one's.
+    stale = f"job_applicants_stale:{id(refresher)}"
+
+    @event.listens_for(session_class, "after_flush")
+    def _after_flush(session, flush_context):
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, SOURCE_MODELS):
+                session.info[stale] = True
+                return
+
+    @event.listens_for(session_class, "do_orm_execute")
+    def _bulk_statement(orm_execute_state):
+        # session.execute(update(Job)...), bulk inserts and Query.delete() do not go through the flush.
+        if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+            mapper = orm_execute_state.bind_mapper
+            if mapper is not None and issubclass(mapper.class_, SOURCE_MODELS):
+                orm_execute_state.session.info[stale] = True
+
+    @event.listens_for(session_class, "after_commit")
+    def _after_commit(session):
+        if session.info.pop(stale, False):
+            refresher.request()
+
+    @event.listens_for(session_class, "after_rollback")
+    def _after_rollback(session):
+        session.info.pop(stale, None)
+
+    return refresher
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"Refresh {NAME}")
+    parser.add_argument("--every", type=float, help="keep running and refresh every N seconds")
+    args = parser.parse_args(argv)
+
+    engine = get_engine()
+    while True:
+        print(f"refreshed {NAME} in {refresh_now(engine):.3f}s")
+        if not args.every:
+            return
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Minimal Prometheus text-format exposition.
+
+Modules register a collector, a function returning (name, type, help, samples)
+tuples where samples is a list of (labels dict, value), or (suffix, labels,
+value) for the _sum/_count/_bucket series of a histogram; render() produces
+the body served at /metrics.
+"""
+_collectors = []
+
+
+def register(collector):
+    _collectors.append(collector)
+    return collector
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                     for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+def render():
+    families = {}
+    for collector in _collectors:
+        for name, kind, help_text, samples in collector():
+            family = families.setdefault(name, (kind, help_text, []))
+            family[2].extend(samples)
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample in samples:
+            suffix, labels, value = sample if len(sample) == 3 else ("", *sample)
+            lines.append(f"{name}{suffix}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,261 @@
+"""
+Versioned schema migrations.
+
+    python migrations.py              # create missing tables, apply pending migrations
+    python migrations.py --status
+    python migrations.py --check-plans
+
+Applied versions are recorded in the schema_version table; each migration runs
+in its own transaction.  A fresh database gets its tables from
+Base.metadata.create_all() and every migration is still applied (each one is
+written to be a no-op when its objects already exist), so fresh and upgraded
+databases end up identical.
+
+The web app does not migrate at import.  ensure_schema() runs once per
+process: one read of schema_version when nothing is pending, migrate() when
+something is.  Under gunicorn the preloaded master runs it before forking
+(gunicorn.conf.py) and the workers inherit the result; anything else runs it
+before its first request.
+"""
+import argparse
+import logging
+import threading
+import time
+
+from sqlalchemy import text, Table, Column, Integer, String, DateTime, MetaData, func, select
+
+from models import Base
+from db import get_engine
+import search
+import earnings
+import matviews
+import scheduling
+import batches
+
+
+log = logging.getLogger("migrations")
+
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version", version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False, server_default=func.current_timestamp()),
+)
+
+
+# --- 1: indexes for the filters, joins and sorts used by app.py and queries.py ---
+
+def _v1_indexes(conn):
+    # The indexes are declared on the models (so create_all builds them on a fresh
+    # database); this creates them on databases that predate them.
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+    conn.execute(text("ANALYZE"))
+
+
+# --- 2: full-text search (tsvector columns on PostgreSQL, FTS5 tables on SQLite) ---
+
+def _v2_search(conn):
+    search.install(conn)
+
+
+# --- 3: caregiver_earnings summary maintained by appointment triggers ---
+
+def _v3_caregiver_earnings(conn):
+    Base.metadata.tables["caregiver_earnings"].create(conn, checkfirst=True)
+    earnings.install(conn)
+
+
+# --- 4: materialized job_applicants view ---
+
+def _v4_job_applicants_mv(conn):
+    matviews.install(conn)
+
+
+# --- 5: no overlapping pending/accepted bookings per caregiver (PostgreSQL) ---
+
+def _v5_appointment_overlap(conn):
+    if conn.dialect.name == "postgresql":
+        scheduling.install(conn)
+
+
+# --- 6: checkpoints of resumable batch operations ---
+
+def _v6_batch_checkpoint(conn):
+    batches.checkpoint_metadata.create_all(conn)
+
+
+# --- 7: no overlapping pending/accepted bookings per caregiver (SQLite) ---
+
+def _v7_appointment_overlap_sqlite(conn):
+    if conn.dialect.name == "sqlite":
+        scheduling.install(conn)
+
+
+MIGRATIONS = [
+    (1, "indexes for foreign keys, accepted appointments, list sorting and text search", _v1_indexes),
+    (2, "full-text search over jobs, members and user profiles", _v2_search),
+    (3, "caregiver_earnings summary table and appointment triggers", _v3_caregiver_earnings),
+    (4, "materialized job_applicants view with unique index for concurrent refresh", _v4_job_applicants_mv),
+    (5, "exclusion constraint against overlapping active appointments", _v5_appointment_overlap),
+    (6, "batch_checkpoint table for resumable batch operations", _v6_batch_checkpoint),
+    (7, "triggers against overlapping active appointments on SQLite", _v7_appointment_overlap_sqlite),
+]
+
+
+def applied_versions(conn):
+    version_metadata.create_all(conn)
+    return set(conn.execute(select(schema_version.c.version)).scalars())
+
+
+def migrate(bind, verbose=False):
+    """Create missing tables and apply every pending migration. Returns the versions applied."""
+    Base.metadata.create_all(bind)
+    with bind.begin() as conn:
+        done = applied_versions(conn)
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        if version in done:
+            continue
+        with bind.begin() as conn:
+            upgrade(conn)
+            conn.execute(schema_version.insert().values(version=version, description=description))
+        applied.append(version)
+        if verbose:
+            print(f"applied {version}: {description}")
+    return applied
+
+
+def pending(bind):
+    """Versions not applied yet; every one of them on a database without schema_version."""
+    with bind.begin() as conn:
+        done = applied_versions(conn)
+    return [version for version, _, _ in MIGRATIONS if version not in done]
+
+
+_schema_checked = False
+_schema_lock = threading.Lock()
+
+
+def ensure_schema(bind):
+    """
+    Apply pending migrations unless this process (or the process it was forked
+    from) already checked.  Returns the versions applied.  A failure is logged
+    and raised, and the next call tries again.
+    """
+    global _schema_checked
+    if _schema_checked:
+        return []
+    with _schema_lock:
+        if _schema_checked:
+            return []
+        started = time.perf_counter()
+        try:
+            applied = migrate(bind) if pending(bind) else []
+        except Exception as e:
+            log.warning("schema check failed: %s", e)
+            raise
+        _schema_checked = True
+        log.info("schema verified in %.1f ms, applied %s", (time.perf_counter() - started) * 1000, applied or "nothing")
+        return applied
+
+
+def schema_checked():
+    return _schema_checked
+
+
+def reset(bind):
+    """Drop every table (including the version history) and rebuild the schema from scratch."""
+    with bind.begin() as conn:
+        matviews.drop(conn)
+    Base.metadata.drop_all(bind)
+    batches.checkpoint_metadata.drop_all(bind)
+    version_metadata.drop_all(bind)
+    migrate(bind)
+
+
+# --- Plan checks ---
+
+PLAN_CHECKS = [
+    ("accepted appointments by caregiver", "ix_appointment_caregiver_accepted",
+     "SELECT caregiver_user_id, sum(work_hours) FROM appointment WHERE status = 'accepted' "
+     "AND caregiver_user_id = 1 GROUP BY caregiver_user_id"),
+    ("jobs of a member", "ix_job_member_user_id",
+     "SELECT job_id FROM job WHERE member_user_id = 1"),
+    ("applicants of a job", "ix_job_application_job_id",
+     "SELECT caregiver_user_id FROM job_application WHERE job_id = 1"),
+    ("appointments of a member", "ix_appointment_member_user_id",
+     "SELECT appointment_id FROM appointment WHERE member_user_id = 1"),
+    ("jobs_list page", "ix_job_date_posted_job_id",
+     "SELECT * FROM job ORDER BY date_posted DESC, job_id DESC LIMIT 51"),
+    ("appointments_list page", "ix_appointment_date_id",
+     "SELECT * FROM appointment ORDER BY appointment_date DESC, appointment_id DESC LIMIT 51"),
+]
+
+TRIGRAM_PLAN_CHECKS = [
+    ("jobs_with_soft_spoken", "ix_job_other_requirements_trgm",
+     "SELECT job_id FROM job WHERE other_requirements ILIKE '%soft-spoken%'"),
+    ("members_looking_elderly_astana_no_pets", "ix_member_house_rules_trgm",
+     "SELECT member_user_id FROM member WHERE house_rules ILIKE '%No pets%'"),
+]
+
+
+def explain(conn, sql):
+    if conn.dialect.name == "postgresql":
+        rows = conn.execute(text("EXPLAIN " + sql)).scalars()
+        return "\n".join(rows)
+    rows = conn.execute(text("EXPLAIN QUERY PLAN " + sql)).fetchall()
+    return "\n".join(str(r[-1]) for r in rows)
+
+
+def check_plans(bind):
+    """
+    Run EXPLAIN for the queries each index exists for and return
+    (name, expected_index, used, plan) tuples.  On PostgreSQL sequential
+    scans are disabled for the check so a tiny table cannot hide a missing index.
+    """
+    results = []
+    with bind.connect() as conn:
+        checks = list(PLAN_CHECKS)
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+            checks += TRIGRAM_PLAN_CHECKS
+        for name, index, sql in checks:
+            plan = explain(conn, sql)
+            results.append((name, index, index in plan, plan))
+        conn.rollback()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply schema migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--check-plans", action="store_true", help="EXPLAIN the indexed queries")
+    args = parser.parse_args(argv)
+
+    engine = get_engine()
+    if args.status:
+        with engine.begin() as conn:
+            done = applied_versions(conn)
+        for version, description, _ in MIGRATIONS:
+            print(f"{'applied' if version in done else 'pending':8} {version}: {description}")
+        return
+    if args.check_plans:
+        failed = 0
+        for name, index, used, plan in check_plans(engine):
+            failed += not used
+            print(f"{'ok  ' if used else 'MISS'} {name} -> {index}")
+            if not used:
+                print("     " + plan.replace("\n", "\n     "))
+        raise SystemExit(1 if failed else 0)
+    applied = migrate(engine, verbose=True)
+    if not applied:
+        print("schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,23 @@
 from sqlalchemy import (
     Column, Integer, String, Text, Date, Time, Numeric,
-    ForeignKey, CheckConstraint
+    ForeignKey, CheckConstraint, Index, DDL, event, text
 )
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
 
+# Trigram indexes below need pg_trgm; created before the tables on PostgreSQL only.
+event.listen(
+    Base.metadata, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
 class User(Base):
     __tablename__ = "USER"
-    __table_args__ = {"quote": True}  
+    __table_args__ = (
+        Index("ix_user_given_name_surname", "given_name", "surname"),
+        {"quote": True},
+    )
 
     user_id = Column(Integer, primary_key=True, autoincrement=True)
     email = Column(String(255), unique=True, nullable=False)
@@ -37,6 +46,7 @@ class Caregiver(Base):
 
     __table_args__ = (
         CheckConstraint("caregiving_type IN ('babysitter','elderly','playmate')"),
+        Index("ix_caregiver_caregiving_type", "caregiving_type"),
     )
 
 class Member(Base):
@@ -51,6 +61,13 @@ class Member(Base):
     jobs = relationship("Job", back_populates="member", cascade="all, delete-orphan")
     appointments = relationship("Appointment", back_populates="member", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_member_house_rules_trgm", "house_rules", postgresql_using="gin",
+              postgresql_ops={"house_rules": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_member_dependent_description_trgm", "dependent_description", postgresql_using="gin",
+              postgresql_ops={"dependent_description": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+    )
+
 class Address(Base):
     __tablename__ = "address"
 
@@ -75,6 +92,10 @@ class Job(Base):
 
     __table_args__ = (
         CheckConstraint("required_caregiving_type IN ('babysitter','elderly','playmate')"),
+        Index("ix_job_member_user_id", "member_user_id"),
+        Index("ix_job_date_posted_job_id", "date_posted", "job_id"),
+        Index("ix_job_other_requirements_trgm", "other_requirements", postgresql_using="gin",
+              postgresql_ops={"other_requirements": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
     )
 
 class JobApplication(Base):
@@ -87,6 +108,10 @@ class JobApplication(Base):
     caregiver = relationship("Caregiver", back_populates="applications")
     job = relationship("Job", back_populates="applications")
 
+    __table_args__ = (
+        Index("ix_job_application_job_id", "job_id"),
+    )
+
 class Appointment(Base):
     __tablename__ = "appointment"
 
@@ -103,4 +128,24 @@ class Appointment(Base):
 
     __table_args__ = (
         CheckConstraint("status IN ('pending','accepted','declined')"),
+        Index("ix_appointment_caregiver_user_id", "caregiver_user_id"),
+        Index("ix_appointment_member_user_id", "member_user_id"),
+        Index("ix_appointment_caregiver_accepted", "caregiver_user_id",
+              postgresql_where=text("status = 'accepted'"), postgresql_include=["work_hours"],
+              sqlite_where=text("status = 'accepted'")),
+        Index("ix_appointment_date_id", "appointment_date", "appointment_id"),
     )
+
+class CaregiverEarnings(Base):
+    """
+    Per-caregiver totals over accepted appointments, kept current by the
+    appointment triggers installed in migrations.py (see earnings.py).
+    Cost is hourly_rate * accepted_hours, so a rate change needs no refresh.
+    """
+    __tablename__ = "caregiver_earnings"
+
+    caregiver_user_id = Column(Integer, ForeignKey("caregiver.caregiver_user_id", ondelete="CASCADE"), primary_key=True)
+    accepted_hours = Column(Numeric(12,2), nullable=False, default=0)
+    accepted_count = Column(Integer, nullable=False, default=0)
+
+    caregiver = relationship("Caregiver")
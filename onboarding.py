@@ -0,0 +1,199 @@
+"""
+Bulk onboarding of caregiver and member accounts from CSV or JSON rosters.
+
+    python onboarding.py caregivers roster.csv --batch-size 5000
+    python onboarding.py members roster.json
+
+Every batch is one transaction: a multi-row INSERT ... RETURNING on "USER"
+followed by one multi-row INSERT into caregiver/member (and address), so a
+batch costs a handful of round trips and a single commit regardless of size.
+Rows whose email already exists are skipped rather than failing the batch.
+Passwords are hashed (credentials.py) in parallel on the hashing pool, only
+for the rows that are actually inserted.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import sessionmaker
+
+from models import User, Caregiver, Member, Address
+from db import RoutingSession
+import credentials
+
+Session = sessionmaker(class_=RoutingSession)
+
+DEFAULT_BATCH_SIZE = 1000
+
+USER_FIELDS = ("email", "given_name", "surname", "city", "phone_number", "profile_description", "password")
+CAREGIVER_FIELDS = ("photo", "gender", "caregiving_type", "hourly_rate")
+MEMBER_FIELDS = ("house_rules", "dependent_description")
+ADDRESS_FIELDS = ("house_number", "street", "town")
+CAREGIVING_TYPES = ("babysitter", "elderly", "playmate")
+MAX_HOURLY_RATE = Decimal("999999.99")  # caregiver.hourly_rate is NUMERIC(8,2)
+
+
+def load_rows(path):
+    """Yield dict rows from a .csv file or a .json array / JSON-lines file."""
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+        return
+    with open(path, encoding="utf-8") as f:
+        first = f.read(1)
+        f.seek(0)
+        if first == "[":
+            yield from json.load(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _blank_to_none(value):
+    if isinstance(value, str) and value.strip() == "":
+        return None
+    return value
+
+
+def _user_params(row):
+    params = {k: _blank_to_none(row.get(k)) for k in USER_FIELDS}
+    for k in ("email", "given_name", "surname", "password"):
+        if not params[k]:
+            raise ValueError(f"missing {k}")
+    return params
+
+
+def _caregiver_params(row):
+    params = {k: _blank_to_none(row.get(k)) for k in CAREGIVER_FIELDS}
+    if params["caregiving_type"] not in CAREGIVING_TYPES:
+        raise ValueError(f"invalid caregiving_type {params['caregiving_type']!r}")
+    if params["hourly_rate"] is None:
+        raise ValueError("missing hourly_rate")
+    try:
+        rate = Decimal(str(params["hourly_rate"]).strip())
+    except InvalidOperation:
+        rate = None
+    if rate is None or not rate.is_finite() or not 0 <= rate <= MAX_HOURLY_RATE:
+        raise ValueError(f"invalid hourly_rate {params['hourly_rate']!r}")
+    params["hourly_rate"] = rate.quantize(Decimal("0.01"))
+    return params
+
+
+def _member_params(row):
+    return {k: _blank_to_none(row.get(k)) for k in MEMBER_FIELDS}
+
+
+def _address_params(row):
+    params = {k: _blank_to_none(row.get(k)) for k in ADDRESS_FIELDS}
+    return params if params["street"] else None
+
+
+def _insert_batch(session, kind, batch):
+    emails = [u["email"] for u, _, _ in batch]
+    existing = set(session.scalars(select(User.email).where(User.email.in_(emails))))
+    seen = set()
+    fresh = []
+    for item in batch:
+        email = item[0]["email"]
+        if email in existing or email in seen:
+            continue
+        seen.add(email)
+        fresh.append(item)
+    if not fresh:
+        return 0
+
+    hashes = credentials.hash_passwords([u["password"] for u, _, _ in fresh])
+    user_ids = session.scalars(
+        insert(User).returning(User.user_id, sort_by_parameter_order=True),
+        [dict(u, password=h) for (u, _, _), h in zip(fresh, hashes)],
+    ).all()
+
+    if kind == "caregivers":
+        session.execute(insert(Caregiver), [
+            dict(p, caregiver_user_id=uid) for uid, (_, p, _) in zip(user_ids, fresh)
+        ])
+    else:
+        session.execute(insert(Member), [
+            dict(p, member_user_id=uid) for uid, (_, p, _) in zip(user_ids, fresh)
+        ])
+        addresses = [dict(a, member_user_id=uid) for uid, (_, _, a) in zip(user_ids, fresh) if a]
+        if addresses:
+            session.execute(insert(Address), addresses)
+    return len(fresh)
+
+
+def import_accounts(kind, rows, batch_size=DEFAULT_BATCH_SIZE, session_factory=None):
+    """
+    Import caregiver or member accounts from an iterable of dict rows.
+    Returns a dict with inserted/skipped/invalid counts and a list of
+    (row_number, error) pairs for rows that failed validation.
+    """
+    if kind not in ("caregivers", "members"):
+        raise ValueError("kind must be 'caregivers' or 'members'")
+    session_factory = session_factory or Session
+    detail = _caregiver_params if kind == "caregivers" else _member_params
+
+    stats = {"inserted": 0, "skipped": 0, "invalid": 0, "errors": []}
+    batch = []
+
+    def flush_batch():
+        session = session_factory()
+        try:
+            inserted = _insert_batch(session, kind, batch)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        stats["inserted"] += inserted
+        stats["skipped"] += len(batch) - inserted
+        batch.clear()
+
+    for n, row in enumerate(rows, start=1):
+        try:
+            address = _address_params(row) if kind == "members" else None
+            batch.append((_user_params(row), detail(row), address))
+        except ValueError as e:
+            stats["invalid"] += 1
+            stats["errors"].append((n, str(e)))
+            continue
+        if len(batch) >= batch_size:
+            flush_batch()
+    if batch:
+        flush_batch()
+    return stats
+
+
+def import_caregivers(rows, batch_size=DEFAULT_BATCH_SIZE):
+    return import_accounts("caregivers", rows, batch_size)
+
+
+def import_members(rows, batch_size=DEFAULT_BATCH_SIZE):
+    return import_accounts("members", rows, batch_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import caregiver or member accounts")
+    parser.add_argument("kind", choices=["caregivers", "members"])
+    parser.add_argument("path", help="CSV, JSON array or JSON-lines file")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    stats = import_accounts(args.kind, load_rows(args.path), args.batch_size)
+    elapsed = time.perf_counter() - start
+
+    for n, error in stats["errors"][:20]:
+        print(f"row {n}: {error}", file=sys.stderr)
+    print(f"{args.kind}: {stats['inserted']} inserted, {stats['skipped']} skipped (existing email), "
+          f"{stats['invalid']} invalid in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import base64
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def _encode_value(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _decode_value(column, value):
+    python_type = column.type.python_type
+    if value is None:
+        return None
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is time:
+        return time.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, columns):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("Invalid cursor")
+    try:
+        return [_decode_value(c, v) for c, v in zip(columns, values)]
+    except (TypeError, ValueError, ArithmeticError):
+        # e.g. int({}) or date.fromisoformat(1): a crafted cursor is a bad request, not a crash.
+        raise ValueError("Invalid cursor")
+
+
+def page_size_from(args):
+    try:
+        size = int(args.get("per_page", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_query(query, columns, after=None, before=None, page_size=DEFAULT_PAGE_SIZE, descending=False):
+    """
+    Add the keyset predicate, ORDER BY and LIMIT to `query` (an ORM Query or a
+    select()); it fetches one row more than page_size so has_more is known.
+    The key comparison is a row-value predicate so the database can seek
+    straight into the sort index instead of skipping OFFSET rows.
+    """
+    key = tuple_(*columns)
+    if after is not None:
+        values = tuple_(*decode_cursor(after, columns))
+        query = query.filter(key < values if descending else key > values)
+    elif before is not None:
+        values = tuple_(*decode_cursor(before, columns))
+        query = query.filter(key > values if descending else key < values)
+
+    # Walking backwards reads the index in the opposite order and flips the result.
+    reverse = descending != (before is not None)
+    query = query.order_by(*[c.desc() if reverse else c.asc() for c in columns])
+    return query.limit(page_size + 1)
+
+
+def page_from_rows(rows, columns, after=None, before=None, page_size=DEFAULT_PAGE_SIZE):
+    """Build the Page for rows fetched with keyset_query() and the same arguments."""
+    backwards = before is not None
+    rows = list(rows)
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    def cursor_for(row):
+        return encode_cursor([getattr(row, c.key) for c in columns])
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or backwards:
+            next_cursor = cursor_for(rows[-1])
+        if (has_more and backwards) or after is not None:
+            prev_cursor = cursor_for(rows[0])
+    return Page(rows, next_cursor, prev_cursor)
+
+
+def keyset_page(query, columns, after=None, before=None, page_size=DEFAULT_PAGE_SIZE, descending=False):
+    """
+    Return one Page of `query` ordered by `columns` (the last column must be unique).
+    `after`/`before` are cursors from a previous Page.
+    """
+    rows = keyset_query(query, columns, after, before, page_size, descending).all()
+    return page_from_rows(rows, columns, after, before, page_size)
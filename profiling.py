@@ -0,0 +1,359 @@
+"""
+Per-request SQL profiling.
+
+Cursor events on every Engine time each statement; the web app's request
+hooks (init_app) collect the statements of one request into a QueryProfile:
+
+  * statement count and total database time,
+  * the slowest statements, with their parameters redacted to type names,
+  * N+1 suspects: a statement shape (literals and IN lists collapsed)
+    repeated more than PROFILE_N_PLUS_ONE times in one request,
+  * optionally the plan of slow SELECTs (EXPLAIN ANALYZE on PostgreSQL,
+    EXPLAIN QUERY PLAN on SQLite), captured after the response is built.
+
+Each finished request is logged as one JSON line on the "profiling" logger
+(INFO; statements over PROFILE_SLOW_MS as WARNING, see LOG_LEVEL), counted
+in the /metrics families below and kept in a short history shown at
+/debug/queries.  Bound parameters are only kept until the request is
+finished (EXPLAIN needs them); the history holds their type names.
+
+The body of a streamed Flask response (the CSV export) is produced after
+after_request, so its profile is finished when the response is closed and
+carries no Server-Timing header.  The async app finishes the profile in
+after_request and does not cover streamed bodies.
+
+Profiling is off unless PROFILE_QUERIES is set:
+
+    PROFILE_QUERIES        1/0, collect profiles                      (default 0)
+    PROFILE_N_PLUS_ONE     repeats of one shape that flag N+1         (default 10)
+    PROFILE_SLOWEST        slowest statements kept per request        (default 5)
+    PROFILE_SLOW_MS        statements slower than this are logged     (default 100)
+    PROFILE_EXPLAIN_MS     explain SELECTs slower than this, 0 = off  (default 0)
+    PROFILE_HISTORY        requests kept for /debug/queries           (default 50)
+    DEBUG_QUERIES          1 = serve /debug/queries outside debug mode
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import metrics
+
+log = logging.getLogger("profiling")
+
+ENABLED = os.environ.get("PROFILE_QUERIES", "0").strip().lower() in ("1", "true", "yes", "on")
+N_PLUS_ONE = int(os.environ.get("PROFILE_N_PLUS_ONE", 10))
+SLOWEST = int(os.environ.get("PROFILE_SLOWEST", 5))
+SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", 100))
+EXPLAIN_MS = float(os.environ.get("PROFILE_EXPLAIN_MS", 0))
+HISTORY = int(os.environ.get("PROFILE_HISTORY", 50))
+
+# Upper bounds (seconds) of the per-statement and per-request database time histograms.
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+_current = contextvars.ContextVar("query_profile", default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|:\w+|\$\d+|\?")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)", re.IGNORECASE)
+_POSTCOMPILE = re.compile(r"\(?__\[POSTCOMPILE_\w+\]\)?")
+_SPACE = re.compile(r"\s+")
+
+
+def shape(statement):
+    """The statement with literals and placeholders collapsed, for grouping repeats."""
+    s = _STRING.sub("?", statement)
+    s = _PLACEHOLDER.sub("?", s)
+    s = _NUMBER.sub("?", s)
+    s = _POSTCOMPILE.sub("(?)", s)
+    s = _IN_LIST.sub("IN (?)", s)
+    return _SPACE.sub(" ", s).strip()
+
+
+def redact(parameters):
+    """Parameters with every value replaced by its type name."""
+    if isinstance(parameters, dict):
+        return {k: type(v).__name__ for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return [f"{len(parameters)} parameter sets"]
+        return [type(v).__name__ for v in parameters]
+    return parameters
+
+
+class Statement:
+    __slots__ = ("sql", "parameters", "duration", "rowcount", "executemany", "plan",
+                 "_shape", "_engine", "_raw_parameters")
+
+    def __init__(self, sql, parameters, duration, rowcount, executemany, engine):
+        self.sql = sql
+        self.parameters = None  # redacted by release()
+        self.duration = duration
+        self.rowcount = rowcount
+        self.executemany = executemany
+        self.plan = None
+        self._shape = None
+        self._engine = engine
+        self._raw_parameters = parameters
+
+    @property
+    def shape(self):
+        if self._shape is None:
+            self._shape = shape(self.sql)
+        return self._shape
+
+    def release(self):
+        """Keep only the parameters' type names; the values are not retained past the request."""
+        if self._engine is not None:
+            self.parameters = redact(self._raw_parameters)
+            self._raw_parameters = None
+            self._engine = None
+
+    def as_dict(self):
+        return {"sql": self.sql, "parameters": self.parameters, "ms": round(self.duration * 1000, 3),
+                "rows": self.rowcount, "plan": self.plan}
+
+
+class QueryProfile:
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.route = None
+        self.status = None
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.statements = []
+
+    @property
+    def db_time(self):
+        return sum(s.duration for s in self.statements)
+
+    def slowest(self, n=SLOWEST):
+        return sorted(self.statements, key=lambda s: s.duration, reverse=True)[:n]
+
+    def repeated(self, threshold=N_PLUS_ONE):
+        """(shape, count) of statement shapes run more than `threshold` times."""
+        counts = Counter(s.shape for s in self.statements if not s.executemany)
+        return [(sql, n) for sql, n in counts.most_common() if n > threshold]
+
+    def as_dict(self):
+        return {
+            "method": self.method, "path": self.path, "route": self.route, "status": self.status,
+            "ms": round(self.elapsed * 1000, 3), "db_ms": round(self.db_time * 1000, 3),
+            "statements": len(self.statements),
+            "slowest": [s.as_dict() for s in self.slowest()],
+            "n_plus_one": [{"shape": sql, "count": n} for sql, n in self.repeated()],
+        }
+
+
+# --- capture ---
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    started = conn.info.get("profile_started")
+    if profile is None or not started:
+        return
+    duration = time.perf_counter() - started.pop()
+    profile.statements.append(Statement(statement, parameters, duration, cursor.rowcount, executemany, conn.engine))
+    _stats.observe_statement(duration)
+    if duration * 1000 >= SLOW_MS and log.isEnabledFor(logging.WARNING):
+        log.warning(json.dumps({"event": "slow_query", "path": profile.path, "ms": round(duration * 1000, 3),
+                                "sql": shape(statement), "parameters": redact(parameters)}))
+
+
+def start(method, path):
+    """Begin profiling the current request (or task); returns the token for finish()."""
+    return _current.set(QueryProfile(method, path))
+
+
+def finish(token, route=None, status=None):
+    """Stop profiling, record the profile and return it."""
+    profile = _current.get()
+    _current.reset(token)
+    if profile is None:
+        return None
+    profile.elapsed = time.perf_counter() - profile.started
+    profile.route = route or "unmatched"
+    profile.status = status
+    if EXPLAIN_MS:
+        explain_slow(profile, EXPLAIN_MS / 1000)
+    for s in profile.statements:
+        s.release()
+    _stats.observe_request(profile)
+    with _history_lock:
+        history.appendleft(profile)
+    if log.isEnabledFor(logging.INFO):
+        log.info(json.dumps({"event": "request", **profile.as_dict()}, default=str))
+    return profile
+
+
+def current():
+    return _current.get()
+
+
+# --- EXPLAIN ---
+
+def explain(engine, sql, parameters):
+    """Plan of one SELECT; EXPLAIN ANALYZE runs it again, so this is only done for reads."""
+    dialect = engine.dialect.name
+    prefix = "EXPLAIN (ANALYZE, BUFFERS) " if dialect == "postgresql" else "EXPLAIN QUERY PLAN "
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(prefix + sql, parameters)
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.rollback()
+    finally:
+        conn.close()
+    if dialect == "postgresql":
+        return "\n".join(r[0] for r in rows)
+    return "\n".join(str(r[-1]) for r in rows)
+
+
+def explain_slow(profile, threshold):
+    for s in profile.statements:
+        if s.duration < threshold or s.executemany or not s.sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            continue
+        try:
+            s.plan = explain(s._engine, s.sql, s._raw_parameters)
+        except Exception as e:
+            s.plan = f"EXPLAIN failed: {e}"
+
+
+# --- aggregates ---
+
+history = deque(maxlen=HISTORY)
+_history_lock = threading.Lock()
+
+
+class _Histogram:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+    def samples(self, labels):
+        out = [("_bucket", dict(labels, le=str(bound)), n) for bound, n in zip(DURATION_BUCKETS, self.buckets)]
+        out.append(("_bucket", dict(labels, le="+Inf"), self.count))
+        out.append(("_sum", labels, self.sum))
+        out.append(("_count", labels, self.count))
+        return out
+
+
+class ProfileStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.statement_time = _Histogram()
+        self.request_db_time = {}   # route -> _Histogram
+        self.statements = Counter()  # route -> statements
+        self.n_plus_one = Counter()  # route -> requests flagged
+
+    def observe_statement(self, duration):
+        with self.lock:
+            self.statement_time.observe(duration)
+
+    def observe_request(self, profile):
+        with self.lock:
+            self.request_db_time.setdefault(profile.route, _Histogram()).observe(profile.db_time)
+            self.statements[profile.route] += len(profile.statements)
+            if profile.repeated():
+                self.n_plus_one[profile.route] += 1
+
+
+_stats = ProfileStats()
+
+
+@metrics.register
+def profile_metrics():
+    with _stats.lock:
+        request_samples = []
+        for route, histogram in sorted(_stats.request_db_time.items()):
+            request_samples.extend(histogram.samples({"route": route}))
+        return [
+            ("db_statement_duration_seconds", "histogram", "Duration of single SQL statements issued by requests",
+             _stats.statement_time.samples({})),
+            ("db_request_time_seconds", "histogram", "Total database time per request",
+             request_samples),
+            ("db_statements_total", "counter", "SQL statements issued by requests",
+             [({"route": r}, n) for r, n in sorted(_stats.statements.items())]),
+            ("db_n_plus_one_requests_total", "counter", "Requests that repeated one statement shape more "
+             f"than {N_PLUS_ONE} times", [({"route": r}, n) for r, n in sorted(_stats.n_plus_one.items())]),
+        ]
+
+
+# --- web hooks ---
+
+def init_app(app):
+    """Profile every request of the Flask `app` (async_app.py registers its own async hooks)."""
+    from flask import g, request
+
+    if not ENABLED:
+        return app
+
+    @app.before_request
+    def _start_profile():
+        g.profile_token = start(request.method, request.full_path.rstrip("?"))
+
+    @app.after_request
+    def _time_response(response):
+        token = g.get("profile_token")
+        if token is not None:
+            g.profile_status = response.status_code
+            if response.is_streamed:
+                # The body runs after teardown, in this thread; its queries count once it is closed.
+                g.profile_token = None
+                rule = _rule(request)
+                response.call_on_close(lambda: finish(token, rule, response.status_code))
+            else:
+                response.headers["Server-Timing"] = server_timing(current())
+        return response
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        # Teardown runs even when the view (or another after_request hook) raised.
+        token = g.pop("profile_token", None)
+        if token is not None:
+            finish(token, _rule(request), g.get("profile_status", 500))
+
+    return app
+
+
+def _rule(request):
+    return request.url_rule.rule if request.url_rule is not None else None
+
+
+def server_timing(profile):
+    """Server-Timing header value, so browser dev tools show the request's database time."""
+    return f'db;dur={profile.db_time * 1000:.1f};desc="{len(profile.statements)} queries"'
+
+
+def debug_panel_enabled(app):
+    return app.debug or os.environ.get("DEBUG_QUERIES", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def recent(limit=HISTORY):
+    with _history_lock:
+        return list(history)[:limit]
@@ -0,0 +1,232 @@
+"""
+Reporting runner: the dashboard reports of queries.py computed together
+against one consistent snapshot of the database.
+
+On PostgreSQL a coordinating transaction (REPEATABLE READ) exports its
+snapshot with pg_export_snapshot() and every worker thread opens its own
+REPEATABLE READ transaction that imports it (SET TRANSACTION SNAPSHOT), so
+the reports run in parallel on a thread pool yet all see the same data.
+Snapshots can only be shared between sessions of one server, so the runner
+always reads from the primary.  SQLite cannot share a snapshot between
+connections; there the reports run one after another inside a single read
+transaction instead.
+
+The four caregiver earnings reports scan the same caregiver_earnings /
+caregiver / USER join, so they are fused into one grouped query: GROUPING
+SETS ((caregiver), ()) returns the per-caregiver rows and the overall average
+in one pass (UNION ALL of the two groupings on SQLite), and the four results
+are cut out of it.
+
+    python reporting.py [--workers 4]
+"""
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, literal, null, select, text, tuple_, union_all
+from sqlalchemy.orm import Session
+
+from models import User, Caregiver, Member, Address, Job, JobApplication, Appointment, CaregiverEarnings
+from db import get_engine
+import earnings
+import queries
+
+DASHBOARD = (
+    "count_applicants_per_job",
+    "total_hours_by_caregiver_for_accepted",
+    "average_pay_of_caregivers",
+    "caregivers_earning_above_average",
+    "total_cost_all_accepted",
+    "accepted_appointments_names",
+    "jobs_with_soft_spoken",
+    "babysitter_work_hours",
+    "members_looking_elderly_astana_no_pets",
+)
+
+# Every table the dashboard reads (caregiver_earnings moves with appointment), for cache keys.
+SOURCE_MODELS = (User, Caregiver, Member, Address, Job, JobApplication, Appointment, CaregiverEarnings)
+
+WORKERS = int(os.environ.get("REPORT_WORKERS", 4))
+
+_SNAPSHOT_ID = re.compile(r"^[0-9A-F]+-[0-9A-F]+(-[0-9]+)?$", re.IGNORECASE)
+
+
+# --- fused earnings reports ---
+
+EARNINGS_REPORTS = (
+    "total_hours_by_caregiver_for_accepted",
+    "average_pay_of_caregivers",
+    "caregivers_earning_above_average",
+    "total_cost_all_accepted",
+)
+
+
+def _earnings_aggregates(dialect):
+    avg_income = earnings.average_income(dialect)
+    return [
+        func.sum(CaregiverEarnings.accepted_hours).label("total_hours"),
+        func.avg(avg_income, type_=avg_income.type).label("avg_pay"),
+        func.sum(Caregiver.hourly_rate * CaregiverEarnings.accepted_hours).label("total_cost"),
+    ]
+
+
+def _earnings_from(stmt):
+    return stmt.select_from(CaregiverEarnings).\
+        join(Caregiver, Caregiver.caregiver_user_id == CaregiverEarnings.caregiver_user_id).\
+        join(User, Caregiver.caregiver_user_id == User.user_id).\
+        where(CaregiverEarnings.accepted_count > 0)
+
+
+def fused_earnings_query(dialect):
+    """
+    One row per caregiver (is_total 0) plus one grand total row (is_total 1)
+    whose avg_pay is the average of the caregivers' average pay.
+    """
+    per_caregiver = (Caregiver.caregiver_user_id, User.given_name, User.surname)
+    if dialect == "postgresql":
+        return _earnings_from(select(
+            *per_caregiver, func.grouping(Caregiver.caregiver_user_id).label("is_total"), *_earnings_aggregates(dialect)
+        )).group_by(func.grouping_sets(tuple_(*per_caregiver), tuple_()))
+    # No GROUPING SETS: the same two groupings glued together.
+    detail = _earnings_from(select(*per_caregiver, literal(0).label("is_total"), *_earnings_aggregates(dialect))).\
+        group_by(*per_caregiver)
+    avg_income = earnings.average_income(dialect)
+    total = _earnings_from(select(
+        null(), null(), null(), literal(1), null(), func.avg(avg_income, type_=avg_income.type), null()
+    ))
+    return union_all(detail, total)
+
+
+def fused_earnings(session):
+    """The four earnings reports from one query, shaped like their queries.py versions."""
+    rows = session.execute(fused_earnings_query(session.get_bind().dialect.name)).all()
+    detail = [r for r in rows if not r.is_total]
+    totals = [r for r in rows if r.is_total]
+    overall_avg = totals[0].avg_pay if totals else None
+
+    def ranked(value):
+        return sorted(((r.caregiver_user_id, r.given_name, r.surname, getattr(r, value)) for r in detail),
+                      key=lambda t: t[3], reverse=True)
+
+    above = [] if overall_avg is None else sorted(
+        ((r.caregiver_user_id, r.avg_pay) for r in detail if r.avg_pay > overall_avg),
+        key=lambda t: t[1], reverse=True)
+    return {
+        "total_hours_by_caregiver_for_accepted": ranked("total_hours"),
+        "average_pay_of_caregivers": ranked("avg_pay"),
+        "caregivers_earning_above_average": (above, overall_avg),
+        "total_cost_all_accepted": ranked("total_cost"),
+    }
+
+
+# --- running ---
+
+class ReportRun:
+    def __init__(self, mode, snapshot=None):
+        self.mode = mode            # "parallel" or "serial"
+        self.snapshot = snapshot    # exported snapshot id (PostgreSQL)
+        self.results = {}           # report name -> result as queries.py returns it
+        self.timings = {}           # report name -> seconds (shared by fused reports)
+        self.fused = {}             # report name -> name of the query it was computed by
+        self.elapsed = 0.0
+
+    @property
+    def report_time(self):
+        """Sum of the individual query times, i.e. roughly the serial cost."""
+        return sum({self.fused.get(n, n): t for n, t in self.timings.items()}.values())
+
+
+def _units(names):
+    """[(unit name, fn(session) -> {report: result}, reports)] with the earnings reports fused."""
+    units = []
+    fused = [n for n in names if n in EARNINGS_REPORTS]
+    if len(fused) > 1:
+        units.append(("earnings (fused)", lambda s: {n: r for n, r in fused_earnings(s).items() if n in fused}, fused))
+    for name in names:
+        if len(fused) > 1 and name in fused:
+            continue
+        query = queries.REPORTS[name].query
+        units.append((name, lambda s, name=name, query=query: {name: query(s)}, [name]))
+    return units
+
+
+def _timed(unit, session):
+    name, fn, _ = unit
+    started = time.perf_counter()
+    results = fn(session)
+    return name, results, time.perf_counter() - started
+
+
+def _run_in_snapshot(engine, snapshot, unit):
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="REPEATABLE READ")
+        with conn.begin():
+            # Must be the first statement of the transaction; the id cannot be a bind parameter.
+            conn.exec_driver_sql(f"SET TRANSACTION SNAPSHOT '{snapshot}'")
+            conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+            with Session(bind=conn) as session:
+                return _timed(unit, session)
+
+
+def _record(run, unit_name, results, seconds):
+    for report, result in results.items():
+        run.results[report] = result
+        run.timings[report] = seconds
+        if unit_name != report:
+            run.fused[report] = unit_name
+
+
+def run(names=DASHBOARD, engine=None, workers=WORKERS):
+    """Compute the named reports against one snapshot; returns a ReportRun."""
+    engine = engine or get_engine()
+    units = _units(list(names))
+    started = time.perf_counter()
+
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as coordinator:
+            coordinator = coordinator.execution_options(isolation_level="REPEATABLE READ")
+            with coordinator.begin():
+                snapshot = coordinator.execute(text("SELECT pg_export_snapshot()")).scalar()
+                if not _SNAPSHOT_ID.match(snapshot):
+                    raise RuntimeError(f"unexpected snapshot id {snapshot!r}")
+                report_run = ReportRun("parallel", snapshot)
+                # The exported snapshot is importable only while this transaction stays open.
+                with ThreadPoolExecutor(max_workers=max(1, min(workers, len(units)))) as pool:
+                    futures = [pool.submit(_run_in_snapshot, engine, snapshot, unit) for unit in units]
+                    for future in futures:
+                        _record(report_run, *future.result())
+    else:
+        report_run = ReportRun("serial")
+        with engine.connect() as conn:
+            # pysqlite does not open a transaction for reads by itself; one BEGIN keeps every read consistent.
+            conn.exec_driver_sql("BEGIN")
+            try:
+                with Session(bind=conn) as session:
+                    for unit in units:
+                        _record(report_run, *_timed(unit, session))
+            finally:
+                conn.rollback()
+
+    report_run.elapsed = time.perf_counter() - started
+    return report_run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the dashboard reports against one snapshot")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args(argv)
+
+    report_run = run(workers=args.workers)
+    for name in DASHBOARD:
+        result = report_run.results[name]
+        rows = result[0] if isinstance(result, tuple) else result
+        via = f"  (via {report_run.fused[name]})" if name in report_run.fused else ""
+        print(f"{name:42} {len(rows):>8} rows {report_run.timings[name] * 1000:>9.1f} ms{via}")
+    print(f"{report_run.mode}: {report_run.elapsed * 1000:.1f} ms wall, "
+          f"{report_run.report_time * 1000:.1f} ms of queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+"""
+Appointment scheduling: overlap detection and free-slot search per caregiver.
+
+A booking occupies [appointment_date + appointment_time, + work_hours) and
+only pending and accepted bookings block the caregiver.
+
+The database has the last word.  PostgreSQL enforces the rule with an
+exclusion constraint (migration 5):
+
+    EXCLUDE USING gist (caregiver_user_id WITH =, tsrange(start, end) WITH &&)
+    WHERE (status IN ('pending', 'accepted'))
+
+(tsrange rather than tstzrange: the columns carry no time zone.)  On SQLite
+BEFORE INSERT/UPDATE triggers (migration 7) abort a write that would
+overlap an active booking.  Either way a concurrent writer in another
+process cannot double book, and Scheduler.booking() turns the violation
+into a ScheduleConflict.
+
+In front of that, Scheduler keeps each caregiver's active bookings as
+start-sorted arrays so conflict checks and free-slot searches need no
+query: a check is a bisect plus a look at the few bookings that start
+within the longest booking length before the end of the new one, so it
+stays O(log n) however much history a caregiver has.  A calendar is
+re-read after SCHEDULE_CALENDAR_MAX_AGE seconds (default 60) to pick up
+other processes' writes, and Scheduler.booking(caregiver, session)
+re-reads it inside the booking's own transaction while serialising
+check-and-insert for that caregiver in this process.
+"""
+import argparse
+import asyncio
+import bisect
+import os
+import threading
+import time as clock
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta, time
+
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session as OrmSession
+
+from models import User, Caregiver, Member, Appointment
+from db import get_engine
+
+ACTIVE_STATUSES = ("pending", "accepted")
+CONSTRAINT = "appointment_no_overlap"
+
+# Working hours searched by free_slots() unless told otherwise.
+DAY_START = time(7, 0)
+DAY_END = time(22, 0)
+MAX_SLOT_DAYS = 366
+
+_RANGE = ("tsrange({t}.appointment_date + {t}.appointment_time, "
+          "{t}.appointment_date + {t}.appointment_time + {t}.work_hours * interval '1 hour')")
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    f"""ALTER TABLE appointment ADD CONSTRAINT {CONSTRAINT} EXCLUDE USING gist (
+            caregiver_user_id WITH =,
+            tsrange(appointment_date + appointment_time,
+                    appointment_date + appointment_time + work_hours * interval '1 hour') WITH &&
+        ) WHERE (status IN ('pending', 'accepted'))""",
+]
+
+# Seconds since the epoch, so SQLite compares whole numbers rather than julian day fractions.
+_SQLITE_START = "CAST(strftime('%s', {t}.appointment_date || ' ' || {t}.appointment_time) AS INTEGER)"
+_SQLITE_END = "(" + _SQLITE_START + " + CAST(round({t}.work_hours * 3600) AS INTEGER))"
+
+
+def _sqlite_overlap(a, b):
+    return (f"{_SQLITE_START.format(t=a)} < {_SQLITE_END.format(t=b)} "
+            f"AND {_SQLITE_START.format(t=b)} < {_SQLITE_END.format(t=a)}")
+
+
+_SQLITE_CHECK = f"""
+    SELECT RAISE(ABORT, '{CONSTRAINT}: the caregiver is already booked then')
+    WHERE EXISTS (
+        SELECT 1 FROM appointment a
+        WHERE a.caregiver_user_id = NEW.caregiver_user_id AND a.status IN ('pending', 'accepted')
+          AND a.appointment_id IS NOT NEW.appointment_id
+          -- cheap pre-filter: work_hours is NUMERIC(5,2), so no booking is longer than 42 days
+          AND a.appointment_date BETWEEN date(NEW.appointment_date, '-42 days') AND date(NEW.appointment_date, '+42 days')
+          AND {_sqlite_overlap('a', 'NEW')}
+    );
+"""
+
+SQLITE_DDL = [
+    # Lets the trigger's date pre-filter seek instead of reading the caregiver's whole history.
+    "CREATE INDEX IF NOT EXISTS ix_appointment_caregiver_date ON appointment (caregiver_user_id, appointment_date)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {CONSTRAINT}_insert BEFORE INSERT ON appointment
+    WHEN NEW.status IN ('pending', 'accepted')
+    BEGIN {_SQLITE_CHECK} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {CONSTRAINT}_update
+    BEFORE UPDATE OF caregiver_user_id, appointment_date, appointment_time, work_hours, status ON appointment
+    WHEN NEW.status IN ('pending', 'accepted')
+    BEGIN {_SQLITE_CHECK} END
+    """,
+]
+
+OVERLAPS_SQL = f"""
+    SELECT a.caregiver_user_id, a.appointment_id AS first_id, b.appointment_id AS second_id
+    FROM appointment a
+    JOIN appointment b ON b.caregiver_user_id = a.caregiver_user_id AND b.appointment_id > a.appointment_id
+    WHERE a.status IN ('pending', 'accepted') AND b.status IN ('pending', 'accepted')
+      AND {_RANGE.format(t='a')} && {_RANGE.format(t='b')}
+    ORDER BY a.caregiver_user_id, a.appointment_id
+    LIMIT :limit
+"""
+
+SQLITE_OVERLAPS_SQL = f"""
+    SELECT a.caregiver_user_id, a.appointment_id AS first_id, b.appointment_id AS second_id
+    FROM appointment a
+    JOIN appointment b ON b.caregiver_user_id = a.caregiver_user_id AND b.appointment_id > a.appointment_id
+    WHERE a.status IN ('pending', 'accepted') AND b.status IN ('pending', 'accepted')
+      AND {_sqlite_overlap('a', 'b')}
+    ORDER BY a.caregiver_user_id, a.appointment_id
+    LIMIT :limit
+"""
+
+
+class ScheduleConflict(ValueError):
+    def __init__(self, caregiver_user_id, appointment_ids):
+        self.caregiver_user_id = caregiver_user_id
+        self.appointment_ids = appointment_ids
+        which = f" (appointment {', '.join(map(str, appointment_ids))})" if appointment_ids else ""
+        super().__init__(f"caregiver {caregiver_user_id} is already booked then{which}")
+
+
+def is_overlap_violation(error):
+    """True for the IntegrityError raised by the exclusion constraint or the SQLite triggers."""
+    return isinstance(error, IntegrityError) and CONSTRAINT in str(error.orig)
+
+
+def booking_interval(appointment_date, appointment_time, work_hours):
+    start = datetime.combine(appointment_date, appointment_time)
+    return start, start + timedelta(hours=float(work_hours))
+
+
+# --- Schema (used by migrations.py) ---
+
+def find_overlaps(conn, limit=20):
+    """Pairs of active bookings that overlap; they block install()."""
+    sql = SQLITE_OVERLAPS_SQL if conn.dialect.name == "sqlite" else OVERLAPS_SQL
+    return conn.execute(text(sql), {"limit": limit}).fetchall()
+
+
+def _refuse_overlaps(conn):
+    overlaps = find_overlaps(conn)
+    if overlaps:
+        pairs = ", ".join(f"{r.first_id}/{r.second_id}" for r in overlaps[:5])
+        raise RuntimeError(f"Cannot add {CONSTRAINT}: overlapping active appointments ({pairs}, ...); "
+                           f"list them with `python scheduling.py --overlaps`, decline or move them and migrate again")
+
+
+def install(conn):
+    """Add the no-overlap rule for the connection's dialect (a no-op once it exists)."""
+    if conn.dialect.name == "sqlite":
+        _refuse_overlaps(conn)
+        for statement in SQLITE_DDL:
+            conn.execute(text(statement))
+        return
+    if conn.dialect.name != "postgresql":
+        return
+    exists = conn.execute(text("SELECT 1 FROM pg_constraint WHERE conname = :name"),
+                          {"name": CONSTRAINT}).first()
+    if exists:
+        return
+    conn.execute(text(POSTGRES_DDL[0]))
+    _refuse_overlaps(conn)
+    conn.execute(text(POSTGRES_DDL[1]))
+
+
+# --- In-process interval index ---
+
+class Calendar:
+    """One caregiver's active bookings, sorted by start."""
+
+    __slots__ = ("starts", "entries", "max_length", "loaded_at")
+
+    def __init__(self):
+        self.starts = []
+        self.entries = []  # (start, end, appointment_id), same order as starts
+        self.max_length = timedelta(0)
+        self.loaded_at = None
+
+    def add(self, start, end, appointment_id):
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.entries.insert(i, (start, end, appointment_id))
+        self.max_length = max(self.max_length, end - start)
+
+    def remove(self, start, appointment_id):
+        i = bisect.bisect_left(self.starts, start)
+        while i < len(self.starts) and self.starts[i] == start:
+            if self.entries[i][2] == appointment_id:
+                del self.starts[i]
+                del self.entries[i]
+                return
+            i += 1
+
+    def overlapping(self, start, end):
+        """Bookings intersecting [start, end), in start order."""
+        # Anything that overlaps starts before `end` and no earlier than start - max_length.
+        lo = bisect.bisect_right(self.starts, start - self.max_length)
+        hi = bisect.bisect_left(self.starts, end)
+        return [e for e in self.entries[max(lo - 1, 0):hi] if e[1] > start and e[0] < end]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class Scheduler:
+    def __init__(self, bind, max_age=60.0):
+        self.bind = bind
+        self.max_age = max_age
+        self._calendars = {}
+        self._where = {}  # appointment_id -> (caregiver_user_id, start)
+        self._lock = threading.RLock()
+        self._booking_locks = defaultdict(threading.Lock)
+
+    def calendar(self, caregiver_user_id):
+        with self._lock:
+            calendar = self._calendars.get(caregiver_user_id)
+            if calendar is None or clock.monotonic() - calendar.loaded_at > self.max_age:
+                with self.bind.connect() as conn:
+                    self._install(self._read([caregiver_user_id], conn))
+                calendar = self._calendars[caregiver_user_id]
+            return calendar
+
+    def preload(self, caregiver_user_ids):
+        """Load the calendars of many caregivers with one query (batch checks)."""
+        with self._lock:
+            missing = [c for c in set(caregiver_user_ids) if c not in self._calendars]
+            if missing:
+                with self.bind.connect() as conn:
+                    self._install(self._read(missing, conn))
+
+    def refresh(self, caregiver_user_ids, connection):
+        """Re-read the caregivers' calendars through `connection`, i.e. inside its transaction."""
+        self._install(self._read(caregiver_user_ids, connection))
+
+    def _read(self, caregiver_user_ids, conn):
+        calendars = {c: Calendar() for c in caregiver_user_ids}
+        stmt = select(Appointment.appointment_id, Appointment.caregiver_user_id, Appointment.appointment_date,
+                      Appointment.appointment_time, Appointment.work_hours).where(
+            Appointment.caregiver_user_id.in_(list(calendars)), Appointment.status.in_(ACTIVE_STATUSES))
+        for row in conn.execute(stmt):
+            start, end = booking_interval(row.appointment_date, row.appointment_time, row.work_hours)
+            calendars[row.caregiver_user_id].add(start, end, row.appointment_id)
+        return calendars
+
+    def _install(self, calendars):
+        loaded_at = clock.monotonic()
+        with self._lock:
+            for caregiver_user_id, calendar in calendars.items():
+                old = self._calendars.get(caregiver_user_id)
+                if old is not None:
+                    for _, _, appointment_id in old.entries:
+                        self._where.pop(appointment_id, None)
+                calendar.loaded_at = loaded_at
+                self._calendars[caregiver_user_id] = calendar
+                for start, _, appointment_id in calendar.entries:
+                    self._where[appointment_id] = (caregiver_user_id, start)
+
+    def conflicts(self, caregiver_user_id, appointment_date, appointment_time, work_hours, ignore=None):
+        """Ids of active bookings that overlap the proposed one (`ignore`: the booking being moved)."""
+        start, end = booking_interval(appointment_date, appointment_time, work_hours)
+        with self._lock:
+            return [e[2] for e in self.calendar(caregiver_user_id).overlapping(start, end) if e[2] != ignore]
+
+    def check(self, caregiver_user_id, appointment_date, appointment_time, work_hours, ignore=None):
+        clashes = self.conflicts(caregiver_user_id, appointment_date, appointment_time, work_hours, ignore)
+        if clashes:
+            raise ScheduleConflict(caregiver_user_id, clashes)
+
+    def _booking_lock(self, caregiver_user_id):
+        with self._lock:
+            return self._booking_locks[caregiver_user_id]
+
+    @contextmanager
+    def booking(self, caregiver_user_id, session=None):
+        """
+        Hold while checking and committing a booking so two requests cannot
+        both pass the check.  With the booking's `session` the caregiver's
+        calendar is first re-read inside its transaction.  An overlap the
+        database rejects at commit is raised as ScheduleConflict.
+        """
+        with self._booking_lock(caregiver_user_id):
+            if session is not None:
+                self.refresh([caregiver_user_id], session.connection())
+            try:
+                yield self
+            except IntegrityError as e:
+                if not is_overlap_violation(e):
+                    raise
+                raise ScheduleConflict(caregiver_user_id, []) from e
+
+    @asynccontextmanager
+    async def booking_async(self, caregiver_user_id, session=None):
+        """booking() for an AsyncSession; the lock is awaited on a worker thread, never on the event loop."""
+        lock = self._booking_lock(caregiver_user_id)
+        acquiring = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            acquiring.add_done_callback(lambda _: lock.release())
+            raise
+        try:
+            if session is not None:
+                await session.run_sync(lambda s: self.refresh([caregiver_user_id], s.connection()))
+            try:
+                yield self
+            except IntegrityError as e:
+                if not is_overlap_violation(e):
+                    raise
+                raise ScheduleConflict(caregiver_user_id, []) from e
+        finally:
+            lock.release()
+
+    def free_slots(self, caregiver_user_id, date_from, date_to, hours, day_start=DAY_START, day_end=DAY_END):
+        """
+        Windows of at least `hours` between day_start and day_end on each day
+        from date_from to date_to (inclusive) where the caregiver has no
+        active booking, as (start, end) datetimes.
+        """
+        need = timedelta(hours=float(hours))
+        slots = []
+        with self._lock:
+            calendar = self.calendar(caregiver_user_id)
+            day = date_from
+            while day <= date_to:
+                cursor, close = datetime.combine(day, day_start), datetime.combine(day, day_end)
+                for busy_start, busy_end, _ in calendar.overlapping(cursor, close):
+                    if busy_start - cursor >= need:
+                        slots.append((cursor, busy_start))
+                    cursor = max(cursor, busy_end)
+                if close - cursor >= need:
+                    slots.append((cursor, close))
+                day += timedelta(days=1)
+        return slots
+
+    # --- incremental updates ---
+
+    def apply(self, changes):
+        with self._lock:
+            for appointment_id, values in changes:
+                old = self._where.pop(appointment_id, None)
+                if old is not None and old[0] in self._calendars:
+                    self._calendars[old[0]].remove(old[1], appointment_id)
+                if values is None or values["status"] not in ACTIVE_STATUSES:
+                    continue
+                calendar = self._calendars.get(values["caregiver_user_id"])
+                if calendar is None:
+                    continue  # loaded from the database on first use
+                start, end = booking_interval(values["appointment_date"], values["appointment_time"],
+                                              values["work_hours"])
+                calendar.add(start, end, appointment_id)
+                self._where[appointment_id] = (values["caregiver_user_id"], start)
+
+    def invalidate(self, caregiver_user_ids):
+        """Forget these caregivers' calendars; they are read again on next use."""
+        with self._lock:
+            for caregiver_user_id in caregiver_user_ids:
+                calendar = self._calendars.pop(caregiver_user_id, None)
+                if calendar is not None:
+                    for _, _, appointment_id in calendar.entries:
+                        self._where.pop(appointment_id, None)
+
+    def reset(self):
+        with self._lock:
+            self._calendars.clear()
+            self._where.clear()
+
+
+_FIELDS = ("caregiver_user_id", "appointment_date", "appointment_time", "work_hours", "status")
+
+
+def _inserted(parameters):
+    """("invalidate", caregiver ids) for a bulk INSERT's parameter sets; a reset when they do not say."""
+    rows = parameters if isinstance(parameters, (list, tuple)) else [parameters]
+    try:
+        caregiver_user_ids = {row["caregiver_user_id"] for row in rows}
+    except (KeyError, TypeError):
+        return ("reset", None)
+    return ("invalidate", caregiver_user_ids) if caregiver_user_ids else ("reset", None)
+
+
+def watch(scheduler, session_class=OrmSession):
+    """Keep `scheduler` in step with committed ORM changes to appointments."""
+    # One list per watch, so a scheduler watching a parent session class does not consume this one's.
+    info_key = f"schedule_changes:{id(scheduler)}"
+
+    def _pending(session):
+        return session.info.setdefault(info_key, [])
+
+    @event.listens_for(session_class, "after_flush")
+    def _after_flush(session, flush_context):
+        changes = _pending(session)
+        for objs, deleted in ((session.new, False), (session.dirty, False), (session.deleted, True)):
+            for obj in objs:
+                if not isinstance(obj, Appointment):
+                    continue
+                values = inspect(obj).dict
+                if "appointment_id" in values and deleted:
+                    changes.append((values["appointment_id"], None))
+                elif "appointment_id" in values and all(f in values for f in _FIELDS):
+                    changes.append((values["appointment_id"], {f: values[f] for f in _FIELDS}))
+                else:
+                    changes.append(("reset", None))
+
+    @event.listens_for(session_class, "do_orm_execute")
+    def _bulk_statement(orm_execute_state):
+        mapper = orm_execute_state.bind_mapper
+        if mapper is None:
+            return
+        if orm_execute_state.is_insert:
+            # New users/caregivers/members have no bookings yet; inserted bookings only
+            # touch the calendars of the caregivers named in the batch.
+            if issubclass(mapper.class_, Appointment):
+                _pending(orm_execute_state.session).append(_inserted(orm_execute_state.parameters))
+        elif orm_execute_state.is_update or orm_execute_state.is_delete:
+            # Deleting caregivers/members cascades to their appointments in the database.
+            if issubclass(mapper.class_, (Appointment, Caregiver, Member, User)):
+                _pending(orm_execute_state.session).append(("reset", None))
+
+    @event.listens_for(session_class, "after_commit")
+    def _after_commit(session):
+        changes = session.info.pop(info_key, None)
+        if not changes:
+            return
+        if any(key == "reset" for key, _ in changes):
+            scheduler.reset()
+            return
+        for key, caregiver_user_ids in changes:
+            if key == "invalidate":
+                scheduler.invalidate(caregiver_user_ids)
+        scheduler.apply([change for change in changes if change[0] != "invalidate"])
+
+    @event.listens_for(session_class, "after_rollback")
+    def _after_rollback(session):
+        session.info.pop(info_key, None)
+
+    return scheduler
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_scheduler(bind):
+    """The process-wide Scheduler, created (and hooked to session events) on first use."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = watch(Scheduler(bind, max_age=float(os.environ.get("SCHEDULE_CALENDAR_MAX_AGE", 60))))
+    return _shared
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Appointment overlap report")
+    parser.add_argument("--overlaps", action="store_true", help="list overlapping active bookings")
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.overlaps:
+        with get_engine().connect() as conn:
+            for row in find_overlaps(conn, args.limit):
+                print(f"caregiver {row.caregiver_user_id}: appointments {row.first_id} and {row.second_id} overlap")
+
+
+if __name__ == "__main__":
+    main()
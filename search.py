@@ -0,0 +1,171 @@
+"""
+Full-text search over job requirements, member house rules / dependent
+descriptions and user profile descriptions.
+
+PostgreSQL: generated tsvector columns (search_vector) with GIN indexes,
+ranked with ts_rank_cd.  SQLite: external-content FTS5 tables kept in sync by
+triggers, ranked with bm25.  Both are created by migration 2 in migrations.py.
+Other backends fall back to ILIKE without ranking.
+"""
+import re
+
+from sqlalchemy import text
+
+KINDS = ("jobs", "caregivers", "members")
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+
+TS_CONFIG = "english"
+
+# Per kind: result id, displayed text, tsvector column (PostgreSQL), FTS5 table and
+# the column its rowid maps to (SQLite), base FROM clause and the caregiving-type filter.
+_SOURCES = {
+    "jobs": dict(
+        id="j.job_id",
+        text="j.other_requirements",
+        vector="j.search_vector",
+        fts="job_fts", fts_rowid="j.job_id",
+        source='job j JOIN "USER" u ON u.user_id = j.member_user_id',
+        caregiving_type="j.required_caregiving_type = :caregiving_type",
+    ),
+    "caregivers": dict(
+        id="c.caregiver_user_id",
+        text="u.profile_description",
+        vector="u.search_vector",
+        fts="user_fts", fts_rowid="u.user_id",
+        source='caregiver c JOIN "USER" u ON u.user_id = c.caregiver_user_id',
+        caregiving_type="c.caregiving_type = :caregiving_type",
+    ),
+    "members": dict(
+        id="m.member_user_id",
+        text="coalesce(m.house_rules, '') || ' ' || coalesce(m.dependent_description, '')",
+        vector="m.search_vector",
+        fts="member_fts", fts_rowid="m.member_user_id",
+        source='member m JOIN "USER" u ON u.user_id = m.member_user_id',
+        caregiving_type="EXISTS (SELECT 1 FROM job mj WHERE mj.member_user_id = m.member_user_id "
+                        "AND mj.required_caregiving_type = :caregiving_type)",
+    ),
+}
+
+
+# --- Schema (used by migrations.py) ---
+
+POSTGRES_DDL = [
+    f"""ALTER TABLE job ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS
+        (to_tsvector('{TS_CONFIG}', coalesce(other_requirements, ''))) STORED""",
+    f"""ALTER TABLE member ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS
+        (setweight(to_tsvector('{TS_CONFIG}', coalesce(dependent_description, '')), 'A') ||
+         setweight(to_tsvector('{TS_CONFIG}', coalesce(house_rules, '')), 'B')) STORED""",
+    f"""ALTER TABLE "USER" ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS
+        (to_tsvector('{TS_CONFIG}', coalesce(profile_description, ''))) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_job_search_vector ON job USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_member_search_vector ON member USING gin (search_vector)",
+    'CREATE INDEX IF NOT EXISTS ix_user_search_vector ON "USER" USING gin (search_vector)',
+]
+
+
+def _sqlite_fts(name, table, rowid, columns):
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5({cols}, content=\'{table}\', '
+        f'content_rowid=\'{rowid}\', tokenize=\'porter unicode61\')',
+        f'CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON "{table}" BEGIN '
+        f'INSERT INTO {name}(rowid, {cols}) VALUES (new.{rowid}, {new}); END',
+        f'CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON "{table}" BEGIN '
+        f'INSERT INTO {name}({name}, rowid, {cols}) VALUES (\'delete\', old.{rowid}, {old}); END',
+        f'CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE ON "{table}" BEGIN '
+        f'INSERT INTO {name}({name}, rowid, {cols}) VALUES (\'delete\', old.{rowid}, {old}); '
+        f'INSERT INTO {name}(rowid, {cols}) VALUES (new.{rowid}, {new}); END',
+        f"INSERT INTO {name}({name}) VALUES ('rebuild')",
+    ]
+
+
+SQLITE_DDL = (
+    _sqlite_fts("job_fts", "job", "job_id", ["other_requirements"])
+    + _sqlite_fts("member_fts", "member", "member_user_id", ["dependent_description", "house_rules"])
+    + _sqlite_fts("user_fts", "USER", "user_id", ["profile_description"])
+)
+
+
+def install(conn):
+    """Create the search columns/tables and indexes for the connection's dialect."""
+    if conn.dialect.name == "postgresql":
+        statements = POSTGRES_DDL
+    elif conn.dialect.name == "sqlite":
+        statements = SQLITE_DDL
+    else:
+        return
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+# --- Queries ---
+
+def terms(q):
+    return re.findall(r"\w+", (q or "").lower())
+
+
+def _match_expression(dialect, words, prefix):
+    if dialect == "postgresql":
+        return " & ".join(f"{w}:*" if prefix else w for w in words)
+    # FTS5: quoted tokens are implicitly ANDed, a trailing * makes a prefix query.
+    return " ".join(f'"{w}"*' if prefix else f'"{w}"' for w in words)
+
+
+def _kind_sql(dialect, kind, filters):
+    spec = _SOURCES[kind]
+    where = []
+    if dialect == "postgresql":
+        select_rank = f"ts_rank_cd({spec['vector']}, query) AS rank"
+        source = f"{spec['source']}, to_tsquery('{TS_CONFIG}', :match) query"
+        where.append(f"{spec['vector']} @@ query")
+    elif dialect == "sqlite":
+        select_rank = f"-bm25({spec['fts']}) AS rank"
+        source = f"{spec['fts']}, {spec['source']}"
+        where.append(f"{spec['fts']} MATCH :match")
+        where.append(f"{spec['fts_rowid']} = {spec['fts']}.rowid")
+    else:
+        select_rank = "0.0 AS rank"
+        source = spec["source"]
+        where.extend(f"lower({spec['text']}) LIKE :like{i}" for i in range(filters["n_terms"]))
+    if filters.get("city"):
+        where.append("lower(u.city) = lower(:city)")
+    if filters.get("caregiving_type"):
+        where.append(spec["caregiving_type"])
+    return (
+        f"SELECT '{kind}' AS kind, {spec['id']} AS id, u.given_name, u.surname, u.city, "
+        f"{spec['text']} AS text, {select_rank} "
+        f"FROM {source} WHERE {' AND '.join(where)} ORDER BY rank DESC LIMIT :limit"
+    )
+
+
+def search(session, q, kinds=KINDS, city=None, caregiving_type=None, limit=DEFAULT_LIMIT, prefix=True):
+    """
+    Ranked search; every word in `q` must match (as a prefix when `prefix`).
+    Returns rows with kind, id, given_name, surname, city, text and rank,
+    best match first.
+    """
+    words = terms(q)
+    if not words:
+        return []
+    if isinstance(kinds, str):
+        kinds = [kinds]
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    dialect = session.get_bind().dialect.name
+
+    params = {"limit": limit, "city": city, "caregiving_type": caregiving_type}
+    if dialect in ("postgresql", "sqlite"):
+        params["match"] = _match_expression(dialect, words, prefix)
+    else:
+        params.update({f"like{i}": f"%{w}%" for i, w in enumerate(words)})
+    filters = {"city": city, "caregiving_type": caregiving_type, "n_terms": len(words)}
+
+    rows = []
+    for kind in kinds:
+        if kind not in _SOURCES:
+            raise ValueError(f"Unknown search kind {kind!r}")
+        rows.extend(session.execute(text(_kind_sql(dialect, kind, filters)), params).fetchall())
+    rows.sort(key=lambda r: r.rank, reverse=True)
+    return rows[:limit]
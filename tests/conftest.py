@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+
+# Configure before any project module is imported: a throwaway SQLite file,
+# cheap password hashing done inline, and one export admin.
+_tmp = tempfile.mkdtemp(prefix="db3-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ.setdefault("PASSWORD_COST", "low")
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+os.environ.setdefault("EXPORT_ADMIN_EMAILS", "admin@example.com")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def engine():
+    import seed_data
+    from db import get_engine
+
+    seed_data.generate(users=200, jobs=100, appointments=400, applications=200, verbose=False)
+    return get_engine()
+
+
+@pytest.fixture
+def client(engine):
+    from app import create_app
+
+    app = create_app()
+    app.testing = True
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(engine):
+    """Count the SQL statements sent to the database while the test runs."""
+    from sqlalchemy import event
+
+    seen = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    yield seen
+    event.remove(engine, "before_cursor_execute", count)
@@ -0,0 +1,15 @@
+import numpy as np
+
+import analytics
+
+
+def test_round_half_up_on_005_boundaries():
+    values = np.array([0.125, 1.005, 2.675, 10.125, -0.125, 3.0])
+    assert analytics.round_half_up(values).tolist() == [0.13, 1.01, 2.68, 10.13, -0.13, 3.0]
+
+
+def test_rules_round_like_the_database():
+    # 10.125 is exact in binary; np.round would give 10.12 (half to even), ROUND() gives 10.13.
+    assert analytics.percent(0)(np.array([10.125]), None, None).tolist() == [10.13]
+    # 11.25 * 1.10 = 12.375: the commission rule's multiplied branch.
+    assert analytics.commission()(np.array([9.5, 11.25]), None, None).tolist() == [9.8, 12.38]
@@ -0,0 +1,96 @@
+import re
+
+import pytest
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+import scheduling
+from models import Appointment, Caregiver, Job, JobApplication, Member
+
+
+def _in_queries(statements, table):
+    return [s for s in statements if re.search(rf"FROM {table}\b.*\bIN\b", s, re.S)]
+
+
+@pytest.fixture
+def existing(engine):
+    with Session(engine) as session:
+        application = session.execute(select(JobApplication.caregiver_user_id, JobApplication.job_id).limit(1)).one()
+        fresh_job = session.scalar(select(Job.job_id).where(~Job.job_id.in_(
+            select(JobApplication.job_id).where(JobApplication.caregiver_user_id == application.caregiver_user_id))))
+        booked = session.scalars(select(Appointment).where(Appointment.status == "pending").limit(1)).one()
+        member = session.scalar(select(Member.member_user_id).limit(1))
+        session.expunge_all()
+    return application, fresh_job, booked, member
+
+
+def test_job_application_batch_reports_each_row(client, engine, statements, existing):
+    (caregiver, job), fresh_job, _, _ = existing
+    records = [
+        {"caregiver_user_id": caregiver, "job_id": fresh_job, "date_applied": "2024-05-01"},  # created
+        {"caregiver_user_id": caregiver, "job_id": fresh_job},                                # duplicate
+        {"caregiver_user_id": caregiver, "job_id": job},                                      # exists
+        {"caregiver_user_id": caregiver},                                                     # invalid
+        {"caregiver_user_id": caregiver, "job_id": 10 ** 9},                                  # unknown job
+        "not an object",                                                                      # invalid
+    ]
+    statements.clear()
+    try:
+        response = client.post("/api/v1/job_applications/batch", json=records)
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body["created"] == 1
+        assert [r["status"] for r in body["results"]] == ["created", "duplicate", "exists", "invalid", "invalid",
+                                                          "invalid"]
+        assert [r["index"] for r in body["results"]] == list(range(len(records)))
+        assert body["results"][3]["error"] == "job_id is required"
+        assert body["results"][4]["error"] == f"unknown job_id {10 ** 9}"
+        # One IN query per referenced table, however many records name it.
+        assert len(_in_queries(statements, "caregiver")) == 1
+        assert len(_in_queries(statements, "job")) == 1
+    finally:
+        with engine.begin() as conn:
+            conn.execute(delete(JobApplication).where(JobApplication.caregiver_user_id == caregiver,
+                                                      JobApplication.job_id == fresh_job))
+
+
+def test_appointment_batch_reports_conflicts(client, engine, statements, existing):
+    _, _, booked, member = existing
+    clash = {"caregiver_user_id": booked.caregiver_user_id, "member_user_id": member,
+             "appointment_date": booked.appointment_date.isoformat(),
+             "appointment_time": booked.appointment_time.isoformat(), "work_hours": 1}
+    free = dict(clash, appointment_date="2035-03-01", appointment_time="08:00", work_hours=2)
+    records = [
+        free,                                                      # created
+        dict(free, appointment_time="09:00"),                      # overlaps record 0
+        clash,                                                     # overlaps the stored booking
+        dict(clash, status="declined"),                            # declined bookings never clash
+        dict(free, work_hours=30),                                 # invalid
+        dict(free, member_user_id=10 ** 9),                        # unknown member
+    ]
+    statements.clear()
+    created = []
+    try:
+        response = client.post("/api/v1/appointments/batch", json=records)
+        assert response.status_code == 200
+        results = response.get_json()["results"]
+        created = [r["appointment_id"] for r in results if r["status"] == "created"]
+        assert [r["status"] for r in results] == ["created", "conflict", "conflict", "created", "invalid", "invalid"]
+        assert results[1]["records"] == [0] and results[1]["appointments"] == []
+        assert booked.appointment_id in results[2]["appointments"]
+        assert results[4]["error"] == "work_hours must be between 0 and 24"
+        assert len(_in_queries(statements, "caregiver")) == 1
+        assert len(_in_queries(statements, "member")) == 1
+    finally:
+        with Session(engine) as session:
+            session.execute(delete(Appointment).where(Appointment.appointment_id.in_(created)))
+            session.commit()
+        scheduling.shared_scheduler(engine).invalidate([booked.caregiver_user_id])
+
+
+def test_batch_on_an_unsupported_dialect_is_501(client, engine, monkeypatch, existing):
+    (caregiver, _), fresh_job, _, _ = existing
+    monkeypatch.setattr(engine.dialect, "name", "mysql")
+    response = client.post("/api/v1/job_applications/batch", json=[{"caregiver_user_id": caregiver, "job_id": fresh_job}])
+    assert response.status_code == 501
+    assert response.get_json() == {"error": "batch inserts are not supported on mysql"}
@@ -0,0 +1,59 @@
+import asyncio
+
+import async_app
+
+LISTS = ["/users", "/caregivers", "/members", "/jobs", "/appointments"]
+
+
+def _get(*urls, signed_in=None):
+    """GET each url from the Quart app, started and stopped around the requests."""
+    async def run():
+        async with async_app.app.test_app() as test_app:
+            client = test_app.test_client()
+            if signed_in:
+                async with client.session_transaction() as s:
+                    s["user_id"], s["email"] = signed_in
+            responses = []
+            for url in urls:
+                response = await client.get(url)
+                responses.append((response.status_code, await response.get_data(as_text=True)))
+            return responses
+    return asyncio.run(run())
+
+
+def test_async_lists_page_without_offering_all_rows(engine):
+    async_app.page_cache.clear()
+    for status, body in _get(*LISTS, *(f"{url}?per_page=5" for url in LISTS)):
+        assert status == 200
+        assert "All rows" not in body
+        assert "Next &raquo;" in body
+
+
+def test_sync_lists_still_offer_all_rows(client):
+    assert b"All rows" in client.get("/jobs").data
+
+
+def test_async_forms_and_bad_cursor(engine):
+    statuses = [status for status, _ in _get("/jobs/new", "/job_applications/new", "/appointments/new",
+                                             "/appointments?after=!!")]
+    assert statuses == [200, 200, 200, 400]
+
+
+def test_async_reports_runs_off_the_event_loop(engine):
+    import reporting
+
+    [(status, body)] = _get("/reports")
+    assert status == 200
+    for name in reporting.DASHBOARD:
+        assert name in body
+
+
+def test_async_export_streams_from_a_worker_thread(engine):
+    [(status, body)] = _get("/export/user.csv", signed_in=(1, "admin@example.com"))
+    assert status == 200
+    lines = body.splitlines()
+    assert lines[0].split(",")[:2] == ['"user_id"', '"email"']
+    assert "password" not in lines[0]
+    assert len(lines) > 100
+    [(status, _)] = _get("/export/user.csv", signed_in=(1, "someone@example.com"))
+    assert status == 403
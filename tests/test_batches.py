@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, insert, select, update
+from sqlalchemy.orm import Session
+
+import batches
+
+metadata = MetaData()
+counter = Table("counter", metadata, Column("id", Integer, primary_key=True), Column("n", Integer, nullable=False))
+
+
+class Killed(Exception):
+    pass
+
+
+@pytest.fixture
+def bind(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'batches.db'}")
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(counter), [{"id": i, "n": 0} for i in range(1, 26)])
+    yield engine
+    engine.dispose()
+
+
+def _increment(kill_at=None):
+    calls = []
+
+    def apply(session, ids):
+        calls.append(ids)
+        if len(calls) == kill_at:
+            session.execute(update(counter).where(counter.c.id.in_(ids)).values(n=counter.c.n + 1))
+            raise Killed
+        return session.execute(update(counter).where(counter.c.id.in_(ids)).values(n=counter.c.n + 1)).rowcount
+    return apply, calls
+
+
+def _run(bind, apply, **kw):
+    return batches.run("increment", select(counter.c.id), apply, lambda: Session(bind), batch_size=5, **kw)
+
+
+def _counts(bind):
+    with bind.connect() as conn:
+        return [n for n, in conn.execute(select(counter.c.n).order_by(counter.c.id))]
+
+
+def test_a_killed_run_resumes_after_its_last_committed_chunk(bind):
+    apply, _ = _increment(kill_at=3)
+    with pytest.raises(Killed):
+        _run(bind, apply)
+    assert _counts(bind) == [1] * 10 + [0] * 15  # the third chunk rolled back with its checkpoint
+
+    apply, calls = _increment()
+    state = _run(bind, apply)
+    assert state.resumed_from == 10
+    assert calls[0] == [11, 12, 13, 14, 15]
+    assert (state.keys_done, state.rows_done, state.rows_before, state.total) == (25, 25, 10, 25)
+    assert _counts(bind) == [1] * 25  # every row incremented exactly once
+
+    # A finished run is not resumed: the next one starts over.
+    state = _run(bind, _increment()[0])
+    assert state.resumed_from is None
+    assert _counts(bind) == [2] * 25
+
+
+def test_restart_ignores_an_unfinished_checkpoint(bind):
+    with pytest.raises(Killed):
+        _run(bind, _increment(kill_at=2)[0])
+    apply, calls = _increment()
+    state = _run(bind, apply, resume=False)
+    assert state.resumed_from is None and calls[0] == [1, 2, 3, 4, 5]
+    assert _counts(bind) == [2] * 5 + [1] * 20
@@ -0,0 +1,55 @@
+from datetime import date
+
+from flask import g
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import app as sync_app
+import cache
+from models import Job, Member
+
+
+def _view_reading_from(seen):
+    def view():
+        seen.append(sync_app.read_session().info["read_only"])
+        return "html"
+    return view
+
+
+def test_cache_miss_is_filled_from_the_primary(client):
+    seen = []
+    view = sync_app.cached_view(sync_app.User)(_view_reading_from(seen))
+    sync_app.page_cache.clear()
+    with sync_app.app.test_request_context("/cache-test"):
+        g.recent_write = False
+        assert view() == "html"
+    sync_app.Session.remove()
+    assert seen == [False]
+
+
+def test_uncached_reads_use_a_replica(client):
+    with sync_app.app.test_request_context("/"):
+        g.recent_write = False
+        assert sync_app.read_session().info["read_only"] is True
+    sync_app.Session.remove()
+
+
+
+def test_every_watched_cache_sees_the_commit(engine):
+    class WatchedSession(Session):
+        pass
+
+    # Like app.page_cache and async_app.page_cache: one watch on Session, another on a subclass.
+    outer = cache.watch(cache.Cache(cache.MemoryBackend()), Session)
+    inner = cache.watch(cache.Cache(cache.MemoryBackend()), WatchedSession)
+    for c in (outer, inner):
+        c.get_or_set("jobs", (Job,), lambda: "stale")
+    with WatchedSession(engine) as session:
+        job = Job(member_user_id=session.scalar(select(Member.member_user_id).limit(1)),
+                  required_caregiving_type="elderly", other_requirements="cache", date_posted=date(2024, 1, 1))
+        session.add(job)
+        session.commit()
+        session.delete(job)
+        session.commit()
+    for c in (outer, inner):
+        assert c.get_or_set("jobs", (Job,), lambda: "fresh") == "fresh"
@@ -0,0 +1,45 @@
+import pytest
+
+import credentials
+
+
+def _with(stored, index, value):
+    parts = stored.split("$")
+    parts[index] = value
+    return "$".join(parts)
+
+
+GOOD = credentials.hash_password("pw")
+
+
+def test_hash_and_legacy_plaintext_verify():
+    assert credentials.verify_password("pw", GOOD)
+    assert not credentials.verify_password("other", GOOD)
+    assert credentials.verify_password("pw", "pw")
+    assert credentials.needs_rehash("pw")
+
+
+@pytest.mark.parametrize("stored", [
+    GOOD[:-8],                       # truncated
+    "scrypt$",                       # prefix only
+    _with(GOOD, 1, "3"),             # n not a power of two
+    _with(GOOD, 1, "-1024"),         # negative n
+    _with(GOOD, 1, str(2 ** 70)),    # n out of range
+    _with(GOOD, 4, "!!!"),           # salt is not base64
+])
+def test_a_malformed_hash_is_a_failed_login(stored):
+    assert credentials.verify_password("pw", stored) is False
+    # Not mistaken for a plaintext row either: its own text does not sign in.
+    assert credentials.verify_password(stored, stored) is False
+
+
+def test_generated_users_sign_in_with_hashed_passwords(client, engine):
+    from sqlalchemy import select
+
+    from models import User
+
+    with engine.connect() as conn:
+        stored = conn.scalar(select(User.password).where(User.user_id == 1))
+    assert stored.startswith(credentials.ALGORITHM + "$")
+    response = client.post("/login", data={"email": "user1@example.com", "password": "pass1"})
+    assert response.status_code == 302
@@ -0,0 +1,74 @@
+import threading
+
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+
+from db import InstrumentedQueuePool, make_engine
+
+
+def _pragmas(engine):
+    with engine.connect() as conn:
+        return {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+                for name in ("journal_mode", "synchronous", "busy_timeout", "foreign_keys", "mmap_size")}
+
+
+def test_file_sqlite_defaults_to_a_queue_pool_with_wal(tmp_path, monkeypatch):
+    for name in ("SQLITE_POOL", "DB_POOL_SIZE", "DB_MAX_OVERFLOW"):
+        monkeypatch.delenv(name, raising=False)
+    engine = make_engine(f"sqlite:///{tmp_path / 'pool.db'}", name="sqlite-defaults")
+    try:
+        assert isinstance(engine.pool, InstrumentedQueuePool)
+        assert (engine.pool.size(), engine.pool._max_overflow) == (5, 10)
+        assert _pragmas(engine) == {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000,
+                                    "foreign_keys": 1, "mmap_size": 256 * 1024 * 1024}
+
+        # Nested checkouts in one thread get separate connections, and so separate transactions.
+        with engine.connect() as outer, engine.connect() as inner:
+            pooled = {id(outer.connection.dbapi_connection), id(inner.connection.dbapi_connection)}
+        assert len(pooled) == 2
+
+        # Pooled connections move between threads (check_same_thread=False).
+        seen = []
+
+        def other_thread():
+            with engine.connect() as conn:
+                seen.append((id(conn.connection.dbapi_connection), conn.exec_driver_sql("SELECT 1").scalar()))
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+        assert len(seen) == 1 and seen[0][0] in pooled and seen[0][1] == 1
+    finally:
+        engine.dispose()
+
+
+def test_sqlite_pool_thread_opts_into_singleton_thread_pool(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLITE_POOL", "thread")
+    engine = make_engine(f"sqlite:///{tmp_path / 'thread.db'}", name="sqlite-thread")
+    try:
+        assert isinstance(engine.pool, SingletonThreadPool)
+        with engine.connect() as outer, engine.connect() as inner:
+            assert outer.connection.dbapi_connection is inner.connection.dbapi_connection
+    finally:
+        engine.dispose()
+
+
+def test_pragmas_follow_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT", "250")
+    monkeypatch.setenv("SQLITE_FOREIGN_KEYS", "0")
+    monkeypatch.setenv("SQLITE_MMAP_SIZE", "0")
+    engine = make_engine(f"sqlite:///{tmp_path / 'env.db'}", name="sqlite-env")
+    try:
+        pragmas = _pragmas(engine)
+        assert (pragmas["busy_timeout"], pragmas["foreign_keys"], pragmas["mmap_size"]) == (250, 0, 0)
+    finally:
+        engine.dispose()
+
+
+def test_memory_sqlite_shares_one_connection_without_wal(monkeypatch):
+    monkeypatch.delenv("SQLITE_POOL", raising=False)
+    engine = make_engine("sqlite://", name="sqlite-memory")
+    try:
+        assert isinstance(engine.pool, StaticPool)
+        assert _pragmas(engine)["journal_mode"] == "memory"
+    finally:
+        engine.dispose()
@@ -0,0 +1,80 @@
+from datetime import date, time
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import earnings
+from models import Appointment, Caregiver, CaregiverEarnings, Member
+
+
+def _totals(session, caregiver_id):
+    row = session.execute(select(CaregiverEarnings.accepted_hours, CaregiverEarnings.accepted_count)
+                          .where(CaregiverEarnings.caregiver_user_id == caregiver_id)).one_or_none()
+    return (Decimal(str(row[0])), row[1]) if row else (Decimal(0), 0)
+
+
+def _expected(session, caregiver_id):
+    rows = session.scalars(select(Appointment.work_hours).where(
+        Appointment.caregiver_user_id == caregiver_id, Appointment.status == "accepted")).all()
+    return sum((Decimal(str(h)) for h in rows), Decimal(0)), len(rows)
+
+
+def test_triggers_keep_earnings_in_step_with_appointments(engine):
+    with Session(engine) as session:
+        first, second = session.scalars(select(Caregiver.caregiver_user_id).order_by(Caregiver.caregiver_user_id).limit(2))
+        member = session.scalar(select(Member.member_user_id).limit(1))
+        try:
+            def check():
+                session.flush()
+                for cid in (first, second):
+                    assert _totals(session, cid) == _expected(session, cid)
+
+            before = _totals(session, first)
+            a = Appointment(caregiver_user_id=first, member_user_id=member, appointment_date=date(2031, 1, 1),
+                            appointment_time=time(9), work_hours=Decimal("2.5"), status="accepted")
+            pending = Appointment(caregiver_user_id=first, member_user_id=member, appointment_date=date(2031, 1, 2),
+                                  appointment_time=time(9), work_hours=Decimal("4"), status="pending")
+            session.add_all([a, pending])
+            check()
+            assert _totals(session, first) == (before[0] + Decimal("2.5"), before[1] + 1)
+
+            a.work_hours = Decimal("3")             # hours change
+            check()
+            pending.status = "accepted"             # status change into accepted
+            check()
+            a.status = "declined"                   # and out of it
+            check()
+            pending.caregiver_user_id = second      # moved to another caregiver
+            check()
+            session.delete(pending)
+            check()
+            assert _totals(session, first) == before
+        finally:
+            session.rollback()
+
+
+def test_rate_change_reprices_without_touching_earnings(engine):
+    with Session(engine) as session:
+        caregiver = session.scalars(select(Caregiver).join(CaregiverEarnings).where(
+            CaregiverEarnings.accepted_count > 0).limit(1)).one()
+        income = earnings.average_income(session.get_bind().dialect.name)
+        query = select(income).select_from(CaregiverEarnings).join(Caregiver).where(
+            Caregiver.caregiver_user_id == caregiver.caregiver_user_id)
+        try:
+            totals = _totals(session, caregiver.caregiver_user_id)
+            old = session.scalar(query)
+            caregiver.hourly_rate = Decimal(str(caregiver.hourly_rate)) * 2
+            session.flush()
+            assert _totals(session, caregiver.caregiver_user_id) == totals
+            assert float(session.scalar(query)) == pytest.approx(float(old) * 2)
+        finally:
+            session.rollback()
+
+
+def test_install_refuses_unknown_dialects():
+    conn = SimpleNamespace(dialect=SimpleNamespace(name="mysql"))
+    with pytest.raises(RuntimeError, match="mysql"):
+        earnings.install(conn)
@@ -0,0 +1,28 @@
+def _sign_in(client, user_id, email):
+    with client.session_transaction() as s:
+        s["user_id"] = user_id
+        s["email"] = email
+
+
+def test_anonymous_export_is_rejected(client):
+    response = client.get("/export/user.csv")
+    assert response.status_code == 401
+
+
+def test_export_needs_an_admin(client):
+    _sign_in(client, 1, "someone@example.com")
+    assert client.get("/export/user.csv").status_code == 403
+
+
+def test_export_never_includes_passwords(client):
+    _sign_in(client, 1, "Admin@example.com")
+    response = client.get("/export/user.csv")
+    assert response.status_code == 200
+    header = response.get_data(as_text=True).splitlines()[0]
+    assert "password" not in header
+    assert header.split(",")[:2] == ['"user_id"', '"email"']
+
+
+def test_unknown_table_is_not_found(client):
+    _sign_in(client, 1, "admin@example.com")
+    assert client.get("/export/secrets.csv").status_code == 404
@@ -0,0 +1,38 @@
+import pytest
+
+import app as app_module
+
+LISTS = ["/users", "/caregivers", "/members", "/jobs", "/appointments"]
+FORMS = ["/jobs/new", "/job_applications/new", "/appointments/new"]
+
+
+@pytest.fixture
+def warm_client(client):
+    # The first request pays for connection setup and the schema check.
+    client.get("/users")
+    return client
+
+
+def _count(client, statements, url):
+    app_module.page_cache.clear()
+    statements.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize("url", LISTS)
+def test_list_page_statements_do_not_grow_with_rows(warm_client, statements, url):
+    client = warm_client
+    few = _count(client, statements, f"{url}?per_page=5")
+    many = _count(client, statements, f"{url}?per_page=50")
+    assert few == many
+    assert many <= 3
+
+
+@pytest.mark.parametrize("url", FORMS)
+def test_form_page_issues_a_constant_number_of_statements(warm_client, statements, url):
+    client = warm_client
+    first = _count(client, statements, url)
+    assert first == _count(client, statements, url)
+    assert first <= 3
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from sqlalchemy import select, update
+
+import matching
+from models import Job
+
+
+def _index(engine):
+    index = matching.MatchIndex(engine)
+    index.ensure_fresh()
+    return index
+
+
+def test_unknown_job_has_no_matches(engine):
+    assert _index(engine).top_k(10**9) is None
+
+
+def test_job_is_read_per_lookup(engine):
+    index = _index(engine)
+    with engine.begin() as conn:
+        job_id, kind = conn.execute(select(Job.job_id, Job.required_caregiving_type).limit(1)).one()
+    other = "elderly" if kind != "elderly" else "babysitter"
+    try:
+        with engine.begin() as conn:
+            conn.execute(update(Job).where(Job.job_id == job_id).values(required_caregiving_type=other))
+        matches = index.top_k(job_id, k=5)
+        assert matches and {m.caregiving_type for m in matches} == {other}
+        assert index.rebuilds == 1
+    finally:
+        with engine.begin() as conn:
+            conn.execute(update(Job).where(Job.job_id == job_id).values(required_caregiving_type=kind))
+
+
+def test_stale_index_rebuilds_once_in_the_background(engine, monkeypatch):
+    index = _index(engine)
+    before = index._candidates
+    release = threading.Event()
+    load = index._load
+
+    def slow_load():
+        release.wait(5)
+        return load()
+
+    monkeypatch.setattr(index, "_load", slow_load)
+    index.mark_stale()
+    threads = [threading.Thread(target=index.ensure_fresh) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # Lookups keep the previous build while the single rebuild waits.
+    assert index._building and index._candidates is before
+    # A commit during the rebuild is replayed onto the new build.
+    dropped = next(iter(before.caregivers))
+    index.apply([("caregiver-deleted", {"caregiver_user_id": dropped})])
+    release.set()
+    deadline = time.monotonic() + 5
+    while index._building and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert index.rebuilds == 2 and index._candidates is not before and not index.stale
+    assert dropped not in index._candidates.caregivers
@@ -0,0 +1,96 @@
+import time
+from datetime import date
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import matviews
+from models import Job, Member
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_a_burst_of_requests_is_one_refresh(engine):
+    refresher = matviews.DebouncedRefresher(engine, delay=0.2, max_delay=5.0)
+    try:
+        for _ in range(10):
+            refresher.request()
+            time.sleep(0.01)
+        assert refresher.refreshes == 0
+        assert _wait_for(lambda: refresher.refreshes == 1)
+        time.sleep(0.4)
+        assert refresher.refreshes == 1
+        assert refresher.last_error is None
+    finally:
+        refresher.stop()
+
+
+def test_steady_requests_still_refresh_by_max_delay(engine):
+    refresher = matviews.DebouncedRefresher(engine, delay=0.3, max_delay=0.5)
+    try:
+        end = time.monotonic() + 1.5
+        while time.monotonic() < end:
+            refresher.request()
+            time.sleep(0.05)
+        # The quiet period never arrives, so only max_delay can have fired.
+        assert refresher.refreshes >= 1
+    finally:
+        refresher.stop()
+
+
+class _Recorder:
+    requests = 0
+
+    def request(self):
+        self.requests += 1
+
+
+def test_only_committed_writes_to_source_tables_request_a_refresh(engine):
+    class WatchedSession(Session):
+        pass
+
+    recorder = matviews.watch(_Recorder(), WatchedSession)
+    with WatchedSession(engine) as session:
+        session.scalars(select(Job).limit(1)).all()
+        session.commit()
+        assert recorder.requests == 0
+
+        job = Job(member_user_id=session.scalar(select(Member.member_user_id).limit(1)),
+                  required_caregiving_type="elderly", other_requirements="debounce", date_posted=date(2024, 1, 1))
+        session.add(job)
+        session.flush()
+        session.rollback()
+        assert recorder.requests == 0
+
+        session.add(job)
+        session.commit()
+        assert recorder.requests == 1
+
+        session.delete(job)
+        session.commit()
+        assert recorder.requests == 2
+
+
+def test_refresh_picks_up_new_applications(engine):
+    with Session(engine) as session:
+        member = session.scalar(select(Member.member_user_id).limit(1))
+        job = Job(member_user_id=member, required_caregiving_type="elderly", other_requirements="fresh",
+                  date_posted=date(2024, 1, 1))
+        session.add(job)
+        session.commit()
+        job_id = job.job_id
+    try:
+        matviews.refresh_now(engine)
+        with engine.connect() as conn:
+            count = conn.exec_driver_sql(f"SELECT count(*) FROM {matviews.NAME} WHERE job_id = ?", (job_id,)).scalar()
+        assert count == 1  # a job without applicants still has its row
+    finally:
+        with Session(engine) as session:
+            session.delete(session.get(Job, job_id))
+            session.commit()
+        matviews.refresh_now(engine)
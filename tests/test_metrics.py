@@ -0,0 +1,45 @@
+import re
+
+import pytest
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+
+import metrics
+from db import make_engine
+
+
+def _sample(body, name, engine):
+    match = re.search(rf'^{name}\{{engine="{engine}"\}} (\S+)$', body, re.M)
+    assert match, f"{name} missing for {engine}"
+    return float(match.group(1))
+
+
+def test_pool_metrics_count_checkouts_waits_and_timeouts(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'pool.db'}", name="pool-test",
+                         pool_size=1, max_overflow=0, pool_timeout=0.1)
+    try:
+        with engine.connect():
+            body = metrics.render()
+            assert _sample(body, "db_pool_size", "pool-test") == 1
+            assert _sample(body, "db_pool_checked_out", "pool-test") == 1
+            with pytest.raises(PoolTimeout):
+                engine.connect()
+        with engine.connect():
+            pass
+
+        body = metrics.render()
+        assert _sample(body, "db_pool_checked_out", "pool-test") == 0
+        assert _sample(body, "db_pool_checked_in", "pool-test") == 1
+        assert _sample(body, "db_pool_checkouts_total", "pool-test") == 2
+        assert _sample(body, "db_pool_checkout_timeouts_total", "pool-test") == 1
+        assert _sample(body, "db_pool_checkout_wait_seconds_count", "pool-test") == 2
+        assert re.search(r'^db_pool_checkout_wait_seconds_bucket\{engine="pool-test",le="\+Inf"\} 2$', body, re.M)
+        assert "# TYPE db_pool_checkout_wait_seconds histogram" in body
+    finally:
+        engine.dispose()
+
+
+def test_metrics_endpoint_serves_the_exposition(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert b'db_pool_checkouts_total{engine="primary"}' in response.data
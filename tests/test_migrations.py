@@ -0,0 +1,8 @@
+import migrations
+
+
+def test_seeded_database_uses_the_expected_indexes(engine):
+    results = migrations.check_plans(engine)
+    assert [(name, index) for name, index, _, _ in results] == [(name, index) for name, index, _ in migrations.PLAN_CHECKS]
+    missed = {f"{name} -> {index}": plan for name, index, used, plan in results if not used}
+    assert not missed, missed
@@ -0,0 +1,27 @@
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import onboarding
+from models import Caregiver, User
+
+
+def _row(email, rate):
+    return {"email": email, "given_name": "Ada", "surname": "Roster", "password": "pw",
+            "caregiving_type": "babysitter", "gender": "F", "hourly_rate": rate}
+
+
+def test_bad_hourly_rate_is_rejected_with_its_row_number(engine):
+    rows = [_row("roster-ok@example.com", "12.5"), _row("roster-bad@example.com", "twelve"),
+            _row("roster-neg@example.com", "-3"), _row("roster-big@example.com", "1e9"),
+            _row("roster-nan@example.com", "NaN")]
+    stats = onboarding.import_accounts("caregivers", rows, session_factory=lambda: Session(engine))
+
+    assert stats["inserted"] == 1
+    assert [n for n, _ in stats["errors"]] == [2, 3, 4, 5]
+    assert all("invalid hourly_rate" in e for _, e in stats["errors"])
+    with Session(engine) as session:
+        rate = session.scalar(select(Caregiver.hourly_rate).join(User, User.user_id == Caregiver.caregiver_user_id)
+                              .where(User.email == "roster-ok@example.com"))
+    assert rate == Decimal("12.50")
@@ -0,0 +1,48 @@
+import base64
+import json
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from models import Appointment, Caregiver
+from pagination import decode_cursor, encode_cursor, keyset_page
+
+COLUMNS = [Appointment.appointment_date, Appointment.appointment_id]
+
+
+def _raw(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    values = [date(2024, 5, 1), 42]
+    assert decode_cursor(encode_cursor(values), COLUMNS) == values
+    rate = [Caregiver.hourly_rate, Caregiver.caregiver_user_id]
+    assert decode_cursor(encode_cursor([Decimal("12.50"), 7]), rate) == [Decimal("12.50"), 7]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!", _raw({"a": 1}), _raw([1]), _raw([{}, 1]), _raw(["2024-05-01", [1]]),
+    _raw([1, 2]), _raw(["2024-13-01", 1]), _raw(["2024-05-01", "x"]),
+])
+def test_malformed_cursor_is_a_value_error(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, COLUMNS)
+
+
+def test_malformed_cursor_is_a_bad_request(client):
+    assert client.get(f"/appointments?after={_raw([{}, 1])}").status_code == 400
+    assert client.get(f"/api/v1/users?after={_raw([[1]])}").status_code == 400
+
+
+def test_pages_walk_forward_and_back(engine):
+    from sqlalchemy.orm import Session
+
+    with Session(engine) as session:
+        query = session.query(Appointment)
+        first = keyset_page(query, COLUMNS, page_size=10, descending=True)
+        second = keyset_page(query, COLUMNS, after=first.next_cursor, page_size=10, descending=True)
+        back = keyset_page(query, COLUMNS, before=second.prev_cursor, page_size=10, descending=True)
+        assert [a.appointment_id for a in back.items] == [a.appointment_id for a in first.items]
+        assert not {a.appointment_id for a in first.items} & {a.appointment_id for a in second.items}
@@ -0,0 +1,75 @@
+from flask import Flask, Response
+from sqlalchemy import text
+
+import profiling
+
+
+def _profiled_app(engine, monkeypatch):
+    monkeypatch.setattr(profiling, "ENABLED", True)
+    app = Flask("profiled")
+    profiling.init_app(app)
+
+    @app.route("/one")
+    def one():
+        with engine.connect() as conn:
+            return str(conn.execute(text("SELECT :v"), {"v": "secret"}).scalar())
+
+    @app.route("/stream")
+    def stream():
+        def rows():
+            with engine.connect() as conn:
+                for i in range(3):
+                    yield str(conn.execute(text("SELECT :v"), {"v": i}).scalar())
+        return Response(rows())
+
+    return app.test_client()
+
+
+def test_history_keeps_no_parameter_values(engine, monkeypatch):
+    client = _profiled_app(engine, monkeypatch)
+    response = client.get("/one")
+    assert "Server-Timing" in response.headers
+    profile = profiling.recent(1)[0]
+    assert profile.route == "/one"
+    assert [s.parameters for s in profile.statements] == [["str"]]
+    assert all(s._raw_parameters is None for s in profile.statements)
+
+
+def test_streamed_response_is_profiled_when_closed(engine, monkeypatch):
+    client = _profiled_app(engine, monkeypatch)
+    response = client.get("/stream")
+    assert response.get_data(as_text=True) == "012"
+    response.close()  # what the WSGI server does once the body is sent
+    profile = profiling.recent(1)[0]
+    assert profile.route == "/stream"
+    assert len(profile.statements) == 3
+
+
+def test_profiling_is_off_by_default():
+    assert profiling.ENABLED is False
+
+
+def test_a_raising_view_is_still_profiled(engine, monkeypatch):
+    client = _profiled_app(engine, monkeypatch)
+    app = client.application
+
+    @app.route("/boom")
+    def boom():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        raise RuntimeError("boom")
+
+    # Propagated to the caller, after_request is skipped and only teardown runs.
+    app.testing = True
+    try:
+        client.get("/boom")
+    except RuntimeError:
+        pass
+    # Served as a 500, the error page goes through after_request first.
+    app.testing = False
+    response = client.get("/boom")
+    assert response.status_code == 500
+    response.close()
+    for profile in profiling.recent(2):
+        assert (profile.route, profile.status, len(profile.statements)) == ("/boom", 500, 1)
+    assert profiling.current() is None  # the context variable was reset
@@ -0,0 +1,76 @@
+import threading
+
+from sqlalchemy import event, text
+
+import db
+from db import Replica, ReplicaSet, RoutingSession, make_engine
+
+
+def _replicas(tmp_path, n=2):
+    engines = [make_engine(f"sqlite:///{tmp_path / f'replica{i}.db'}", name=f"replica-test{i}") for i in range(n)]
+    return ReplicaSet([Replica(f"replica-test{i}", e) for i, e in enumerate(engines)], check_interval=60)
+
+
+def _count_statements(engine, seen):
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: seen.append((engine, statement)))
+
+
+def test_a_read_only_transaction_stays_on_one_replica(tmp_path, monkeypatch, engine):
+    replicas = _replicas(tmp_path)
+    monkeypatch.setattr(db, "_replica_set", replicas)
+    seen = []
+    for r in replicas.replicas:
+        _count_statements(r.engine, seen)
+    choices = []
+    monkeypatch.setattr(replicas, "choose", lambda real=replicas.choose: choices.append(1) or real())
+
+    with RoutingSession(info={"read_only": True}) as session:
+        for _ in range(3):
+            session.execute(text("SELECT 1"))
+        first = {e for e, _ in seen}
+        session.commit()
+        session.execute(text("SELECT 2"))
+        second = {e for e, s in seen if s == "SELECT 2"}
+
+    assert len(choices) == 2  # once per transaction, not per statement
+    assert len(first) == 1 and len(second) == 1
+    assert first != second  # round robin moves on for the next transaction
+    assert "replica_engine" not in session.info
+
+
+def test_no_usable_replica_pins_the_primary(tmp_path, monkeypatch, engine):
+    replicas = _replicas(tmp_path, n=1)
+    replicas.replicas[0].healthy = False
+    replicas.replicas[0].checked_at = float("inf")
+    monkeypatch.setattr(db, "_replica_set", replicas)
+    calls = []
+    monkeypatch.setattr(replicas, "choose", lambda real=replicas.choose: calls.append(1) or real())
+
+    with RoutingSession(info={"read_only": True}) as session:
+        assert session.get_bind() is db.get_engine()
+        assert session.get_bind() is db.get_engine()
+    assert len(calls) == 1
+
+
+def test_replica_set_is_built_once_under_concurrency(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "_replica_set", None)
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", f"sqlite:///{tmp_path / 'r0.db'},sqlite:///{tmp_path / 'r1.db'}")
+    built = []
+    real = db.make_engine
+    monkeypatch.setattr(db, "make_engine", lambda *a, **kw: built.append(kw["name"]) or real(*a, **kw))
+
+    barrier = threading.Barrier(8)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(db.replica_set())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(r) for r in results}) == 1
+    assert built == ["replica0", "replica1"]
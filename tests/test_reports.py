@@ -0,0 +1,61 @@
+import threading
+import time
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+import app as app_module
+import reporting
+from models import Caregiver
+
+
+def test_reports_page_is_cached_until_a_source_table_changes(client, engine, statements):
+    app_module.page_cache.clear()
+    assert client.get("/reports").status_code == 200
+    assert statements
+
+    statements.clear()
+    first = client.get("/reports").data
+    assert statements == []
+
+    with Session(engine) as session:
+        # Any committed write to a source table bumps its generation, even one that changes nothing.
+        first_id = session.scalar(select(Caregiver.caregiver_user_id).limit(1))
+        session.execute(update(Caregiver).where(Caregiver.caregiver_user_id == first_id)
+                        .values(hourly_rate=Caregiver.hourly_rate))
+        session.commit()
+    statements.clear()
+    assert client.get("/reports").data.count(b"<table") == first.count(b"<table")
+    assert statements
+
+
+def test_concurrent_misses_run_one_report_at_a_time(engine, monkeypatch):
+    running, peak = [0], [0]
+    lock = threading.Lock()
+    real = reporting.run
+
+    def counted(*args, **kwargs):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        try:
+            return real(*args, **kwargs)
+        finally:
+            with lock:
+                running[0] -= 1
+
+    monkeypatch.setattr(reporting, "run", counted)
+    app_module.page_cache.clear()
+    statuses = []
+
+    def get():
+        statuses.append(app_module.app.test_client().get("/reports").status_code)
+
+    threads = [threading.Thread(target=get) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert statuses == [200] * 4
+    assert peak[0] == 1
@@ -0,0 +1,78 @@
+from datetime import date, time
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import scheduling
+from models import Appointment, Caregiver, Member
+
+DAY = date(2031, 3, 4)  # after every seeded appointment
+
+
+@pytest.fixture
+def pair(engine):
+    with engine.connect() as conn:
+        caregiver = conn.execute(select(Caregiver.caregiver_user_id).limit(1)).scalar()
+        member = conn.execute(select(Member.member_user_id).limit(1)).scalar()
+    yield caregiver, member
+    with engine.begin() as conn:
+        conn.execute(delete(Appointment).where(Appointment.appointment_date == DAY))
+
+
+def _booking(caregiver, member, start, hours, status="accepted"):
+    return dict(caregiver_user_id=caregiver, member_user_id=member, appointment_date=DAY,
+                appointment_time=start, work_hours=Decimal(hours), status=status)
+
+
+def test_seeded_data_has_no_overlaps(engine):
+    with engine.connect() as conn:
+        assert scheduling.find_overlaps(conn) == []
+
+
+def test_database_rejects_overlapping_bookings(engine, pair):
+    with engine.begin() as conn:
+        conn.execute(insert(Appointment), [_booking(*pair, time(9), 2), _booking(*pair, time(11), 1),
+                                           _booking(*pair, time(9, 30), 1, "declined")])
+    with pytest.raises(IntegrityError) as raised, engine.begin() as conn:
+        conn.execute(insert(Appointment), _booking(*pair, time(10, 30), 1, "pending"))
+    assert scheduling.is_overlap_violation(raised.value)
+
+
+def test_booking_rereads_the_calendar_in_its_transaction(engine, pair):
+    scheduler = scheduling.Scheduler(engine, max_age=3600)
+    assert scheduler.conflicts(pair[0], DAY, time(9), 2) == []
+    with engine.begin() as conn:  # another process books; no session events here
+        conn.execute(insert(Appointment), _booking(*pair, time(9), 2))
+    with Session(engine) as session:
+        with pytest.raises(scheduling.ScheduleConflict), scheduler.booking(pair[0], session):
+            scheduler.check(pair[0], DAY, time(10), 1)
+
+
+def test_booking_reports_a_database_rejection_as_a_conflict(engine, pair):
+    scheduler = scheduling.Scheduler(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Appointment), _booking(*pair, time(9), 2))
+    with Session(engine) as session:
+        with pytest.raises(scheduling.ScheduleConflict), scheduler.booking(pair[0]):
+            session.add(Appointment(**_booking(*pair, time(10), 1)))
+            session.commit()
+
+
+def test_bulk_insert_invalidates_only_its_caregivers(engine, pair):
+    class WatchedSession(Session):
+        pass
+
+    scheduler = scheduling.watch(scheduling.Scheduler(engine), WatchedSession)
+    with engine.connect() as conn:
+        other = conn.execute(select(Caregiver.caregiver_user_id)
+                             .where(Caregiver.caregiver_user_id != pair[0]).limit(1)).scalar()
+    scheduler.preload([pair[0], other])
+    kept = scheduler.calendar(other)
+    with WatchedSession(engine) as session:
+        session.execute(insert(Appointment), [_booking(*pair, time(9), 2)])
+        session.commit()
+    assert scheduler.calendar(other) is kept
+    assert scheduler.conflicts(pair[0], DAY, time(10), 1) != []
@@ -0,0 +1,38 @@
+from datetime import date
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import search
+from models import Job, Member
+
+
+def _ids(session, q):
+    return [row.id for row in search.search(session, q, kinds="jobs")]
+
+
+def test_fts_ranks_and_follows_updates_and_deletes(engine):
+    with Session(engine) as session:
+        member_id = session.scalar(select(Member.member_user_id).limit(1))
+        dense = Job(member_user_id=member_id, required_caregiving_type="babysitter",
+                    other_requirements="quokka quokka handler", date_posted=date(2024, 1, 1))
+        sparse = Job(member_user_id=member_id, required_caregiving_type="babysitter",
+                     other_requirements="quokka and a great many other unrelated words to dilute the match",
+                     date_posted=date(2024, 1, 1))
+        session.add_all([dense, sparse])
+        session.flush()
+        try:
+            assert _ids(session, "quokka") == [dense.job_id, sparse.job_id]
+            assert _ids(session, "quok") == [dense.job_id, sparse.job_id]  # prefix match
+            assert _ids(session, "quokka handler") == [dense.job_id]
+
+            sparse.other_requirements = "wombat wrangler"
+            session.flush()
+            assert _ids(session, "quokka") == [dense.job_id]
+            assert _ids(session, "wombat") == [sparse.job_id]
+
+            session.delete(dense)
+            session.flush()
+            assert _ids(session, "quokka") == []
+        finally:
+            session.rollback()
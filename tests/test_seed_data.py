@@ -0,0 +1,42 @@
+from sqlalchemy import func, select
+
+import seed_data
+from db import make_engine
+from models import Appointment, Caregiver, Job, JobApplication, Member, User
+
+
+def _snapshot(engine):
+    with engine.connect() as conn:
+        return {model.__tablename__: conn.execute(select(model.__table__).order_by(*model.__table__.primary_key)).all()
+                for model in (User, Caregiver, Member, Job, JobApplication, Appointment)}
+
+
+def test_generate_is_deterministic_and_respects_the_schema(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'gen.db'}", name="seed-test")
+    try:
+        # Plaintext, so the salts do not make two runs differ.
+        seed_data.generate(users=60, jobs=20, appointments=300, applications=500, seed=7,
+                           batch_size=16, bind=engine, verbose=False, plaintext_passwords=True)
+        first = _snapshot(engine)
+        seed_data.generate(users=60, jobs=20, appointments=300, applications=500, seed=7,
+                           batch_size=16, bind=engine, verbose=False, plaintext_passwords=True)
+        assert _snapshot(engine) == first
+
+        counts = {name: len(rows) for name, rows in first.items()}
+        # 40% caregivers; applications are capped at one per caregiver and job.
+        assert counts == {"USER": 60, "caregiver": 24, "member": 36, "job": 20,
+                          "job_application": 20 * 24, "appointment": 300}
+
+        with engine.connect() as conn:
+            double_booked = conn.execute(
+                select(Appointment.caregiver_user_id, Appointment.appointment_date)
+                .where(Appointment.status != "declined")
+                .group_by(Appointment.caregiver_user_id, Appointment.appointment_date)
+                .having(func.count() > 1)).all()
+        assert double_booked == []
+
+        seed_data.generate(users=60, jobs=20, appointments=300, applications=500, seed=8,
+                           bind=engine, verbose=False, plaintext_passwords=True)
+        assert _snapshot(engine)["USER"] != first["USER"]
+    finally:
+        engine.dispose()
@@ -0,0 +1,29 @@
+import pytest
+
+import credentials
+import onboarding
+
+
+FORM = {"email": "blank@example.com", "given_name": "Blank", "surname": "Password", "password": ""}
+
+
+@pytest.mark.parametrize("path, extra", [
+    ("/users/new", {}),
+    ("/caregivers/new", {"caregiving_type": "babysitter", "hourly_rate": "12.50"}),
+    ("/members/new", {}),
+])
+def test_blank_password_is_rejected(client, path, extra):
+    response = client.post(path, data=dict(FORM, **extra))
+    assert response.status_code == 400
+    with client.session_transaction() as session:
+        assert ("message", "Error: a password is required") in session["_flashes"]
+
+
+def test_hash_password_refuses_an_empty_password():
+    with pytest.raises(credentials.MissingPassword):
+        credentials.hash_password("")
+
+
+def test_onboarding_row_needs_a_password():
+    with pytest.raises(ValueError, match="missing password"):
+        onboarding._user_params(dict(FORM, password="  "))
@@ -0,0 +1,108 @@
+import http.client
+import os
+import runpy
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+import migrations
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _Log:
+    def __init__(self):
+        self.lines = []
+
+    def info(self, msg, *args):
+        self.lines.append(("info", msg % args))
+
+    def warning(self, msg, *args):
+        self.lines.append(("warning", msg % args))
+
+
+class _Server:
+    def __init__(self):
+        self.log = _Log()
+
+
+def _env(tmp_path, **extra):
+    return dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'boot.db'}", PASSWORD_HASH_WORKERS="0", **extra)
+
+
+def test_importing_the_app_does_no_database_work(tmp_path):
+    code = ("import app, db, migrations; app.create_app(); "
+            "assert set(db.engines()) <= {'primary'}, db.engines(); assert not migrations.schema_checked()")
+    # create_app() builds the engine lazily for the view refresher, but opens no connection.
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=_env(tmp_path), check=True, timeout=60)
+    assert not (tmp_path / "boot.db").exists()
+
+
+def test_create_app_returns_the_same_app(engine):
+    import app as app_module
+
+    first = app_module.create_app()
+    refresher = app_module.job_applicants_refresher
+    assert app_module.create_app() is first
+    assert app_module.job_applicants_refresher is refresher
+
+
+def test_on_starting_checks_the_schema_and_closes_connections(engine, monkeypatch):
+    on_starting = runpy.run_path(os.path.join(ROOT, "gunicorn.conf.py"))["on_starting"]
+    monkeypatch.setattr(migrations, "_schema_checked", False)
+    with engine.connect():
+        pass
+    assert engine.pool.checkedin() > 0
+
+    server = _Server()
+    on_starting(server)
+    assert server.log.lines == [("info", "schema verified")]
+    assert migrations.schema_checked()
+    assert engine.pool.checkedin() == 0  # nothing for the forked workers to inherit
+
+
+def test_on_starting_survives_a_database_that_is_down(monkeypatch):
+    on_starting = runpy.run_path(os.path.join(ROOT, "gunicorn.conf.py"))["on_starting"]
+
+    def down(bind):
+        raise ConnectionError("connection refused")
+
+    monkeypatch.setattr(migrations, "ensure_schema", down)
+    server = _Server()
+    on_starting(server)
+    assert server.log.lines == [("warning", "schema check failed, workers will retry: connection refused")]
+
+
+def test_gunicorn_boots_migrates_once_and_serves(tmp_path):
+    pytest.importorskip("gunicorn")
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}",
+         "--workers", "2", "--log-level", "info"],
+        cwd=ROOT, env=_env(tmp_path, LOG_LEVEL="INFO"), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                conn.request("GET", "/users")
+                response = conn.getresponse()
+                body = response.read()
+                conn.close()
+                break
+            except OSError:
+                assert time.monotonic() < deadline and server.poll() is None, "gunicorn did not come up"
+                time.sleep(0.2)
+        assert response.status == 200, body
+    finally:
+        server.send_signal(signal.SIGINT)  # quick shutdown; SIGTERM waits out graceful_timeout
+        output = server.communicate(timeout=30)[0]
+    # The preloaded master checked (and created) the schema; the forked workers did not repeat it.
+    assert "applied [1, 2" in output, output
+    assert output.count("schema verified in") == 1, output
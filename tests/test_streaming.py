@@ -0,0 +1,61 @@
+import tracemalloc
+from datetime import date, time
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import delete, insert, select
+
+import app as app_module
+from models import Appointment, Caregiver, Member
+
+EXTRA_FROM = 1_000_000
+
+
+def _stream(client):
+    """Rows and body size of GET /appointments?stream=1, and the traced heap peak while it ran."""
+    tracemalloc.start()
+    try:
+        response = client.get("/appointments?stream=1", buffered=False)
+        size = rows = 0
+        for chunk in response.response:
+            size += len(chunk)
+            rows += chunk.count(b"<tr>")
+        response.close()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return rows - 1, size, peak  # less the header row
+
+
+@pytest.fixture
+def extra_appointments(engine):
+    with engine.connect() as conn:
+        caregiver = conn.scalar(select(Caregiver.caregiver_user_id).limit(1))
+        member = conn.scalar(select(Member.member_user_id).limit(1))
+
+    def add(n):
+        # Declined bookings, so neither the overlap rule nor caregiver_earnings is involved.
+        with engine.begin() as conn:
+            conn.execute(insert(Appointment), [
+                dict(appointment_id=EXTRA_FROM + i, caregiver_user_id=caregiver, member_user_id=member,
+                     appointment_date=date(2030, 1, 1), appointment_time=time(9), work_hours=Decimal(1),
+                     status="declined") for i in range(n)])
+
+    yield add
+    with engine.begin() as conn:
+        conn.execute(delete(Appointment).where(Appointment.appointment_id >= EXTRA_FROM))
+
+
+def test_streamed_list_memory_does_not_grow_with_rows(client, engine, extra_appointments, monkeypatch):
+    # Heap, not RSS: ru_maxrss is a process-wide high-water mark, so it cannot compare two runs in one process.
+    monkeypatch.setattr(app_module, "STREAM_BATCH_ROWS", 100)
+    _stream(client)  # warm up templates, compiled SQL and the pool outside the measurement
+    small_rows, small_size, small_peak = _stream(client)
+
+    extra_appointments(small_rows * 9)
+    large_rows, large_size, large_peak = _stream(client)
+
+    assert large_rows == small_rows * 10
+    assert large_size > small_size * 8
+    # Ten times the rows, roughly the same peak: only one batch and one output chunk are alive at a time.
+    assert large_peak < small_peak * 1.5, (small_peak, large_peak)